@@ -1,41 +1,462 @@
+import asyncio
+import email.utils
+import functools
+import itertools
 import requests
 import click
 import json
+import queue
+import random
+import re
+import sqlite3
+import threading
 import time
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_PARALLEL_RULES = 2
+PROGRESS_EVERY = 1000
+SEARCH_PAGE_SIZE = 1000
+ADD_CHUNK_SIZE = 500
+RETRY_CHUNK_SIZE = 50
+# Album write batches start at ADD_CHUNK_SIZE and adapt within these bounds;
+# a batch answered within the target time lets the next ones grow
+WRITE_CHUNK_MIN = 50
+WRITE_CHUNK_MAX = 5000
+WRITE_CHUNK_TARGET_SECONDS = 2.0
+# Time buckets evaluated together by the --require-all-faces planner
+AND_BUCKET_BATCH = 50
+# Bucket results buffered between the crawl and the album writer when streaming
+STREAM_QUEUE_SIZE = 64
+# With --hot-buckets, every Nth pass reconciles the full history
+DEFAULT_FULL_SYNC_EVERY = 12
+# Responses worth retrying: rate limiting and server/proxy failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_RETRIES = 3
+# Seconds to wait for a connection and for each read of the response
+CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 30.0
+# Consecutive transient failures after which every request pauses
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 15.0
+BREAKER_MAX_COOLDOWN = 300.0
+# --min-in-flight: completed requests per adjustment, the p95 latency growth
+# over the baseline that counts as overload, and the multiplicative decrease
+AIMD_WINDOW = 20
+AIMD_LATENCY_TOLERANCE = 2.0
+AIMD_DECREASE = 0.5
+# Add failures that a per-ID retry cannot fix; "rejected" marks IDs of a whole
+# batch the server refused (non-200 response)
+PERMANENT_ADD_ERRORS = {"duplicate", "no_permission", "not_found", "rejected"}
+
+_clients = {}
+_clients_lock = threading.Lock()
+_pool_size = DEFAULT_POOL_SIZE
+_limiter = None
+_retries = DEFAULT_RETRIES
+_read_timeout = DEFAULT_READ_TIMEOUT
+
+
+class ImmichAPIError(click.ClickException):
+    """An Immich request that still failed after its retries."""
+
+
+def retry_delay(attempt, response=None, backoff=RETRY_BACKOFF, max_backoff=RETRY_MAX_BACKOFF):
+    """
+    Seconds to wait before retry number `attempt` (0-based).
+
+    A `Retry-After` header on a 429/503 response is honored (in seconds or as
+    an HTTP date); otherwise the delay is exponential with full jitter.
+    """
+    if response is not None and response.status_code in (429, 503):
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                try:
+                    when = email.utils.parsedate_to_datetime(retry_after)
+                    return max(0.0, when.timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+    return random.uniform(0, min(max_backoff, backoff * 2**attempt))
+
+
+class CircuitBreaker:
+    """
+    Pauses every request to a server that is clearly down.
+
+    After `threshold` consecutive transient failures the breaker opens and
+    callers block for `cooldown` seconds instead of hammering the server.
+    Then a single probe request is let through: success closes the breaker,
+    failure reopens it with the cooldown doubled (up to `max_cooldown`).
+    """
+
+    def __init__(
+        self,
+        threshold=BREAKER_THRESHOLD,
+        cooldown=BREAKER_COOLDOWN,
+        max_cooldown=BREAKER_MAX_COOLDOWN,
+    ):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cooldown = cooldown
+        self._failures = 0
+        self._open_until = None
+        self._probing = False
+        self._cond = threading.Condition()
+
+    @property
+    def is_open(self):
+        return self._open_until is not None
+
+    def before_request(self):
+        """Block while the breaker is open; returns once a request may be sent."""
+        with self._cond:
+            while self._open_until is not None:
+                remaining = self._open_until - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                elif not self._probing:
+                    self._probing = True
+                    return
+                else:
+                    self._cond.wait()
+
+    def record(self, ok):
+        """Record the outcome of a request sent after `before_request`."""
+        with self._cond:
+            probe = self._probing
+            self._probing = False
+            if ok:
+                self._failures = 0
+                self._cooldown = self.base_cooldown
+                self._open_until = None
+            elif self._open_until is None or probe:
+                # Failures of requests already in flight when the breaker
+                # opened do not reopen it
+                self._failures += 1
+                if probe or self._failures >= self.threshold:
+                    click.echo(
+                        click.style(
+                            f"Server looks unavailable; pausing requests for {self._cooldown:g}s",
+                            fg="yellow",
+                        )
+                    )
+                    self._open_until = time.monotonic() + self._cooldown
+                    self._cooldown = min(self._cooldown * 2, self.max_cooldown)
+                    self._failures = 0
+            self._cond.notify_all()
+
+
+class RequestLimiter:
+    """
+    Caps the number of HTTP requests in flight across all threads.
+
+    Works like a semaphore whose limit can be changed while requests are
+    running; lowering it only blocks new requests until enough finish.
+    """
+
+    def __init__(self, limit):
+        self._limit = max(1, int(limit))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def set_limit(self, limit):
+        with self._cond:
+            self._limit = max(1, int(limit))
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= self._limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+
+    def observe(self, seconds, ok):
+        """Feedback about a finished request; a fixed budget ignores it."""
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdaptiveLimiter(RequestLimiter):
+    """
+    A `RequestLimiter` whose limit follows the server's health (AIMD).
+
+    Every `window` finished requests, the p95 latency is compared with a
+    baseline learned from earlier windows. A window with no 429/5xx or
+    connection failures and a p95 within `tolerance` times the baseline
+    raises the limit by one; otherwise the limit is cut by `decrease`. The
+    baseline follows the fastest windows and drifts slowly towards slower
+    ones, so a server that stays busy is eventually accepted as normal.
+    """
+
+    def __init__(
+        self,
+        floor,
+        ceiling,
+        window=AIMD_WINDOW,
+        tolerance=AIMD_LATENCY_TOLERANCE,
+        decrease=AIMD_DECREASE,
+    ):
+        super().__init__(floor)
+        self.floor = max(1, int(floor))
+        self.ceiling = max(self.floor, int(ceiling))
+        self.window = window
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.baseline = None
+        self._samples = []
+        self._errors = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, ok):
+        with self._lock:
+            self._samples.append(seconds)
+            if not ok:
+                self._errors += 1
+            if len(self._samples) < self.window:
+                return
+            samples = sorted(self._samples)
+            errors = self._errors
+            self._samples = []
+            self._errors = 0
+
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            slow = self.baseline is not None and p95 > self.baseline * self.tolerance
+            if errors or slow:
+                limit = max(self.floor, int(self.limit * self.decrease))
+            else:
+                limit = min(self.ceiling, self.limit + 1)
+            if not errors:
+                if self.baseline is None or p95 < self.baseline:
+                    self.baseline = p95
+                else:
+                    self.baseline += (p95 - self.baseline) * 0.1
+            if limit != self.limit:
+                self.set_limit(limit)
+
+
+class ImmichClient:
+    """
+    Thin wrapper around a keep-alive `requests.Session` for one Immich server.
+
+    All API helpers go through a shared client so that repeated calls reuse
+    pooled TCP/TLS connections instead of doing a fresh handshake each time.
+    The API key and Accept header are set once on the session. An optional
+    `RequestLimiter` bounds the requests in flight across every caller and
+    is told how long each request took and whether the server coped.
+
+    Every request gets a `CONNECT_TIMEOUT`/`read_timeout` timeout unless the
+    caller passes one, so a hung server or proxy cannot block a worker
+    forever. Timeouts, connection errors and `RETRY_STATUSES` responses are
+    retried up to `retries` times with backoff (see `retry_delay`), and a
+    `CircuitBreaker` pauses all requests while the server keeps failing.
+    After the last retry the final response is returned (or the exception
+    raised) as before. A request made with `retry_timeouts=False` raises a
+    read timeout straight away, for callers that react to it themselves.
+    """
+
+    def __init__(
+        self,
+        server_url,
+        key,
+        pool_size=DEFAULT_POOL_SIZE,
+        limiter=None,
+        retries=DEFAULT_RETRIES,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+    ):
+        self.server_url = server_url
+        self.limiter = limiter
+        self.retries = retries
+        self.timeout = (CONNECT_TIMEOUT, read_timeout)
+        self.breaker = CircuitBreaker()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"x-api-key": key, "Accept": "application/json"})
+
+    def request(self, method, url, retry_timeouts=True, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.breaker.before_request()
+            try:
+                response = self._send(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                self.breaker.record(False)
+                if attempt >= self.retries or (
+                    not retry_timeouts and isinstance(exc, requests.ReadTimeout)
+                ):
+                    raise
+                delay = retry_delay(attempt)
+            except BaseException:
+                self.breaker.record(True)
+                raise
+            else:
+                transient = response.status_code in RETRY_STATUSES
+                self.breaker.record(not transient)
+                if not transient or attempt >= self.retries:
+                    return response
+                delay = retry_delay(attempt, response)
+            attempt += 1
+            time.sleep(delay)
+
+    def _send(self, method, url, **kwargs):
+        if self.limiter is None:
+            return self.session.request(method, url, **kwargs)
+        with self.limiter:
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.limiter.observe(time.monotonic() - started, False)
+                raise
+            self.limiter.observe(
+                time.monotonic() - started, response.status_code not in RETRY_STATUSES
+            )
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+def get_client(server_url, key):
+    """Return the shared client for this server/key pair, creating it on first use."""
+    with _clients_lock:
+        client = _clients.get((server_url, key))
+        if client is None:
+            client = ImmichClient(
+                server_url,
+                key,
+                pool_size=_pool_size,
+                limiter=_limiter,
+                retries=_retries,
+                read_timeout=_read_timeout,
+            )
+            _clients[(server_url, key)] = client
+        return client
+
+
+def configure_clients(
+    pool_size=DEFAULT_POOL_SIZE,
+    max_in_flight=0,
+    retries=DEFAULT_RETRIES,
+    min_in_flight=0,
+    read_timeout=DEFAULT_READ_TIMEOUT,
+):
+    """
+    Set the connection pool size, the global in-flight request budget
+    (0 = unlimited), the number of retries and the read timeout (seconds)
+    for shared clients.
+
+    With `min_in_flight`, the budget adapts to the server between
+    `min_in_flight` and `max_in_flight` (see `AdaptiveLimiter`).
+
+    Existing clients are closed so the next call picks up the new settings.
+    """
+    global _pool_size, _limiter, _retries, _read_timeout
+    with _clients_lock:
+        _pool_size = pool_size
+        _retries = retries
+        _read_timeout = read_timeout
+        if max_in_flight and min_in_flight:
+            _limiter = AdaptiveLimiter(min_in_flight, max_in_flight)
+        elif max_in_flight:
+            _limiter = RequestLimiter(max_in_flight)
+        else:
+            _limiter = None
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
 
 def get_time_buckets(server_url, key, face_id, size="MONTH", verbose=False):
     url = f"{server_url}/api/timeline/buckets"
-    headers = {"x-api-key": key, "Accept": "application/json"}
     params = {"personId": face_id, "size": size}
  
     if verbose:
         click.echo(f"Fetching time buckets from {url} with params: {params}")
  
-    response = requests.get(url, headers=headers, params=params)
+    try:
+        response = get_client(server_url, key).get(url, params=params)
+    except requests.RequestException as exc:
+        raise ImmichAPIError(f"Failed to fetch time buckets for face {face_id}: {exc}")
  
     if response.status_code == 200:
         data = response.json()
-        # Avoid keeping full bucket objects in memory; we only need the timeBucket value.
-        trimmed = [{"timeBucket": b.get("timeBucket")} for b in data]
+        # Avoid keeping full bucket objects in memory; we only need the timeBucket
+        # value and, when the server reports it, the bucket's asset count.
+        trimmed = [
+            {"timeBucket": b.get("timeBucket"), "count": b["count"]}
+            if "count" in b
+            else {"timeBucket": b.get("timeBucket")}
+            for b in data
+        ]
         if verbose:
             click.echo(f"Time buckets fetched: {len(trimmed)} bucket(s)")
         return trimmed
     else:
-        click.echo(
-            click.style(
-                f"Failed to fetch time buckets. Status code: {response.status_code}, Response text: {response.text}",
-                fg="red",
-            )
+        raise ImmichAPIError(
+            f"Failed to fetch time buckets. Status code: {response.status_code}, Response text: {response.text}"
         )
-        exit(1)
 
 
 def get_assets_for_time_bucket(
     server_url, key, face_id, time_bucket, size="MONTH", verbose=False
 ):
     url = f"{server_url}/api/timeline/bucket"
-    headers = {"x-api-key": key, "Accept": "application/json"}
     params = {
         "isArchived": "false",
         "personId": face_id,
@@ -48,7 +469,10 @@ def get_assets_for_time_bucket(
             f"Fetching assets for time bucket {time_bucket} from {url} with params: {params}"
         )
  
-    response = requests.get(url, headers=headers, params=params)
+    try:
+        response = get_client(server_url, key).get(url, params=params)
+    except requests.RequestException as exc:
+        raise ImmichAPIError(f"Failed to fetch assets for time bucket {time_bucket}: {exc}")
  
     if response.status_code == 200:
         data = response.json()
@@ -58,13 +482,9 @@ def get_assets_for_time_bucket(
             click.echo(f"Assets fetched: {len(ids)} id(s)")
         return {"id": ids}
     else:
-        click.echo(
-            click.style(
-                f"Failed to fetch assets for time bucket {time_bucket}. Status code: {response.status_code}, Response text: {response.text}",
-                fg="red",
-            )
+        raise ImmichAPIError(
+            f"Failed to fetch assets for time bucket {time_bucket}. Status code: {response.status_code}, Response text: {response.text}"
         )
-        exit(1)
 
 
 def get_asset(server_url, key, asset_id, verbose=False):
@@ -77,12 +497,11 @@ def get_asset(server_url, key, asset_id, verbose=False):
     contains only the asset `id` and its `people` list.
     """
     url = f"{server_url}/api/assets/{asset_id}"
-    headers = {"x-api-key": key, "Accept": "application/json"}
 
     if verbose:
         click.echo(f"Fetching asset {asset_id} from {url}")
 
-    response = requests.get(url, headers=headers)
+    response = get_client(server_url, key).get(url)
 
     if response.status_code == 200:
         asset = response.json()
@@ -103,18 +522,180 @@ def get_asset(server_url, key, asset_id, verbose=False):
         return None
 
 
+def search_metadata_page(server_url, key, body, verbose=False, strict=False):
+    """
+    Fetch one page of Immich's metadata search (`POST /api/search/metadata`).
+
+    Returns the `assets` section of the response (with `items` trimmed to each
+    asset's `id` and `people`, plus `nextPage`), or None when the server
+    rejects the query or does not offer the endpoint. With `strict`, only
+    those (400/404) answer None; a failed request or any other status raises
+    `ImmichAPIError` so callers do not mistake it for an unsupported search.
+    """
+    url = f"{server_url}/api/search/metadata"
+    headers = {"Content-Type": "application/json"}
+    payload = json.dumps(body)
+
+    if verbose:
+        click.echo(f"Searching assets at {url} with payload: {payload}")
+
+    try:
+        response = get_client(server_url, key).post(url, headers=headers, data=payload)
+    except requests.RequestException as exc:
+        if strict:
+            raise ImmichAPIError(f"Metadata search request failed: {exc}")
+        if verbose:
+            click.echo(f"Metadata search request failed: {exc}")
+        return None
+
+    if strict and response.status_code not in (200, 400, 404):
+        raise ImmichAPIError(
+            f"Metadata search failed. Status code: {response.status_code}, Response text: {response.text}"
+        )
+    if response.status_code != 200:
+        if verbose:
+            click.echo(
+                f"Metadata search not available. Status code: {response.status_code}, Response text: {response.text}"
+            )
+        return None
+
+    assets = (response.json() or {}).get("assets", {}) or {}
+    items = [
+        {"id": a.get("id"), "people": a.get("people", []) or []}
+        for a in assets.get("items", []) or []
+    ]
+    if verbose:
+        click.echo(f"Search page returned {len(items)} asset(s)")
+    return {"items": items, "nextPage": assets.get("nextPage")}
+
+
+def get_people_bulk(
+    server_url,
+    key,
+    person_ids,
+    asset_ids,
+    page_size=SEARCH_PAGE_SIZE,
+    verbose=False,
+):
+    """
+    Look up the people of many assets with paged metadata searches.
+
+    Searches assets containing all of `person_ids` with `withPeople` enabled
+    and keeps the people of those listed in `asset_ids`. Paging stops early
+    once every wanted asset has been seen. Returns a dict mapping asset ID to
+    its set of people IDs, or None if the server does not support the search
+    so callers can fall back to per-asset `get_asset` lookups.
+    """
+    wanted = set(asset_ids)
+    people_by_asset = {}
+    page = 1
+
+    while page and len(people_by_asset) < len(wanted):
+        body = {
+            "personIds": list(person_ids),
+            "withPeople": True,
+            "page": page,
+            "size": page_size,
+        }
+        result = search_metadata_page(server_url, key, body, verbose)
+        if result is None:
+            return None if page == 1 else people_by_asset
+
+        for item in result["items"]:
+            asset_id = str(item.get("id"))
+            if asset_id in wanted:
+                people_by_asset[asset_id] = people_ids_of(item)
+
+        page = result.get("nextPage")
+
+    return people_by_asset
+
+
+def search_assets_with_faces(
+    server_url, key, person_ids, page_size=SEARCH_PAGE_SIZE, verbose=False
+):
+    """
+    Let Immich evaluate an AND of faces: page over the assets containing
+    every one of `person_ids`.
+
+    Archived assets are excluded to match the timeline crawl. Returns a set of
+    asset IDs (as strings), or None if the server does not support the search
+    or a page fails, so callers can fall back to crawl-and-intersect.
+    """
+    asset_ids = set()
+    page = 1
+
+    while page:
+        body = {
+            "personIds": list(person_ids),
+            "isArchived": False,
+            "page": page,
+            "size": page_size,
+        }
+        result = search_metadata_page(server_url, key, body, verbose)
+        if result is None:
+            return None
+        asset_ids.update(str(item.get("id")) for item in result["items"])
+        page = result.get("nextPage")
+
+    if verbose:
+        click.echo(
+            f"Server-side search found {len(asset_ids)} asset(s) with all of {list(person_ids)}"
+        )
+    return asset_ids
+
+
+def search_album_asset_ids(
+    server_url, key, album_id, page_size=SEARCH_PAGE_SIZE, verbose=False
+):
+    """
+    Page over an album's members through the metadata search, keeping only
+    their IDs so a single page of asset objects is in memory at a time.
+
+    Returns a set of asset IDs (as strings), or None if the server does not
+    support the search. Transient failures raise `ImmichAPIError` rather
+    than sending the caller to the full album document.
+    """
+    asset_ids = set()
+    page = 1
+
+    while page:
+        body = {
+            "albumIds": [album_id],
+            "withArchived": True,
+            "page": page,
+            "size": page_size,
+        }
+        result = search_metadata_page(server_url, key, body, verbose, strict=True)
+        if result is None:
+            return None
+        asset_ids.update(str(item.get("id")) for item in result["items"] if item.get("id"))
+        page = result.get("nextPage")
+
+    return asset_ids
+
+
 def get_album_assets(server_url, key, album_id, verbose=False):
    """
    Fetch all assets currently present in the album.
-   Returns a set of asset IDs (as strings).
+   Returns a set of asset IDs (as strings), or None if the album could not
+   be read.
+
+   The album is read without its assets and the membership is paged through
+   the metadata search, so memory stays proportional to the ID set instead of
+   the full asset payload. If the server ignores `withoutAssets`, the assets
+   it returned are used; if the paged IDs do not add up to the album's
+   `assetCount`, the full album document is fetched instead.
    """
    url = f"{server_url}/api/albums/{album_id}"
-   headers = {"x-api-key": key, "Accept": "application/json"}
 
    if verbose:
        click.echo(f"Fetching album info from {url}")
 
-   response = requests.get(url, headers=headers)
+   try:
+       response = get_client(server_url, key).get(url, params={"withoutAssets": "true"})
+   except requests.RequestException as exc:
+       raise ImmichAPIError(f"Failed to fetch album {album_id}: {exc}")
 
    if response.status_code != 200:
        click.echo(
@@ -123,11 +704,27 @@ def get_album_assets(server_url, key, album_id, verbose=False):
                fg="red",
            )
        )
-       return set()
+       return None
 
    album_data = response.json()
    asset_objs = album_data.get("assets", []) or []
-   asset_ids = {str(a.get("id")) for a in asset_objs if a.get("id")}
+   asset_count = album_data.get("assetCount")
+
+   if asset_objs or asset_count is None:
+       # Older server: the album document already lists every asset
+       asset_ids = {str(a.get("id")) for a in asset_objs if a.get("id")}
+   elif asset_count == 0:
+       asset_ids = set()
+   else:
+       asset_ids = search_album_asset_ids(server_url, key, album_id, verbose=verbose)
+       if asset_ids is None or len(asset_ids) != asset_count:
+           if verbose:
+               click.echo(
+                   f"Paged album listing incomplete (expected {asset_count} asset(s)); fetching full album"
+               )
+           asset_ids = _get_full_album_asset_ids(server_url, key, album_id)
+           if asset_ids is None:
+               return None
 
    if verbose:
        click.echo(f"Album currently contains {len(asset_ids)} asset(s)")
@@ -135,27 +732,60 @@ def get_album_assets(server_url, key, album_id, verbose=False):
    return asset_ids
 
 
-def remove_assets_from_album(server_url, key, album_id, asset_ids, verbose=False):
+def _get_full_album_asset_ids(server_url, key, album_id):
+   try:
+       response = get_client(server_url, key).get(f"{server_url}/api/albums/{album_id}")
+   except requests.RequestException as exc:
+       raise ImmichAPIError(f"Failed to fetch album {album_id}: {exc}")
+
+   if response.status_code != 200:
+       click.echo(
+           click.style(
+               f"Failed to fetch album info. Status code: {response.status_code}, Response text: {response.text}",
+               fg="red",
+           )
+       )
+       return None
+
+   asset_objs = response.json().get("assets", []) or []
+   return {str(a.get("id")) for a in asset_objs if a.get("id")}
+
+
+def remove_assets_from_album(
+    server_url, key, album_id, asset_ids, verbose=False, concurrency=1, sizer=None, removed=None
+):
    """
    Remove asset IDs from an album using Immich's DELETE endpoint.
    Supports batch removal with JSON body: {"ids": [...] }.
+
+   Batches follow `sizer` (a `ChunkSizer`, 500 IDs to start with) and are
+   sent `concurrency` at a time; see `send_in_batches`. A batch that can
+   still be split is not retried on a read timeout, so it is halved right
+   away. When a `removed` list is given, the IDs of every batch the server
+   accepted are appended to it. Returns False if any batch was refused.
    """
    url = f"{server_url}/api/albums/{album_id}/assets"
-   headers = {
-       "x-api-key": key,
-       "Content-Type": "application/json",
-       "Accept": "application/json",
-   }
-
-   # Delete in chunks of 500
-   for chunk in chunker(list(asset_ids), 500):
+   headers = {"Content-Type": "application/json"}
+   failed = []
+
+   def send(chunk, can_split):
        payload = json.dumps({"ids": list(chunk)})
 
        if verbose:
            click.echo(f"Removing {len(chunk)} asset(s) from album {album_id}: {payload}")
 
-       response = requests.delete(url, headers=headers, data=payload)
+       try:
+           response = get_client(server_url, key).delete(
+               url, headers=headers, data=payload, retry_timeouts=not can_split
+           )
+       except requests.Timeout:
+           # Left to `send_batch`, which resends a timed-out batch in halves
+           raise
+       except requests.RequestException as exc:
+           raise ImmichAPIError(f"Failed to remove assets from album {album_id}: {exc}")
 
+       if response.status_code == 413 and can_split:
+           return False
        if response.status_code != 200:
            click.echo(
                click.style(
@@ -163,33 +793,100 @@ def remove_assets_from_album(server_url, key, album_id, asset_ids, verbose=False
                    fg="red",
                )
            )
-           return False
+           failed.append(chunk)
+           return True
 
+       if removed is not None:
+           removed.extend(chunk)
        if verbose:
            click.echo(f"Successfully removed {len(chunk)} asset(s)")
+       return True
+
+   send_in_batches(send, asset_ids, sizer, concurrency)
+   return not failed
+
+
+def summarize_add_results(data, asset_ids):
+    """
+    Split an album add response into added, duplicate and failed IDs.
 
-   return True
+    Immich answers with one `{"id", "success", "error"}` entry per asset ID.
+    Responses that are not such a list (older servers) count every sent ID
+    as added. Returns a dict with `added` and `duplicate` lists of IDs and a
+    `failed` list of `(id, error)` pairs.
+    """
+    results = {"added": [], "duplicate": [], "failed": []}
+    if not isinstance(data, list):
+        results["added"].extend(asset_ids)
+        return results
+
+    for entry in data:
+        asset_id = entry.get("id")
+        if entry.get("success"):
+            results["added"].append(asset_id)
+        elif entry.get("error") == "duplicate":
+            results["duplicate"].append(asset_id)
+        else:
+            results["failed"].append((asset_id, entry.get("error") or "unknown"))
+    return results
 
 
-def add_assets_to_album(server_url, key, album_id, asset_ids, verbose=False):
+def add_assets_to_album(
+    server_url, key, album_id, asset_ids, verbose=False, results=None, can_split=False
+):
+    """
+    Add a batch of asset IDs to an album.
+
+    Returns True if the request succeeded. When a `results` dict is given,
+    the per-ID outcome (see `summarize_add_results`) is appended to its
+    `added`, `duplicate` and `failed` lists; a rejected request marks every
+    ID as failed. `can_split` tells that the caller resends the batch in
+    halves (see `send_batch`): a read timeout is then raised without
+    retrying, and a 413 is not reported.
+    """
     url = f"{server_url}/api/albums/{album_id}/assets"
-    headers = {
-        "x-api-key": key,
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-    }
+    headers = {"Content-Type": "application/json"}
     payload = json.dumps({"ids": asset_ids})
  
     if verbose:
         click.echo(f"Adding assets to album {album_id} with payload: {payload}")
  
-    response = requests.put(url, headers=headers, data=payload)
+    try:
+        response = get_client(server_url, key).put(
+            url, headers=headers, data=payload, retry_timeouts=not can_split
+        )
+    except requests.Timeout:
+        # Left to `send_batch`, which resends a timed-out batch in halves
+        raise
+    except requests.RequestException as exc:
+        raise ImmichAPIError(f"Failed to add assets to album {album_id}: {exc}")
  
     if response.status_code == 200:
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        chunk_results = summarize_add_results(data, asset_ids)
+        if results is not None:
+            for outcome, ids in chunk_results.items():
+                results.setdefault(outcome, []).extend(ids)
         if verbose:
-            click.echo(f"Assets added to album: {asset_ids}")
+            click.echo(f"Assets added to album: {chunk_results['added']}")
+            if chunk_results["duplicate"]:
+                click.echo(f"Already in album: {chunk_results['duplicate']}")
+            if chunk_results["failed"]:
+                click.echo(f"Failed to add: {chunk_results['failed']}")
         return True
     else:
+        # A payload the server finds too large is worth resending in smaller
+        # batches; any other refusal is final for this batch
+        error = "too_large" if response.status_code == 413 else "rejected"
+        if results is not None:
+            results.setdefault("failed", []).extend(
+                (asset_id, error) for asset_id in asset_ids
+            )
+        if error == "too_large" and can_split:
+            return False
         # Parse error JSON once and reuse it to avoid repeated parsing
         error_response = None
         try:
@@ -215,253 +912,2894 @@ def add_assets_to_album(server_url, key, album_id, asset_ids, verbose=False):
         return False
 
 
-def chunker(seq, size):
-    return (seq[pos : pos + size] for pos in range(0, len(seq), size))
+_ASSET_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
 
 
-@click.command()
-@click.option("--key", help="Your Immich API Key", required=True)
-@click.option("--server", help="Your Immich server URL", required=True)
-@click.option(
-    "--face",
-    help="ID of the face you want to copy from. Can be used multiple times.",
-    multiple=True,
-    required=True,
-)
-@click.option(
-    "--skip-face",
-    help="ID of a face to exclude (can be used multiple times).",
-    multiple=True,
-)
-@click.option("--album", help="ID of the album you want to copy to", required=True)
-@click.option(
-    "--timebucket", help="Time bucket size (e.g., MONTH, WEEK)", default="MONTH"
-)
-@click.option("--verbose", is_flag=True, help="Enable verbose output for debugging")
-@click.option(
-    "--run-every-seconds",
-    type=int,
-    default=0,
-    show_default=True,
-    help="Automatically rerun synchronization every N seconds (0 = run once).",
-)
-@click.option(
-    "--require-all-faces",
-    is_flag=True,
-    help="If set, only assets that include all specified faces will be added to the album. Otherwise, assets from any face are included.",
-)
-@click.option(
-    "--no-other-faces",
-    is_flag=True,
-    help=(
-        "Prevent assets that contain any recognized faces outside the specified set. "
-        "This does not by itself require that all specified faces are present; "
-        "Combine with --require-all-faces to enforce that every specified face must be present."
-    ),
-)
-@click.option(
-    "--remove-non-matching",
-    is_flag=True,
-    help="Remove assets from the album that do not satisfy the face-selection logic.",
-)
-def face_to_album(
-    key,
-    server,
-    face,
-    skip_face,
-    album,
-    timebucket,
-    verbose,
-    run_every_seconds,
-    require_all_faces,
-    no_other_faces,
-    remove_non_matching,
-):
-    headers = {"Accept": "application/json", "x-api-key": key}
+def pack_asset_ids(asset_ids):
+    """
+    Pack canonical (lowercase, hyphenated) UUID asset IDs into 16 bytes each.
 
-    def run_once():
-        # faces the user asked to include (normalize IDs to strings for robust comparisons)
-        included_face_ids = {str(f) for f in face}
+    A set of UUID strings costs well over 100 bytes per ID; the packed form
+    costs 16. Returns bytes, or None if any ID is not a canonical UUID.
+    """
+    packed = bytearray()
+    for asset_id in asset_ids:
+        if not _ASSET_UUID.fullmatch(asset_id):
+            return None
+        packed += bytes.fromhex(asset_id.replace("-", ""))
+    return bytes(packed)
 
-        if verbose:
-            click.echo(f"Included faces: {included_face_ids}")
-            if no_other_faces:
-                click.echo(
-                    "--no-other-faces is enabled; assets will be restricted to exactly these faces."
-                )
 
-        # Collect assets per included face
-        faces_asset_ids = []
-        for face_id in face:
-            if verbose:
-                click.echo(f"Processing face ID: {face_id}")
+def unpack_asset_ids(packed):
+    """Inverse of `pack_asset_ids`; returns a frozenset of UUID strings."""
+    digits = packed.hex()
+    return frozenset(
+        f"{digits[i:i + 8]}-{digits[i + 8:i + 12]}-{digits[i + 12:i + 16]}-"
+        f"{digits[i + 16:i + 20]}-{digits[i + 20:i + 32]}"
+        for i in range(0, len(digits), 32)
+    )
 
-            face_ids = set()
-            time_buckets = get_time_buckets(server, key, face_id, timebucket, verbose)
 
-            for bucket in time_buckets:
-                bucket_time = bucket.get("timeBucket")
-                bucket_assets = get_assets_for_time_bucket(
-                    server, key, face_id, bucket_time, timebucket, verbose
-                )
-                # bucket_assets["id"] is a list of asset IDs; normalize to strings
-                face_ids.update({str(a) for a in bucket_assets.get("id", [])})
+# Set bits per byte value, and the positions of those bits
+_POPCOUNT = bytes(bin(value).count("1") for value in range(256))
+_BIT_OFFSETS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
 
-            if verbose:
-                click.echo(
-                    f"Found {len(face_ids)} asset(s) for face {face_id} across all buckets"
-                )
 
-            faces_asset_ids.append(face_ids)
+class AssetIndex:
+    """
+    Dense integer numbering of the asset IDs seen during one pass.
 
-        # Determine initial candidate assets:
-        # - require_all_faces => intersection
-        # - otherwise => union (any face)
-        if require_all_faces:
-            if faces_asset_ids:
-                unique_asset_ids = set.intersection(*faces_asset_ids)
-            else:
-                unique_asset_ids = set()
-        else:
-            unique_asset_ids = set.union(*faces_asset_ids) if faces_asset_ids else set()
+    Each distinct ID string is kept once, and the sets built on the index
+    (`AssetSet`) cost one bit per numbered ID instead of a hash-table entry
+    per member. Numbering is locked, so several threads may encode at once.
+    """
 
-        if verbose:
-            mode = (
-                "AND (all faces)"
-                if require_all_faces
-                else "OR (any face)"
-            )
-            click.echo(
-                f"Initial candidate assets after {mode} combination: {len(unique_asset_ids)}"
-            )
+    def __init__(self):
+        self._ids = []
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def encode(self, asset_ids):
+        """Return an `AssetSet` of `asset_ids`, numbering IDs not seen before."""
+        if isinstance(asset_ids, AssetSet) and asset_ids.index is self:
+            return asset_ids.copy()
+        positions = self._positions
+        found = []
+        with self._lock:
+            for asset_id in asset_ids:
+                position = positions.get(asset_id)
+                if position is None:
+                    position = positions[asset_id] = len(self._ids)
+                    self._ids.append(asset_id)
+                found.append(position)
+        bits = bytearray((max(found) >> 3) + 1 if found else 0)
+        for position in found:
+            bits[position >> 3] |= 1 << (position & 7)
+        return AssetSet(self, bits)
+
+
+class AssetSet:
+    """
+    A set of asset IDs stored as a bitmap over an `AssetIndex`.
 
-        # Enforce "no other faces": assets must contain exactly the specified faces
-        # (based on recognized people from Immich).
-        if no_other_faces and unique_asset_ids:
-            filtered_asset_ids = set()
-            total_checked = 0
-            total_rejected_extra_faces = 0
-            total_rejected_missing_faces = 0
-
-            for asset_id in unique_asset_ids:
-                total_checked += 1
-                asset = get_asset(server, key, asset_id, verbose=verbose)
-                if not asset:
-                    # Failed to fetch; skip this asset
-                    continue
+    Supports the set operations a pass needs. Union, intersection and
+    difference run on the whole bitmap at once (as Python ints); membership
+    and iteration go through the index. Operands that are not sets of the
+    same index, such as plain sets of ID strings, are encoded first.
+    """
 
-                people = asset.get("people", []) or []
-                # Normalize people IDs to strings to avoid int/str mismatches from the API
-                people_ids = {str(p.get("id")) for p in people if p.get("id") is not None}
+    __slots__ = ("index", "_bits")
 
-                # Reject if any recognized face is not in the allowed set
-                if not people_ids.issubset(included_face_ids):
-                    total_rejected_extra_faces += 1
-                    if verbose:
-                        click.echo(
-                            f"Asset {asset_id} rejected: has extra faces {people_ids - included_face_ids}"
-                        )
-                    continue
+    def __init__(self, index, bits=None):
+        self.index = index
+        self._bits = bytearray() if bits is None else bits
 
-                # If --require-all-faces is set, enforce that all specified faces are present.
-                # When --no-other-faces is used without --require-all-faces, assets that contain
-                # a subset of the requested faces are allowed (only extra faces were already rejected above).
-                if require_all_faces:
-                    if not included_face_ids.issubset(people_ids):
-                        total_rejected_missing_faces += 1
-                        if verbose:
-                            missing = included_face_ids - people_ids
-                            click.echo(
-                                f"Asset {asset_id} rejected: missing required faces {missing}"
-                            )
-                        continue
+    def _coerce(self, other):
+        if isinstance(other, AssetSet) and other.index is self.index:
+            return other
+        return self.index.encode(other)
 
-                filtered_asset_ids.add(asset_id)
+    def _int(self):
+        return int.from_bytes(self._bits, "little")
 
-            unique_asset_ids = filtered_asset_ids
+    def _from_int(self, value):
+        return AssetSet(self.index, bytearray(value.to_bytes((value.bit_length() + 7) // 8, "little")))
 
-            click.echo(
-                f"After enforcing --no-other-faces: {len(unique_asset_ids)} asset(s) remain "
-                f"(checked {total_checked}, rejected extra-faces={total_rejected_extra_faces}, "
-                f"rejected missing-faces={total_rejected_missing_faces})"
-            )
+    def copy(self):
+        return AssetSet(self.index, bytearray(self._bits))
 
-        # Collect and exclude assets for skip faces
-        if skip_face:
-            skip_asset_ids = set()
-            for s_face in skip_face:
-                if verbose:
-                    click.echo(f"Collecting assets to skip for face ID: {s_face}")
-                time_buckets = get_time_buckets(
-                    server, key, s_face, timebucket, verbose
-                )
-                for bucket in time_buckets:
-                    bucket_time = bucket.get("timeBucket")
-                    bucket_assets = get_assets_for_time_bucket(
-                        server, key, s_face, bucket_time, timebucket, verbose
-                    )
-                    # Normalize skip asset IDs to strings
-                    skip_asset_ids.update({str(a) for a in bucket_assets.get("id", [])})
+    def __len__(self):
+        return sum(self._bits.translate(_POPCOUNT))
 
-            before = len(unique_asset_ids)
-            unique_asset_ids.difference_update(skip_asset_ids)
-            removed = before - len(unique_asset_ids)
-            click.echo(f"Excluded {removed} asset(s) belonging to skipped face(s)")
+    def __bool__(self):
+        return self._bits.count(0) != len(self._bits)
 
-        click.echo(f"Total unique assets to add: {len(unique_asset_ids)}")
+    def __contains__(self, asset_id):
+        position = self.index._positions.get(asset_id)
+        if position is None or position >> 3 >= len(self._bits):
+            return False
+        return bool(self._bits[position >> 3] >> (position & 7) & 1)
 
-        asset_ids_list = list(unique_asset_ids)
+    def __iter__(self):
+        ids = self.index._ids
+        for byte, value in enumerate(self._bits):
+            if value:
+                base = byte << 3
+                for bit in _BIT_OFFSETS[value]:
+                    yield ids[base + bit]
 
-        for asset_chunk in chunker(asset_ids_list, 500):
-            if verbose:
-                click.echo(
-                    f"Adding chunk of {len(asset_chunk)} assets to album {album}"
-                )
-            success = add_assets_to_album(server, key, album, asset_chunk, verbose)
-            if success:
-                click.echo(
+    def __or__(self, other):
+        return self._from_int(self._int() | self._coerce(other)._int())
+
+    def __and__(self, other):
+        return self._from_int(self._int() & self._coerce(other)._int())
+
+    def __sub__(self, other):
+        return self._from_int(self._int() & ~self._coerce(other)._int())
+
+    __ror__ = __or__
+    __rand__ = __and__
+
+    def __rsub__(self, other):
+        return self._coerce(other) - self
+
+    def __ior__(self, other):
+        self._bits = (self | other)._bits
+        return self
+
+    def __iand__(self, other):
+        self._bits = (self & other)._bits
+        return self
+
+    def __isub__(self, other):
+        self._bits = (self - other)._bits
+        return self
+
+    def update(self, other):
+        self |= other
+
+    def difference_update(self, other):
+        self -= other
+
+    def isdisjoint(self, other):
+        return not self._int() & self._coerce(other)._int()
+
+    def __eq__(self, other):
+        if isinstance(other, AssetSet):
+            if other.index is self.index:
+                return self._int() == other._int()
+            return set(self) == set(other)
+        if isinstance(other, (set, frozenset)):
+            return set(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"<AssetSet of {len(self)} asset(s)>"
+
+
+class BucketCache:
+    """
+    Per-face memory of time buckets kept between passes.
+
+    Stores each bucket's asset count and asset IDs so later crawls only fetch
+    buckets that are new or whose count changed. Buckets reported without a
+    count are always fetched again. Since the cache lives as long as the
+    process, IDs are kept packed (see `pack_asset_ids`) and only expanded
+    back into strings when a bucket is reused.
+    """
+
+    def __init__(self):
+        self._faces = {}
+        self._lock = threading.Lock()
+
+    def get(self, face_id, time_bucket, count):
+        """Return the cached asset IDs if the bucket's count is unchanged, else None."""
+        if count is None:
+            return None
+        with self._lock:
+            entry = self._faces.get(face_id, {}).get(time_bucket)
+        if entry is None or entry[0] != count:
+            return None
+        asset_ids = entry[1]
+        return unpack_asset_ids(asset_ids) if isinstance(asset_ids, bytes) else asset_ids
+
+    def put(self, face_id, time_bucket, count, asset_ids):
+        packed = pack_asset_ids(asset_ids)
+        entry = (count, frozenset(asset_ids) if packed is None else packed)
+        with self._lock:
+            self._faces.setdefault(face_id, {})[time_bucket] = entry
+
+    def prune(self, face_id, time_buckets):
+        """Forget buckets of a face that the server no longer reports."""
+        live = set(time_buckets)
+        with self._lock:
+            buckets = self._faces.get(face_id, {})
+            for time_bucket in [b for b in buckets if b not in live]:
+                del buckets[time_bucket]
+
+
+class StateStore:
+    """
+    Durable state kept in a SQLite database (``--state-db``).
+
+    Implements the `BucketCache` interface so crawls can reuse buckets across
+    separate runs, and additionally keeps the album membership snapshot and
+    last-run watermarks. Bucket contents are stored as packed UUID blobs, or
+    as JSON text when an ID is not a UUID. The database runs in WAL mode so
+    other processes can read it while a sync is writing.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS buckets (
+            face_id TEXT NOT NULL,
+            time_bucket TEXT NOT NULL,
+            count INTEGER,
+            asset_ids TEXT NOT NULL,
+            PRIMARY KEY (face_id, time_bucket)
+        );
+        CREATE TABLE IF NOT EXISTS album_assets (
+            album_id TEXT NOT NULL,
+            asset_id TEXT NOT NULL,
+            PRIMARY KEY (album_id, asset_id)
+        );
+        CREATE TABLE IF NOT EXISTS watermarks (
+            name TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _executemany(self, sql, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    def get(self, face_id, time_bucket, count):
+        """Return the stored asset IDs if the bucket's count is unchanged, else None."""
+        if count is None:
+            return None
+        rows = self._execute(
+            "SELECT count, asset_ids FROM buckets WHERE face_id = ? AND time_bucket = ?",
+            (face_id, time_bucket),
+        )
+        if not rows or rows[0][0] != count:
+            return None
+        return self._decode(rows[0][1])
+
+    def put(self, face_id, time_bucket, count, asset_ids):
+        ordered = sorted(asset_ids)
+        stored = pack_asset_ids(ordered)
+        if stored is None:
+            stored = json.dumps(ordered)
+        self._execute(
+            "INSERT OR REPLACE INTO buckets (face_id, time_bucket, count, asset_ids) VALUES (?, ?, ?, ?)",
+            (face_id, time_bucket, count, stored),
+        )
+
+    @staticmethod
+    def _decode(asset_ids):
+        if isinstance(asset_ids, bytes):
+            return unpack_asset_ids(asset_ids)
+        return frozenset(json.loads(asset_ids))
+
+    def prune(self, face_id, time_buckets):
+        """Forget buckets of a face that the server no longer reports."""
+        live = set(time_buckets)
+        stored = self._execute(
+            "SELECT time_bucket FROM buckets WHERE face_id = ?", (face_id,)
+        )
+        self._executemany(
+            "DELETE FROM buckets WHERE face_id = ? AND time_bucket = ?",
+            [(face_id, b) for (b,) in stored if b not in live],
+        )
+
+    def album_snapshot(self, album_id):
+        """Return the last known membership of an album (a set of asset IDs)."""
+        rows = self._execute(
+            "SELECT asset_id FROM album_assets WHERE album_id = ?", (album_id,)
+        )
+        return {asset_id for (asset_id,) in rows}
+
+    def save_album_snapshot(self, album_id, asset_ids):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM album_assets WHERE album_id = ?", (album_id,))
+            self._conn.executemany(
+                "INSERT INTO album_assets (album_id, asset_id) VALUES (?, ?)",
+                [(album_id, a) for a in asset_ids],
+            )
+
+    def add_album_assets(self, album_id, asset_ids):
+        self._executemany(
+            "INSERT OR IGNORE INTO album_assets (album_id, asset_id) VALUES (?, ?)",
+            [(album_id, a) for a in asset_ids],
+        )
+
+    def remove_album_assets(self, album_id, asset_ids):
+        self._executemany(
+            "DELETE FROM album_assets WHERE album_id = ? AND asset_id = ?",
+            [(album_id, a) for a in asset_ids],
+        )
+
+    def watermark(self, name):
+        """Return (value, updated_at) of a watermark, or None if never set."""
+        rows = self._execute(
+            "SELECT value, updated_at FROM watermarks WHERE name = ?", (name,)
+        )
+        return rows[0] if rows else None
+
+    def set_watermark(self, name, value):
+        self._execute(
+            "INSERT OR REPLACE INTO watermarks (name, value, updated_at) VALUES (?, ?, ?)",
+            (name, str(value), time.time()),
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _JournaledPeople(dict):
+    """A people cache (asset ID -> people IDs) that journals every new entry."""
+
+    def __init__(self, journal, entries):
+        super().__init__(entries)
+        self._journal = journal
+
+    def __setitem__(self, asset_id, people_ids):
+        super().__setitem__(asset_id, people_ids)
+        self._journal.record_people(asset_id, people_ids)
+
+
+class CheckpointJournal:
+    """
+    Append-only progress journal of the current pass (``--checkpoint``).
+
+    Fetched (face, time bucket) pairs, people looked up for
+    ``--no-other-faces`` and the AND planner, and album add batches are
+    written as JSON lines and flushed as they happen. A run started after a
+    crash reloads them, reuses buckets whose count is unchanged and people
+    already checked, and treats journaled adds as already in the album; a
+    torn last line is ignored. The journal is emptied once a pass completes.
+
+    Wraps an optional `BucketCache` or `StateStore` and implements the same
+    interface, so it can be handed to the crawl as its cache.
+    """
+
+    def __init__(self, path, cache=None):
+        self.path = path
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._people = {}
+        self._added = {}
+        self._active = 0
+        torn = False
+        try:
+            with open(path, encoding="utf-8") as journal:
+                for line in journal:
+                    torn = not line.endswith("\n")
+                    try:
+                        self._load(json.loads(line))
+                    except (ValueError, TypeError, KeyError):
+                        continue
+        except FileNotFoundError:
+            pass
+        if self._buckets or self._people or self._added:
+            click.echo(
+                f"Resuming from checkpoint {path}: "
+                f"{sum(len(b) for b in self._buckets.values())} bucket(s), "
+                f"{len(self._people)} people lookup(s), "
+                f"{sum(len(a) for a in self._added.values())} album add(s)"
+            )
+        self._file = open(path, "a", encoding="utf-8")
+        if torn:
+            # Keep the next entry off the half-written line
+            self._file.write("\n")
+
+    def _load(self, entry):
+        if "bucket" in entry:
+            face_id, time_bucket, count, asset_ids = entry["bucket"]
+            self._buckets.setdefault(face_id, {})[time_bucket] = (count, frozenset(asset_ids))
+        elif "people" in entry:
+            asset_id, people_ids = entry["people"]
+            self._people[asset_id] = set(people_ids)
+        elif "added" in entry:
+            album, asset_ids = entry["added"]
+            self._added.setdefault(album, set()).update(asset_ids)
+
+    def _append(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._load(entry)
+            self._file.write(line)
+            self._file.flush()
+
+    def get(self, face_id, time_bucket, count):
+        """Return the asset IDs from the wrapped cache or the journal, else None."""
+        if self.cache is not None:
+            cached = self.cache.get(face_id, time_bucket, count)
+            if cached is not None:
+                return cached
+        with self._lock:
+            entry = self._buckets.get(face_id, {}).get(time_bucket)
+        # A bucket fetched by the interrupted run is reused even without a count
+        if entry is None or entry[0] != count:
+            return None
+        return entry[1]
+
+    def put(self, face_id, time_bucket, count, asset_ids):
+        if self.cache is not None:
+            self.cache.put(face_id, time_bucket, count, asset_ids)
+        self._append({"bucket": [face_id, time_bucket, count, sorted(asset_ids)]})
+
+    def prune(self, face_id, time_buckets):
+        if self.cache is not None:
+            self.cache.prune(face_id, time_buckets)
+
+    def people_cache(self):
+        """Return a people cache seeded from the journal that journals new lookups."""
+        with self._lock:
+            return _JournaledPeople(self, self._people)
+
+    def record_people(self, asset_id, people_ids):
+        self._append({"people": [asset_id, sorted(people_ids)]})
+
+    def added(self, album):
+        """Asset IDs the journal has seen added to `album`."""
+        with self._lock:
+            return set(self._added.get(album, ()))
+
+    def record_added(self, album, asset_ids):
+        if asset_ids:
+            self._append({"added": [album, sorted(asset_ids)]})
+
+    def begin(self):
+        with self._lock:
+            self._active += 1
+
+    def end(self, completed):
+        """
+        Close a pass; the journal is emptied when it completed and no other
+        pass (of a concurrently scheduled rule) is still running.
+        """
+        with self._lock:
+            self._active -= 1
+            if completed and not self._active:
+                self._file.truncate(0)
+                self._buckets.clear()
+                self._people.clear()
+                self._added.clear()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+async def _run_bounded(semaphore, executor, func, *args):
+    """Run a blocking helper in the executor while holding one in-flight slot."""
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+async def _crawl_faces(
+    server_url,
+    key,
+    face_ids,
+    size,
+    verbose,
+    concurrency,
+    cache,
+    prefetched_buckets,
+    only_buckets,
+    on_bucket,
+):
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    # on_bucket may block (e.g. on a full queue); it runs on its own thread so
+    # the event loop keeps handling finished requests meanwhile
+    handoff = ThreadPoolExecutor(max_workers=1) if on_bucket is not None else None
+
+    async def hand_off(face_id, time_bucket, asset_ids):
+        await loop.run_in_executor(handoff, on_bucket, face_id, time_bucket, asset_ids)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        async def crawl_face(face_id):
+            if verbose:
+                click.echo(f"Processing face ID: {face_id}")
+
+            time_buckets = prefetched_buckets.get(face_id)
+            # Prefetched lists may be cut down (e.g. to recent buckets), so only a
+            # list fetched here is complete enough to prune the cache with
+            complete = time_buckets is None
+            if complete:
+                time_buckets = await _run_bounded(
+                    semaphore, executor, get_time_buckets, server_url, key, face_id, size, verbose
+                )
+            wanted = only_buckets.get(face_id)
+            all_buckets = time_buckets
+            if wanted is not None:
+                time_buckets = [b for b in time_buckets if b.get("timeBucket") in wanted]
+
+            async def fetch_bucket(bucket, last_try=False):
+                time_bucket = bucket.get("timeBucket")
+                count = bucket.get("count")
+                if cache is not None:
+                    cached = cache.get(face_id, time_bucket, count)
+                    if cached is not None:
+                        if on_bucket is not None:
+                            await hand_off(face_id, time_bucket, cached)
+                        return cached, True
+                try:
+                    bucket_assets = await _run_bounded(
+                        semaphore,
+                        executor,
+                        get_assets_for_time_bucket,
+                        server_url,
+                        key,
+                        face_id,
+                        time_bucket,
+                        size,
+                        verbose,
+                    )
+                except ImmichAPIError as exc:
+                    if last_try:
+                        raise
+                    click.echo(click.style(str(exc.message), fg="red"))
+                    return None, False
+                # bucket_assets["id"] is a list of asset IDs; normalize to strings
+                asset_ids = {str(a) for a in bucket_assets.get("id", [])}
+                if cache is not None:
+                    cache.put(face_id, time_bucket, count, asset_ids)
+                if on_bucket is not None:
+                    await hand_off(face_id, time_bucket, asset_ids)
+                return asset_ids, False
+
+            bucket_results = await asyncio.gather(
+                *(fetch_bucket(bucket) for bucket in time_buckets)
+            )
+            # Give buckets that failed despite the request retries one more round
+            # once the rest of the face is done, rather than failing the crawl
+            failed = [i for i, (asset_ids, _) in enumerate(bucket_results) if asset_ids is None]
+            if failed:
+                click.echo(f"Retrying {len(failed)} failed bucket(s) for face {face_id}")
+                retried = await asyncio.gather(
+                    *(fetch_bucket(time_buckets[i], last_try=True) for i in failed)
+                )
+                for i, result in zip(failed, retried):
+                    bucket_results[i] = result
+            if cache is not None and complete:
+                cache.prune(face_id, [b.get("timeBucket") for b in all_buckets])
+
+            reused = sum(1 for _, hit in bucket_results if hit)
+            if verbose and reused:
+                click.echo(
+                    f"Reused {reused} of {len(time_buckets)} unchanged bucket(s) for face {face_id}"
+                )
+            if verbose:
+                found = len(set().union(*(asset_ids for asset_ids, _ in bucket_results)))
+                where = (
+                    "across all buckets"
+                    if wanted is None
+                    else f"in {len(time_buckets)} of {len(all_buckets)} bucket(s)"
+                )
+                click.echo(f"Found {found} asset(s) for face {face_id} {where}")
+            return face_id, {
+                bucket.get("timeBucket"): asset_ids
+                for bucket, (asset_ids, _) in zip(time_buckets, bucket_results)
+            }
+
+        try:
+            results = await asyncio.gather(*(crawl_face(f) for f in face_ids))
+        finally:
+            if handoff is not None:
+                handoff.shutdown(wait=True)
+
+    return dict(results)
+
+
+def crawl_face_buckets(
+    server_url,
+    key,
+    face_ids,
+    size="MONTH",
+    verbose=False,
+    concurrency=DEFAULT_CONCURRENCY,
+    cache=None,
+    time_buckets=None,
+    only_buckets=None,
+    on_bucket=None,
+):
+    """
+    Collect the asset IDs of several faces concurrently, grouped by time bucket.
+
+    Bucket lists and bucket contents for every face are fetched on an asyncio
+    event loop, with at most `concurrency` requests in flight at once. Each
+    distinct face is crawled once. When a `BucketCache` is given, buckets
+    whose count is unchanged since the previous crawl are served from it.
+    `time_buckets` may map face IDs to bucket lists already fetched with
+    `get_time_buckets` (possibly narrowed down), which are then used instead
+    of requesting them again. `only_buckets` may map face IDs to the bucket keys worth fetching; other
+    buckets of those faces are left alone. `on_bucket(face_id, time_bucket,
+    asset_ids)` is called as soon as each bucket is available, while the rest
+    of the crawl is still running; calls are made one at a time from a
+    separate thread, so a blocking `on_bucket` delays the buckets waiting to
+    be handed off but not the event loop. Returns a dict mapping face ID to
+    {time bucket: set of asset IDs}.
+    """
+    unique_face_ids = list(dict.fromkeys(face_ids))
+    if not unique_face_ids:
+        return {}
+    return asyncio.run(
+        _crawl_faces(
+            server_url,
+            key,
+            unique_face_ids,
+            size,
+            verbose,
+            concurrency,
+            cache,
+            time_buckets or {},
+            only_buckets or {},
+            on_bucket,
+        )
+    )
+
+
+def fetch_time_buckets(
+    server_url, key, face_ids, size="MONTH", verbose=False, concurrency=DEFAULT_CONCURRENCY
+):
+    """Fetch the bucket lists of several faces concurrently; returns {face_id: buckets}."""
+    time_buckets = {}
+
+    def on_result(face_id, buckets, error):
+        if error is not None:
+            raise error
+        time_buckets[face_id] = buckets
+
+    map_bounded(
+        lambda face_id: get_time_buckets(server_url, key, face_id, size, verbose),
+        list(dict.fromkeys(face_ids)),
+        concurrency,
+        on_result,
+    )
+    return time_buckets
+
+
+def estimate_face_size(time_buckets):
+    """
+    Estimate how many assets a face has from its bucket list.
+
+    Uses the per-bucket counts when the server reports them, otherwise the
+    number of buckets, which still ranks faces by how spread out they are.
+    """
+    if any("count" in bucket for bucket in time_buckets):
+        return sum(bucket.get("count") or 0 for bucket in time_buckets)
+    return len(time_buckets)
+
+
+async def _map_bounded(func, items, concurrency, on_result):
+    loop = asyncio.get_running_loop()
+    items = iter(items)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        async def worker():
+            # Workers share one iterator; next() only ever runs on the event loop thread.
+            for item in items:
+                try:
+                    result = await loop.run_in_executor(executor, func, item)
+                    error = None
+                except Exception as exc:
+                    result, error = None, exc
+                on_result(item, result, error)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def map_bounded(func, items, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    """
+    Call `func(item)` for every item on a pool of `concurrency` workers.
+
+    Results are streamed to `on_result(item, result, error)` as soon as each
+    call finishes; `on_result` always runs on the event loop thread, so it can
+    update plain counters and sets. An exception raised by one call is passed
+    as `error` and does not stop the other workers.
+    """
+    asyncio.run(_map_bounded(func, items, concurrency, on_result or (lambda *_: None)))
+
+
+def people_ids_of(asset):
+    """Return the recognized people of an asset as a set of string IDs."""
+    people = asset.get("people", []) or []
+    # Normalize people IDs to strings to avoid int/str mismatches from the API
+    return {str(p.get("id")) for p in people if p.get("id") is not None}
+
+
+def check_exact_faces(people_ids, included_face_ids, require_all_faces):
+    """
+    Decide whether an asset's people satisfy --no-other-faces.
+
+    Returns None when the asset is accepted, otherwise the rejection reason:
+    "extra" (a recognized face outside the allowed set) or "missing" (with
+    --require-all-faces, a specified face is absent).
+    """
+    # Reject if any recognized face is not in the allowed set
+    if not people_ids.issubset(included_face_ids):
+        return "extra"
+    # If --require-all-faces is set, enforce that all specified faces are present.
+    # When --no-other-faces is used without --require-all-faces, assets that contain
+    # a subset of the requested faces are allowed (only extra faces were already rejected above).
+    if require_all_faces and not included_face_ids.issubset(people_ids):
+        return "missing"
+    return None
+
+
+def filter_exact_faces(
+    server_url,
+    key,
+    asset_ids,
+    included_face_ids,
+    require_all_faces=False,
+    verbose=False,
+    concurrency=DEFAULT_CONCURRENCY,
+    people_lookup="search",
+    people_cache=None,
+):
+    """
+    Keep only the assets whose recognized people match --no-other-faces.
+
+    With `people_lookup="search"`, people are first fetched in bulk pages via
+    `get_people_bulk`; any asset the search did not return (or every asset,
+    on servers without the search endpoint) is looked up individually with
+    `get_asset` on a bounded worker pool, streaming verdicts into the
+    filtered set. A lookup that fails (bad status or exception) drops only
+    that asset. An optional `people_cache` dict (asset ID -> people IDs) is
+    consulted first and filled with every successful lookup, so several
+    rules in one pass share them. Returns the filtered set and a dict of
+    counters: checked, rejected_extra, rejected_missing, failed.
+    """
+    filtered_asset_ids = set()
+    stats = {"checked": 0, "rejected_extra": 0, "rejected_missing": 0, "failed": 0}
+    total = len(asset_ids)
+
+    def record(asset_id, people_ids):
+        stats["checked"] += 1
+        if people_ids is not None and people_cache is not None:
+            people_cache[asset_id] = people_ids
+        if people_ids is None:
+            # Failed to fetch; skip this asset
+            stats["failed"] += 1
+        else:
+            reason = check_exact_faces(people_ids, included_face_ids, require_all_faces)
+            if reason == "extra":
+                stats["rejected_extra"] += 1
+                if verbose:
+                    click.echo(
+                        f"Asset {asset_id} rejected: has extra faces {people_ids - included_face_ids}"
+                    )
+            elif reason == "missing":
+                stats["rejected_missing"] += 1
+                if verbose:
+                    click.echo(
+                        f"Asset {asset_id} rejected: missing required faces {included_face_ids - people_ids}"
+                    )
+            else:
+                filtered_asset_ids.add(asset_id)
+
+        if stats["checked"] % PROGRESS_EVERY == 0:
+            rejected = stats["rejected_extra"] + stats["rejected_missing"]
+            click.echo(
+                f"--no-other-faces progress: checked {stats['checked']}/{total}, rejected {rejected}"
+            )
+
+    remaining = set(asset_ids)
+    if people_cache:
+        for asset_id in [a for a in remaining if a in people_cache]:
+            record(asset_id, people_cache[asset_id])
+            remaining.discard(asset_id)
+
+    if people_lookup == "search" and remaining:
+        # AND mode: one search for assets with all faces covers the intersection.
+        # OR mode: one search per face covers the union.
+        searches = (
+            [sorted(included_face_ids)]
+            if require_all_faces
+            else [[face_id] for face_id in sorted(included_face_ids)]
+        )
+        for person_ids in searches:
+            if not remaining:
+                break
+            found = get_people_bulk(server_url, key, person_ids, remaining, verbose=verbose)
+            if found is None:
+                click.echo(
+                    "Metadata search unavailable; falling back to per-asset lookups."
+                )
+                break
+            for asset_id, people_ids in found.items():
+                record(asset_id, people_ids)
+            remaining.difference_update(found)
+
+    def lookup(asset_id):
+        return get_asset(server_url, key, asset_id, verbose=verbose)
+
+    def on_result(asset_id, asset, error):
+        if error is not None:
+            click.echo(click.style(f"Failed to fetch asset {asset_id}: {error}", fg="red"))
+        record(asset_id, people_ids_of(asset) if error is None and asset else None)
+
+    if remaining:
+        map_bounded(lookup, remaining, concurrency, on_result)
+    return filtered_asset_ids, stats
+
+
+def keep_assets_with_faces(
+    server_url,
+    key,
+    asset_ids,
+    face_ids,
+    verbose=False,
+    concurrency=DEFAULT_CONCURRENCY,
+    people_cache=None,
+):
+    """
+    Keep the assets whose recognized people include every one of `face_ids`.
+
+    People come from `people_cache` when present, otherwise from per-asset
+    `get_asset` lookups on a bounded worker pool (which are added to the
+    cache). An asset whose lookup fails is dropped. Returns a new set.
+    """
+    face_ids = {str(f) for f in face_ids}
+    kept = set()
+    remaining = []
+    for asset_id in asset_ids:
+        if people_cache is not None and asset_id in people_cache:
+            if face_ids <= people_cache[asset_id]:
+                kept.add(asset_id)
+        else:
+            remaining.append(asset_id)
+
+    def on_result(asset_id, asset, error):
+        if error is not None or not asset:
+            click.echo(click.style(f"Failed to fetch asset {asset_id}: {error}", fg="red"))
+            return
+        people_ids = people_ids_of(asset)
+        if people_cache is not None:
+            people_cache[asset_id] = people_ids
+        if face_ids <= people_ids:
+            kept.add(asset_id)
+
+    if remaining:
+        map_bounded(
+            lambda asset_id: get_asset(server_url, key, asset_id, verbose=verbose),
+            remaining,
+            concurrency,
+            on_result,
+        )
+    return kept
+
+
+def chunker(seq, size):
+    return (seq[pos : pos + size] for pos in range(0, len(seq), size))
+
+
+class ChunkSizer:
+    """
+    Adaptive size of album write batches.
+
+    Starts at `initial`. A batch answered within `target` seconds grows the
+    size by half; a slower one leaves it alone; a batch refused as too large
+    (413) or timed out halves it. The size stays within `minimum` and
+    `maximum`. Batches run in parallel, so updates are locked.
+    """
+
+    def __init__(
+        self,
+        initial=ADD_CHUNK_SIZE,
+        minimum=WRITE_CHUNK_MIN,
+        maximum=WRITE_CHUNK_MAX,
+        target=WRITE_CHUNK_TARGET_SECONDS,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self._size = max(minimum, min(maximum, initial))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self._size
+
+    def update(self, seconds, too_large=False):
+        with self._lock:
+            if too_large:
+                self._size = max(self.minimum, self._size // 2)
+            elif seconds <= self.target:
+                self._size = min(self.maximum, self._size + self._size // 2)
+
+
+def send_batch(send, chunk, sizer):
+    """
+    Send one write batch with `send(chunk, can_split)` and report it to `sizer`.
+
+    `send` returns False when the server refused the batch as too large and
+    `can_split` was True; such a batch, like one that timed out, is split in
+    two and both halves are sent again. Batches at `sizer.minimum` are not
+    split any further, so `send` must then record the failure itself; a
+    timeout there raises ImmichAPIError.
+    """
+    can_split = len(chunk) > sizer.minimum
+    started = time.monotonic()
+    try:
+        done = send(chunk, can_split)
+    except requests.Timeout as exc:
+        if not can_split:
+            raise ImmichAPIError(f"Album write of {len(chunk)} asset(s) timed out: {exc}")
+        done = False
+    sizer.update(time.monotonic() - started, too_large=not done)
+    if not done:
+        half = len(chunk) // 2
+        send_batch(send, chunk[:half], sizer)
+        send_batch(send, chunk[half:], sizer)
+
+
+def send_in_batches(send, asset_ids, sizer=None, concurrency=1):
+    """
+    Write `asset_ids` in batches of adaptive size, `concurrency` at a time.
+
+    Each batch is cut at the current `sizer.size` when a worker picks it up,
+    so the size learned from earlier responses applies right away (see
+    `send_batch` for the `send` contract). An exception from any batch is
+    raised once the batches already in flight have finished.
+    """
+    sizer = sizer or ChunkSizer()
+    asset_ids = list(asset_ids)
+
+    def batches():
+        start = 0
+        while start < len(asset_ids):
+            size = sizer.size
+            yield asset_ids[start : start + size]
+            start += size
+
+    def on_result(chunk, result, error):
+        if error is not None:
+            raise error
+
+    map_bounded(lambda chunk: send_batch(send, chunk, sizer), batches(), concurrency, on_result)
+
+
+_SELECTION_TOKEN = re.compile(r"\s*(?:([()&|!])|([A-Za-z0-9_.:-]+))")
+
+
+def parse_selection(text, aliases=None):
+    """
+    Parse a boolean face expression such as ``(alice | bob) & !carol``.
+
+    Operands are face IDs or names from `aliases`; `!` binds tighter than `&`,
+    which binds tighter than `|`. Returns a plan tree of tuples:
+    ``("face", id)``, ``("not", node)``, ``("and", (nodes...))`` and
+    ``("or", (nodes...))``. A negation is only allowed as an operand of `&`
+    next to at least one positive operand, so every plan selects a finite set.
+    Raises ValueError on malformed expressions.
+    """
+    aliases = aliases or {}
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _SELECTION_TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Unexpected character {text[pos]!r} at position {pos}")
+        tokens.append(match.group(1) or ("face", match.group(2)))
+        pos = match.end()
+
+    def peek():
+        return tokens[0] if tokens else None
+
+    def parse_or():
+        nodes = [parse_and()]
+        while peek() == "|":
+            tokens.pop(0)
+            nodes.append(parse_and())
+        return _join("or", nodes)
+
+    def parse_and():
+        nodes = [parse_not()]
+        while peek() == "&":
+            tokens.pop(0)
+            nodes.append(parse_not())
+        return _join("and", nodes)
+
+    def parse_not():
+        token = tokens.pop(0) if tokens else None
+        if token == "!":
+            return ("not", parse_not())
+        if token == "(":
+            node = parse_or()
+            if not tokens or tokens.pop(0) != ")":
+                raise ValueError("Missing closing parenthesis")
+            return node
+        if isinstance(token, tuple):
+            return ("face", str(aliases.get(token[1], token[1])))
+        raise ValueError(f"Expected a face, '!' or '(' but got {token or 'end of expression'!r}")
+
+    if not tokens:
+        raise ValueError("Empty selection expression")
+    plan = parse_or()
+    if tokens:
+        token = tokens[0]
+        raise ValueError(f"Unexpected {token if isinstance(token, str) else token[1]!r}")
+    _check_bounded(plan)
+    return plan
+
+
+def _join(kind, nodes):
+    flat = []
+    for node in nodes:
+        flat.extend(node[1] if node[0] == kind else [node])
+    return flat[0] if len(flat) == 1 else (kind, tuple(flat))
+
+
+def _check_bounded(node):
+    kind = node[0]
+    if kind == "not":
+        raise ValueError("A negated term must be combined with a positive term using '&'")
+    if kind == "or":
+        for child in node[1]:
+            _check_bounded(child)
+    elif kind == "and":
+        positives = [child for child in node[1] if child[0] != "not"]
+        if not positives:
+            raise ValueError("A negated term must be combined with a positive term using '&'")
+        for child in node[1]:
+            # a subtracted subtree is evaluated on its own, so it must be bounded too
+            _check_bounded(child[1] if child[0] == "not" else child)
+
+
+def plan_faces(node, negated=False):
+    """Return (positive, negative) sets of face IDs referenced by a plan."""
+    kind = node[0]
+    if kind == "face":
+        return (set(), {node[1]}) if negated else ({node[1]}, set())
+    if kind == "not":
+        return plan_faces(node[1], not negated)
+    positive, negative = set(), set()
+    for child in node[1]:
+        p, n = plan_faces(child, negated)
+        positive |= p
+        negative |= n
+    return positive, negative
+
+
+def estimate_plan(node, estimates):
+    """Estimate the number of assets a plan node selects from per-face estimates."""
+    kind = node[0]
+    if kind == "face":
+        return estimates.get(node[1], float("inf"))
+    if kind == "not":
+        return estimate_plan(node[1], estimates)
+    sizes = [estimate_plan(child, estimates) for child in node[1] if child[0] != "not"]
+    return sum(sizes) if kind == "or" else min(sizes)
+
+
+def optimize_plan(node, estimates):
+    """
+    Reorder a plan so cheaper work comes first.
+
+    Inside `&`, positive operands are sorted by estimated size (smallest
+    first, so an empty intersection is found before larger faces are
+    fetched) and negations are moved after them; `|` operands are sorted the
+    same way.
+    """
+    kind = node[0]
+    if kind == "face":
+        return node
+    if kind == "not":
+        return ("not", optimize_plan(node[1], estimates))
+    children = [optimize_plan(child, estimates) for child in node[1]]
+    children.sort(key=lambda child: (child[0] == "not", estimate_plan(child, estimates)))
+    return (kind, tuple(children))
+
+
+def evaluate_plan(node, fetch):
+    """
+    Evaluate a plan, calling `fetch(face_id)` for each face set it needs.
+
+    Intersections stop as soon as they become empty, so faces later in an
+    optimized `&` are never fetched in that case. Returns a new set of the
+    same type as the fetched ones (a copy of the first set fetched).
+    """
+    kind = node[0]
+    if kind == "face":
+        return fetch(node[1]).copy()
+    if kind == "or":
+        result = evaluate_plan(node[1][0], fetch)
+        for child in node[1][1:]:
+            result |= evaluate_plan(child, fetch)
+        return result
+
+    positives = [child for child in node[1] if child[0] != "not"]
+    negatives = [child[1] for child in node[1] if child[0] == "not"]
+    result = evaluate_plan(positives[0], fetch)
+    for child in positives[1:]:
+        if not result:
+            return result
+        result &= evaluate_plan(child, fetch)
+    for child in negatives:
+        if not result:
+            return result
+        result -= evaluate_plan(child, fetch)
+    return result
+
+
+def format_plan(node):
+    """Render a plan tree back into expression syntax."""
+    kind = node[0]
+    if kind == "face":
+        return node[1]
+    if kind == "not":
+        inner = format_plan(node[1])
+        return f"!{inner}" if node[1][0] == "face" else f"!({inner})"
+    joiner = " & " if kind == "and" else " | "
+    return joiner.join(
+        f"({format_plan(child)})" if child[0] in ("and", "or") else format_plan(child)
+        for child in node[1]
+    )
+
+
+RULE_KEYS = {
+    "name",
+    "face",
+    "skip_face",
+    "album",
+    "require_all_faces",
+    "no_other_faces",
+    "remove_non_matching",
+    "interval",
+    "priority",
+    "jitter",
+    "select",
+}
+
+
+def _seconds(setting, value):
+    """Coerce a rule's duration setting to float seconds; None stays None."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{setting}' must be a number of seconds, got {value!r}")
+
+
+def make_rule(
+    face,
+    album,
+    skip_face=(),
+    require_all_faces=False,
+    no_other_faces=False,
+    remove_non_matching=False,
+    name=None,
+    interval=None,
+    priority=0,
+    jitter=None,
+    select=None,
+    aliases=None,
+):
+    """
+    Build a face→album rule dict with face IDs normalized to lists of strings.
+
+    `interval`, `priority` and `jitter` (seconds) are only used by the
+    `RuleScheduler`. `select` is a boolean face expression (see
+    `parse_selection`, with names resolved through `aliases`) used instead of
+    `face`; its parsed plan is stored under `plan` and its positive faces
+    become the rule's `face` list. Raises ValueError for a bad expression,
+    when `select` is combined with `require_all_faces`, or for an `interval`
+    that is not a positive number of seconds or a negative `jitter`.
+    """
+    interval = _seconds("interval", interval)
+    if interval is not None and interval <= 0:
+        raise ValueError(f"'interval' must be a positive number of seconds, got {interval:g}")
+    jitter = _seconds("jitter", jitter)
+    if jitter is not None and jitter < 0:
+        raise ValueError(f"'jitter' must not be negative, got {jitter:g}")
+    plan = None
+    if select:
+        if require_all_faces:
+            raise ValueError(
+                "'select' cannot be combined with 'require_all_faces'; use '&' in the expression"
+            )
+        plan = parse_selection(select, aliases)
+        face = sorted(plan_faces(plan)[0])
+    if isinstance(face, str):
+        face = [face]
+    if isinstance(skip_face, str):
+        skip_face = [skip_face]
+    return {
+        "name": name or str(album),
+        "face": [str(f) for f in face],
+        "skip_face": [str(f) for f in skip_face],
+        "album": str(album),
+        "require_all_faces": bool(require_all_faces),
+        "no_other_faces": bool(no_other_faces),
+        "remove_non_matching": bool(remove_non_matching),
+        "interval": interval,
+        "priority": int(priority or 0),
+        "jitter": jitter,
+        "select": select or None,
+        "plan": plan,
+    }
+
+
+def load_config(path):
+    """
+    Read a multi-rule config file (TOML, YAML or JSON, chosen by extension).
+
+    The file may set `key` and `server` and must contain a `rules` list; each
+    rule takes the same settings as the single-rule command line (`face`,
+    `skip_face`, `album`, `require_all_faces`, `no_other_faces`,
+    `remove_non_matching`) plus an optional `name` and the scheduling
+    settings `interval`, `priority` and `jitter`. A rule may use a `select`
+    expression instead of `face`; names in it are looked up in the top-level
+    `aliases` mapping. Returns a dict with `key`, `server` and the normalized
+    `rules`.
+    """
+    lower = path.lower()
+    try:
+        if lower.endswith(".toml"):
+            if tomllib is None:
+                raise click.ClickException(
+                    "Reading TOML config files on Python < 3.11 requires the 'tomli' package "
+                    "(pip install 'immich-face-to-album[config]')."
+                )
+            with open(path, "rb") as f:
+                data = tomllib.load(f)
+        elif lower.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise click.ClickException(
+                    "Reading YAML config files requires the 'pyyaml' package "
+                    "(pip install 'immich-face-to-album[config]')."
+                )
+            with open(path) as f:
+                data = yaml.safe_load(f)
+        elif lower.endswith(".json"):
+            with open(path) as f:
+                data = json.load(f)
+        else:
+            raise click.ClickException(
+                f"Unsupported config file {path}: use a .toml, .yaml/.yml or .json extension."
+            )
+    except (OSError, ValueError) as exc:
+        raise click.ClickException(f"Could not read config file {path}: {exc}")
+
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list) or not data["rules"]:
+        raise click.ClickException(f"Config file {path} must define a non-empty 'rules' list.")
+
+    aliases = data.get("aliases") or {}
+    if not isinstance(aliases, dict):
+        raise click.ClickException(f"'aliases' in {path} must be a table/mapping.")
+
+    rules = []
+    for index, raw in enumerate(data["rules"], start=1):
+        if not isinstance(raw, dict):
+            raise click.ClickException(f"Rule #{index} in {path} must be a table/mapping.")
+        unknown = set(raw) - RULE_KEYS
+        if unknown:
+            raise click.ClickException(
+                f"Rule #{index} in {path} has unknown setting(s): {', '.join(sorted(unknown))}"
+            )
+        if raw.get("face") and raw.get("select"):
+            raise click.ClickException(f"Rule #{index} in {path} sets both 'face' and 'select'.")
+        if not (raw.get("face") or raw.get("select")) or not raw.get("album"):
+            raise click.ClickException(
+                f"Rule #{index} in {path} needs 'face' (or 'select') and 'album'."
+            )
+        try:
+            # A select rule has no 'face'; make_rule derives it from the expression
+            rules.append(make_rule(aliases=aliases, **{"face": (), **raw}))
+        except ValueError as exc:
+            raise click.ClickException(f"Rule #{index} in {path} is invalid: {exc}")
+
+    return {"key": data.get("key"), "server": data.get("server"), "rules": rules}
+
+
+PLAN_VERSION = 1
+
+
+def write_plan(path, server, planned):
+    """
+    Write the diffs computed by a `--plan-out` pass to a JSON file.
+
+    Each entry of `planned` holds a rule's album, the exact asset IDs to add
+    and remove, and the inputs they were computed from.
+    """
+    plan = {
+        "version": PLAN_VERSION,
+        "created": time.time(),
+        "server": server,
+        "rules": planned,
+    }
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=2)
+            f.write("\n")
+    except OSError as exc:
+        raise click.ClickException(f"Could not write plan file {path}: {exc}")
+
+
+def load_plan(path):
+    """Read and validate a plan file written by `--plan-out`; returns the plan dict."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            plan = json.load(f)
+    except (OSError, ValueError) as exc:
+        raise click.ClickException(f"Could not read plan file {path}: {exc}")
+
+    if not isinstance(plan, dict) or plan.get("version") != PLAN_VERSION:
+        raise click.ClickException(f"{path} is not a version {PLAN_VERSION} plan file.")
+    if not isinstance(plan.get("rules"), list):
+        raise click.ClickException(f"Plan file {path} must contain a 'rules' list.")
+    for index, entry in enumerate(plan["rules"], start=1):
+        if (
+            not isinstance(entry, dict)
+            or not entry.get("album")
+            or not isinstance(entry.get("add"), list)
+            or not isinstance(entry.get("remove"), list)
+        ):
+            raise click.ClickException(
+                f"Rule #{index} in plan file {path} needs an 'album' and 'add'/'remove' lists."
+            )
+    return plan
+
+
+class AlbumSync:
+    """
+    Runs face→album rules against one Immich server.
+
+    Holds the settings and caches shared by every rule, so a pass over several
+    rules crawls each distinct face once and evaluates every rule against the
+    same in-memory face sets.
+    """
+
+    def __init__(
+        self,
+        server,
+        key,
+        timebucket="MONTH",
+        verbose=False,
+        concurrency=DEFAULT_CONCURRENCY,
+        people_lookup="search",
+        and_strategy="search",
+        bucket_cache=None,
+        state=None,
+        stream=True,
+        hot_buckets=0,
+        full_sync_every=DEFAULT_FULL_SYNC_EVERY,
+        full_sync_hours=0,
+        checkpoint=None,
+        planned=None,
+    ):
+        self.server = server
+        self.key = key
+        self.timebucket = timebucket
+        self.verbose = verbose
+        self.concurrency = concurrency
+        self.people_lookup = people_lookup
+        self.and_strategy = and_strategy
+        self.bucket_cache = bucket_cache
+        self.state = state
+        self.stream = stream
+        self.hot_buckets = hot_buckets
+        self.full_sync_every = full_sync_every
+        self.full_sync_hours = full_sync_hours
+        self.checkpoint = checkpoint
+        # With --plan-out, a list collecting each rule's diff instead of writing it
+        self.planned = planned
+        # Learned across rules and passes, separately for adds and removals
+        self.write_sizer = ChunkSizer()
+        self.remove_sizer = ChunkSizer()
+        self._tiers = {}
+        self._tiers_lock = threading.Lock()
+
+    def run_pass(self, rules):
+        """
+        Sync every rule once, sharing face crawls and people lookups between rules.
+
+        With `hot_buckets` set, a pass only crawls the newest buckets unless a
+        full reconciliation is due (first pass, every `full_sync_every` passes
+        or after `full_sync_hours`); removals only happen on full passes.
+        With a `checkpoint` journal, progress is journaled until the pass
+        completes. Returns the number of assets added to or removed from albums.
+        """
+        if self.checkpoint is None:
+            return self._run_pass(rules)
+        self.checkpoint.begin()
+        completed = False
+        try:
+            changes = self._run_pass(rules)
+            completed = True
+        finally:
+            self.checkpoint.end(completed)
+        return changes
+
+    def _run_pass(self, rules):
+        # With --hot-buckets, most passes only look at the newest buckets: their
+        # bucket lists are fetched and cut down up front, and every crawl below
+        # works from these lists
+        tier = ",".join(rule["name"] for rule in rules)
+        full = self._full_pass_due(tier)
+        time_buckets = {} if full else self._recent_buckets(rules)
+
+        if len(rules) == 1 and self.streamable(rules[0]):
+            changes = self.stream_rule(rules[0], time_buckets, full)
+        else:
+            changes = self._run_rules(rules, time_buckets, full)
+        self._record_pass(tier, full)
+        return changes
+
+    def _full_pass_due(self, tier):
+        """Whether this pass must reconcile the full history (see --hot-buckets)."""
+        if not self.hot_buckets:
+            return True
+        with self._tiers_lock:
+            if tier not in self._tiers and self.state:
+                passes = self.state.watermark(f"tier:{tier}:hot_passes")
+                last_full = self.state.watermark(f"tier:{tier}:last_full")
+                if passes and last_full:
+                    self._tiers[tier] = (int(passes[0]), float(last_full[0]))
+            hot_passes, last_full = self._tiers.get(tier, (None, None))
+        if hot_passes is None:
+            return True
+        if self.full_sync_every and hot_passes + 1 >= self.full_sync_every:
+            return True
+        return bool(
+            self.full_sync_hours and time.time() - last_full >= self.full_sync_hours * 3600
+        )
+
+    def _record_pass(self, tier, full):
+        if not self.hot_buckets:
+            return
+        with self._tiers_lock:
+            hot_passes, last_full = self._tiers.get(tier, (0, time.time()))
+            if full:
+                hot_passes, last_full = 0, time.time()
+            else:
+                hot_passes += 1
+            self._tiers[tier] = (hot_passes, last_full)
+        if self.state:
+            self.state.set_watermark(f"tier:{tier}:hot_passes", hot_passes)
+            self.state.set_watermark(f"tier:{tier}:last_full", last_full)
+
+    def _recent_buckets(self, rules):
+        """
+        Fetch the bucket lists of every face used by `rules`, cut down to the
+        `hot_buckets` newest bucket keys seen across all of them.
+
+        The same keys are kept for every face, so AND, skip and select logic
+        stay consistent within the window. Returns {face_id: buckets}.
+        """
+        face_ids = []
+        for rule in rules:
+            face_ids.extend(rule["face"])
+            face_ids.extend(rule["skip_face"])
+            if rule["plan"] is not None:
+                positive, negative = plan_faces(rule["plan"])
+                face_ids.extend(sorted(positive | negative))
+        time_buckets = fetch_time_buckets(
+            self.server, self.key, face_ids, self.timebucket, self.verbose, self.concurrency
+        )
+        keys = {bucket.get("timeBucket") for buckets in time_buckets.values() for bucket in buckets}
+        recent = set(sorted(keys, reverse=True)[: self.hot_buckets])
+        click.echo(
+            f"Recent-buckets pass: syncing the {len(recent)} newest bucket(s) "
+            f"(full reconciliation every {self.full_sync_every or '-'} pass(es)"
+            + (f" or {self.full_sync_hours:g} hour(s)" if self.full_sync_hours else "")
+            + ")"
+        )
+        return {
+            face_id: [bucket for bucket in buckets if bucket.get("timeBucket") in recent]
+            for face_id, buckets in time_buckets.items()
+        }
+
+    def _run_rules(self, rules, time_buckets, full):
+        """Evaluate and apply `rules` together, crawling from `time_buckets` when given."""
+        verbose = self.verbose
+
+        # With --require-all-faces, first try to let the server evaluate the AND so
+        # only the intersection is paged instead of every face being crawled. The
+        # search covers all history, so recent-buckets passes use the planner.
+        searched = {}
+        for index, rule in enumerate(rules):
+            if full and rule["plan"] is None and (
+                rule["require_all_faces"]
+                and self.and_strategy == "search"
+                and len(set(rule["face"])) > 1
+            ):
+                searched[index] = search_assets_with_faces(
+                    self.server, self.key, sorted(set(rule["face"])), verbose=verbose
+                )
+                if searched[index] is None:
+                    click.echo(
+                        "Server-side AND search unavailable; falling back to crawl-and-intersect."
+                    )
+
+        # AND rules the server did not evaluate go through the cost-based planner
+        planned = [
+            index
+            for index, rule in enumerate(rules)
+            if rule["plan"] is None
+            and rule["require_all_faces"]
+            and searched.get(index) is None
+            and len(set(rule["face"])) > 1
+        ]
+
+        # Crawl the included faces of all rules together so each distinct face is
+        # crawled once and their buckets are fetched concurrently. Skip faces are
+        # crawled later, and only where a rule's candidates are.
+        faces_to_crawl = []
+        for index, rule in enumerate(rules):
+            if searched.get(index) is None and rule["plan"] is None and index not in planned:
+                faces_to_crawl.extend(rule["face"])
+        face_buckets = crawl_face_buckets(
+            self.server,
+            self.key,
+            faces_to_crawl,
+            self.timebucket,
+            verbose,
+            self.concurrency,
+            self.bucket_cache,
+            time_buckets,
+        )
+        # Face, album and selected sets of this pass are bitmaps over one index
+        asset_index = AssetIndex()
+        face_asset_ids = {
+            face_id: asset_index.encode(itertools.chain.from_iterable(buckets.values()))
+            for face_id, buckets in face_buckets.items()
+        }
+        searched.update(
+            self.evaluate_selections(
+                rules, face_asset_ids, face_buckets, time_buckets, asset_index
+            )
+        )
+
+        people_cache = self.checkpoint.people_cache() if self.checkpoint else {}
+        bucket_hints = {}
+        for index in planned:
+            searched[index], bucket_hints[index] = self.intersect_faces(
+                rules[index]["face"], face_asset_ids, time_buckets, people_cache
+            )
+        skip_buckets = {}
+        changes = 0
+        for index, rule in enumerate(rules):
+            if len(rules) > 1:
+                click.echo(
+                    click.style(f"Rule {rule['name']} (album {rule['album']})", bold=True)
+                )
+            skip_assets = functools.partial(
+                self.skipped_assets,
+                rule,
+                hint=bucket_hints.get(index),
+                face_buckets=face_buckets,
+                time_buckets=time_buckets,
+                skip_buckets=skip_buckets,
+            )
+            unique_asset_ids = self.select(
+                rule, face_asset_ids, searched.get(index), people_cache, skip_assets, asset_index
+            )
+            changes += self.apply(rule, unique_asset_ids, full)
+        return changes
+
+    def evaluate_selections(
+        self, rules, face_asset_ids, face_buckets, time_buckets, asset_index=None
+    ):
+        """
+        Evaluate the `select` expressions of `rules`.
+
+        Every referenced face's bucket list is fetched up front (into
+        `time_buckets`) to estimate its size, each plan is reordered with
+        `optimize_plan`, and faces are then crawled only when the evaluation
+        reaches them (and at most once, via `face_asset_ids` and
+        `face_buckets`; faces crawled here are encoded on `asset_index`).
+        Returns {rule index: set of asset IDs}.
+        """
+        asset_index = asset_index or AssetIndex()
+        selecting = [(index, rule) for index, rule in enumerate(rules) if rule["plan"]]
+        if not selecting:
+            return {}
+
+        plan_face_ids = set()
+        for _, rule in selecting:
+            positive, negative = plan_faces(rule["plan"])
+            plan_face_ids |= positive | negative
+        time_buckets.update(
+            fetch_time_buckets(
+                self.server,
+                self.key,
+                sorted(plan_face_ids - set(face_asset_ids) - set(time_buckets)),
+                self.timebucket,
+                self.verbose,
+                self.concurrency,
+            )
+        )
+        estimates = {
+            face_id: estimate_face_size(buckets) for face_id, buckets in time_buckets.items()
+        }
+        for face_id, asset_ids in face_asset_ids.items():
+            estimates[face_id] = len(asset_ids)
+
+        def fetch(face_id):
+            if face_id not in face_asset_ids:
+                face_buckets.update(
+                    crawl_face_buckets(
+                        self.server,
+                        self.key,
+                        [face_id],
+                        self.timebucket,
+                        self.verbose,
+                        self.concurrency,
+                        self.bucket_cache,
+                        time_buckets,
+                    )
+                )
+                face_asset_ids[face_id] = asset_index.encode(
+                    itertools.chain.from_iterable(face_buckets[face_id].values())
+                )
+            return face_asset_ids[face_id]
+
+        results = {}
+        for index, rule in selecting:
+            plan = optimize_plan(rule["plan"], estimates)
+            if self.verbose:
+                click.echo(f"Selection plan for rule {rule['name']}: {format_plan(plan)}")
+            results[index] = evaluate_plan(plan, fetch)
+        return results
+
+    def intersect_faces(self, face_ids, face_asset_ids, time_buckets, people_cache):
+        """
+        Evaluate an AND of faces without crawling every face in full.
+
+        Reads the bucket lists (and counts) of all faces first; only time
+        buckets that every face has can hold a match, so no other bucket is
+        fetched. Those shared buckets are then evaluated a batch at a time:
+        the rarest face's assets are fetched, and each other face, smallest
+        first, is checked against the surviving candidates in whichever way
+        needs fewer requests -- fetching its buckets that still hold
+        candidates, or looking up the people of each candidate. Faces already
+        in `face_asset_ids` are applied as plain filters. `time_buckets`
+        caches bucket lists between rules. Returns a new set of asset IDs and
+        the set of time buckets holding them (None if unknown).
+        """
+        face_ids = list(dict.fromkeys(face_ids))
+        known = [face_asset_ids[f] for f in face_ids if f in face_asset_ids]
+        pending = [f for f in face_ids if f not in face_asset_ids]
+        if not pending:
+            matches = known[0].copy()
+            for known_ids in known[1:]:
+                matches &= known_ids
+            return matches, None
+
+        time_buckets.update(
+            fetch_time_buckets(
+                self.server,
+                self.key,
+                [f for f in pending if f not in time_buckets],
+                self.timebucket,
+                self.verbose,
+                self.concurrency,
+            )
+        )
+        shared = set.intersection(
+            *({bucket.get("timeBucket") for bucket in time_buckets[f]} for f in pending)
+        )
+        pending.sort(
+            key=lambda face_id: estimate_face_size(
+                [b for b in time_buckets[face_id] if b.get("timeBucket") in shared]
+            )
+        )
+        rarest = pending[0]
+        if self.verbose:
+            click.echo(
+                f"AND plan: {len(shared)} time bucket(s) shared by all faces, "
+                f"starting from rarest face {rarest}"
+            )
+
+        def fetch(face_id, buckets):
+            return crawl_face_buckets(
+                self.server,
+                self.key,
+                [face_id],
+                self.timebucket,
+                self.verbose,
+                self.concurrency,
+                self.bucket_cache,
+                time_buckets,
+                {face_id: set(buckets)},
+            )[face_id]
+
+        matches = set()
+        match_buckets = set()
+        for batch in chunker(sorted(shared), AND_BUCKET_BATCH):
+            candidates = {}
+            for bucket, asset_ids in fetch(rarest, batch).items():
+                for known_ids in known:
+                    asset_ids &= known_ids
+                if asset_ids:
+                    candidates[bucket] = asset_ids
+
+            for face_id in pending[1:]:
+                if not candidates:
+                    break
+                lookups = sum(
+                    1
+                    for asset_ids in candidates.values()
+                    for asset_id in asset_ids
+                    if asset_id not in people_cache
+                )
+                if len(candidates) <= lookups:
+                    if self.verbose:
+                        click.echo(
+                            f"AND plan: verifying face {face_id} with {len(candidates)} bucket(s)"
+                        )
+                    found = fetch(face_id, candidates)
+                    checked = {b: ids & found.get(b, set()) for b, ids in candidates.items()}
+                else:
+                    if self.verbose:
+                        click.echo(
+                            f"AND plan: verifying face {face_id} with {lookups} people lookup(s)"
+                        )
+                    kept = keep_assets_with_faces(
+                        self.server,
+                        self.key,
+                        set().union(*candidates.values()),
+                        [face_id],
+                        self.verbose,
+                        self.concurrency,
+                        people_cache,
+                    )
+                    checked = {b: ids & kept for b, ids in candidates.items()}
+                candidates = {b: ids for b, ids in checked.items() if ids}
+
+            for bucket, asset_ids in candidates.items():
+                matches.update(asset_ids)
+                match_buckets.add(bucket)
+        return matches, match_buckets
+
+    def skipped_assets(
+        self, rule, candidates, hint=None, face_buckets=None, time_buckets=None, skip_buckets=None
+    ):
+        """
+        Collect the assets of a rule's skip faces that could overlap `candidates`.
+
+        Only assets in the candidate set can be excluded, so skip faces are
+        crawled only in the time buckets where candidates are, and not at all
+        when there are none. The candidates' buckets come from `hint` or from
+        the crawled include faces in `face_buckets`; when neither covers them,
+        skip faces are crawled in full. `time_buckets` and `skip_buckets` hold
+        bucket lists and partial skip-face crawls shared between the rules of
+        a pass. Returns a set of asset IDs.
+        """
+        face_buckets = {} if face_buckets is None else face_buckets
+        time_buckets = {} if time_buckets is None else time_buckets
+        skip_buckets = {} if skip_buckets is None else skip_buckets
+        if not candidates or not rule["skip_face"]:
+            return set()
+
+        wanted = hint
+        if wanted is None and all(face_id in face_buckets for face_id in rule["face"]):
+            wanted = {
+                bucket
+                for face_id in rule["face"]
+                for bucket, asset_ids in face_buckets[face_id].items()
+                if not candidates.isdisjoint(asset_ids)
+            }
+
+        skipped = set()
+        crawl = [f for f in dict.fromkeys(rule["skip_face"]) if f not in face_buckets]
+        for face_id in rule["skip_face"]:
+            if face_id in face_buckets:
+                for asset_ids in face_buckets[face_id].values():
+                    skipped.update(asset_ids)
+
+        time_buckets.update(
+            fetch_time_buckets(
+                self.server,
+                self.key,
+                [f for f in crawl if f not in time_buckets],
+                self.timebucket,
+                self.verbose,
+                self.concurrency,
+            )
+        )
+        only_buckets = {}
+        for face_id in crawl:
+            available = {bucket.get("timeBucket") for bucket in time_buckets[face_id]}
+            needed = available if wanted is None else available & wanted
+            only_buckets[face_id] = needed - set(skip_buckets.get(face_id, {}))
+            if self.verbose:
+                click.echo(
+                    f"Skip face {face_id}: {len(needed)} of {len(available)} bucket(s) "
+                    "overlap the candidates"
+                )
+        fetched = crawl_face_buckets(
+            self.server,
+            self.key,
+            [f for f in crawl if only_buckets[f]],
+            self.timebucket,
+            self.verbose,
+            self.concurrency,
+            self.bucket_cache,
+            time_buckets,
+            only_buckets,
+        )
+        for face_id in crawl:
+            known = skip_buckets.setdefault(face_id, {})
+            known.update(fetched.get(face_id, {}))
+            for bucket, asset_ids in known.items():
+                if wanted is None or bucket in wanted:
+                    skipped.update(asset_ids)
+        return skipped
+
+    def select(
+        self,
+        rule,
+        face_asset_ids,
+        searched_asset_ids=None,
+        people_cache=None,
+        skip_assets=None,
+        asset_index=None,
+    ):
+        """
+        Evaluate a rule's include, AND, no-other-faces and skip logic.
+
+        `face_asset_ids` maps face IDs to their crawled asset sets and
+        `searched_asset_ids` is the server-side AND or `select` result, if
+        any. `skip_assets`, if given, is called with the candidate set and
+        returns the skip faces' assets (see `skipped_assets`); otherwise they
+        are read from `face_asset_ids`. Returns a new `AssetSet` of matching
+        asset IDs on `asset_index` (a fresh index if None).
+        """
+        asset_index = asset_index or AssetIndex()
+        verbose = self.verbose
+        face = rule["face"]
+        skip_face = rule["skip_face"]
+        require_all_faces = rule["require_all_faces"]
+        # faces the user asked to include (normalize IDs to strings for robust comparisons)
+        included_face_ids = {str(f) for f in face}
+
+        if verbose:
+            click.echo(f"Included faces: {included_face_ids}")
+            if rule["no_other_faces"]:
+                click.echo(
+                    "--no-other-faces is enabled; assets will be restricted to exactly these faces."
+                )
+            for s_face in skip_face:
+                click.echo(f"Collecting assets to skip for face ID: {s_face}")
+
+        if searched_asset_ids is not None:
+            unique_asset_ids = asset_index.encode(searched_asset_ids)
+        else:
+            faces_asset_ids = [face_asset_ids[face_id] for face_id in face]
+
+            # Determine initial candidate assets:
+            # - require_all_faces => intersection
+            # - otherwise => union (any face)
+            unique_asset_ids = asset_index.encode(faces_asset_ids[0] if faces_asset_ids else ())
+            for asset_ids in faces_asset_ids[1:]:
+                if require_all_faces:
+                    unique_asset_ids &= asset_ids
+                else:
+                    unique_asset_ids |= asset_ids
+
+        if verbose:
+            mode = (
+                f"selection {rule['select']}"
+                if rule.get("select")
+                else "AND (all faces)"
+                if require_all_faces
+                else "OR (any face)"
+            )
+            click.echo(
+                f"Initial candidate assets after {mode} combination: {len(unique_asset_ids)}"
+            )
+
+        # Enforce "no other faces": assets must contain exactly the specified faces
+        # (based on recognized people from Immich).
+        if rule["no_other_faces"] and unique_asset_ids:
+            filtered_asset_ids, stats = filter_exact_faces(
+                self.server,
+                self.key,
+                unique_asset_ids,
+                included_face_ids,
+                require_all_faces,
+                verbose,
+                self.concurrency,
+                self.people_lookup,
+                people_cache,
+            )
+            unique_asset_ids = asset_index.encode(filtered_asset_ids)
+
+            click.echo(
+                f"After enforcing --no-other-faces: {len(unique_asset_ids)} asset(s) remain "
+                f"(checked {stats['checked']}, rejected extra-faces={stats['rejected_extra']}, "
+                f"rejected missing-faces={stats['rejected_missing']}, failed={stats['failed']})"
+            )
+
+        # Collect and exclude assets for skip faces
+        if skip_face:
+            if skip_assets is not None:
+                skip_asset_ids = skip_assets(unique_asset_ids)
+            else:
+                skip_asset_ids = asset_index.encode(())
+                for s_face in skip_face:
+                    skip_asset_ids |= face_asset_ids[s_face]
+
+            before = len(unique_asset_ids)
+            unique_asset_ids.difference_update(skip_asset_ids)
+            removed = before - len(unique_asset_ids)
+            click.echo(f"Excluded {removed} asset(s) belonging to skipped face(s)")
+
+        return unique_asset_ids
+
+    def streamable(self, rule):
+        """Whether a rule's assets can be written while its faces are still crawled."""
+        return (
+            self.stream
+            and self.planned is None
+            and rule["plan"] is None
+            and not rule["require_all_faces"]
+            and not rule["no_other_faces"]
+            and not rule["skip_face"]
+        )
+
+    def stream_rule(self, rule, time_buckets=None, full=True):
+        """
+        Sync an OR rule without skip faces as a producer/consumer pipeline.
+
+        The album is read first; the crawl then hands every bucket to a bounded
+        queue as soon as it arrives, and a writer thread sends new IDs to the
+        album in adaptive batches (`concurrency` at a time) as they fill, so
+        writes overlap the crawl instead of waiting for it to finish. `time_buckets` holds the
+        bucket lists to crawl from and `full` is False on recent-buckets
+        passes (see `run_pass`).
+        """
+        server, key, verbose, state = self.server, self.key, self.verbose, self.state
+        album = rule["album"]
+        self._report_last_run(album)
+
+        asset_index = AssetIndex()
+        current_assets = self._fetch_album(album, asset_index)
+        selected = asset_index.encode(())
+        new_asset_ids = asset_index.encode(())
+        write_results = {"added": [], "duplicate": [], "failed": []}
+        buckets = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+        writer_error = []
+        # Up to `concurrency` batches are written at once; a full set of slots
+        # blocks the writer, which in turn fills the queue and slows the crawl
+        pool = ThreadPoolExecutor(max_workers=self.concurrency)
+        slots = threading.BoundedSemaphore(self.concurrency)
+
+        def send(chunk, can_split):
+            return self._write_chunk(album, chunk, write_results, can_split)
+
+        def sent(future):
+            slots.release()
+            if future.exception() is not None:
+                writer_error.append(future.exception())
+
+        def writer():
+            batch = []
+            while True:
+                asset_ids = buckets.get()
+                if writer_error:
+                    # Keep draining so the crawl never blocks on a full queue
+                    if asset_ids is None:
+                        return
+                    continue
+                try:
+                    if asset_ids is not None:
+                        fresh = asset_index.encode(asset_ids) - selected
+                        selected.update(fresh)
+                        fresh -= current_assets
+                        new_asset_ids.update(fresh)
+                        batch.extend(fresh)
+                    while len(batch) >= self.write_sizer.size or (asset_ids is None and batch):
+                        # Wait for a free slot before cutting the batch, so the
+                        # size reflects the batches that have just finished
+                        slots.acquire()
+                        size = self.write_sizer.size
+                        if len(batch) < size and asset_ids is not None:
+                            slots.release()
+                            break
+                        pool.submit(send_batch, send, batch[:size], self.write_sizer).add_done_callback(
+                            sent
+                        )
+                        del batch[:size]
+                except Exception as exc:
+                    writer_error.append(exc)
+                if asset_ids is None:
+                    return
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        try:
+            crawl_face_buckets(
+                server,
+                key,
+                rule["face"],
+                self.timebucket,
+                verbose,
+                self.concurrency,
+                self.bucket_cache,
+                time_buckets,
+                on_bucket=lambda face_id, time_bucket, asset_ids: buckets.put(asset_ids),
+            )
+        finally:
+            buckets.put(None)
+            thread.join()
+            pool.shutdown(wait=True)
+        if writer_error:
+            raise writer_error[0]
+
+        click.echo(f"Total unique assets to add: {len(selected)}")
+        click.echo(
+            f"{len(selected) - len(new_asset_ids)} asset(s) already in the album, "
+            f"{len(new_asset_ids)} new"
+        )
+        return self._finish(rule, selected, current_assets, new_asset_ids, write_results, full)
+
+    def apply(self, rule, unique_asset_ids, full=True):
+        """
+        Bring a rule's album in line with its selected assets.
+
+        `full` is False when the assets only cover the newest buckets, in
+        which case nothing is removed from the album. Returns the number of
+        assets added or removed.
+        """
+        album = rule["album"]
+        self._report_last_run(album)
+        if not isinstance(unique_asset_ids, AssetSet):
+            unique_asset_ids = AssetIndex().encode(unique_asset_ids)
+
+        click.echo(f"Total unique assets to add: {len(unique_asset_ids)}")
+
+        # Only send assets that are not already in the album
+        current_assets = self._fetch_album(album, unique_asset_ids.index)
+        new_asset_ids = unique_asset_ids - current_assets
+        click.echo(
+            f"{len(unique_asset_ids) - len(new_asset_ids)} asset(s) already in the album, "
+            f"{len(new_asset_ids)} new"
+        )
+        if self.planned is not None:
+            self._plan(rule, unique_asset_ids, current_assets, new_asset_ids, full)
+            return 0
+
+        write_results = {"added": [], "duplicate": [], "failed": []}
+        self._write_batches(album, new_asset_ids, write_results)
+        return self._finish(
+            rule, unique_asset_ids, current_assets, new_asset_ids, write_results, full
+        )
+
+    def _report_last_run(self, album):
+        if self.verbose and self.state:
+            last_run = self.state.watermark(f"album:{album}:last_run")
+            if last_run:
+                click.echo(
+                    f"Last completed run for album {album}: {time.ctime(float(last_run[0]))}"
+                )
+
+    def _fetch_album(self, album, asset_index):
+        """Read an album's members as an `AssetSet` on `asset_index`."""
+        if self.verbose:
+            click.echo("Fetching current album asset list...")
+        current_assets = get_album_assets(self.server, self.key, album, self.verbose)
+        if current_assets is None:
+            # A failed read must not wipe the snapshot; fall back to it instead
+            current_assets = self.state.album_snapshot(album) if self.state else set()
+            if self.state:
+                click.echo(
                     click.style(
-                        f"Added {len(asset_chunk)} asset(s) to the album", fg="green"
+                        f"Using the last known membership of album {album} "
+                        f"({len(current_assets)} asset(s))",
+                        fg="yellow",
                     )
                 )
+        elif self.state:
+            self.state.save_album_snapshot(album, current_assets)
+        current_assets = asset_index.encode(current_assets)
+        if self.checkpoint:
+            # Adds flushed before an interruption, in case the listing lags behind
+            current_assets |= self.checkpoint.added(album)
+        return current_assets
+
+    def _write_batches(self, album, asset_ids, write_results):
+        """Add `asset_ids` in parallel batches of adaptive size (see `send_in_batches`)."""
+        send_in_batches(
+            lambda chunk, can_split: self._write_chunk(album, chunk, write_results, can_split),
+            asset_ids,
+            self.write_sizer,
+            self.concurrency,
+        )
 
-        # Removal logic: remove assets not matching final criteria
-        if remove_non_matching:
-            if verbose:
-                click.echo("Fetching current album asset list for removal check...")
+    def _write_chunk(self, album, asset_chunk, write_results, can_split=False):
+        """
+        Add one batch and record its outcome. Returns False, recording
+        nothing, when `can_split` and the server refused the batch as too large.
+        """
+        server, key, verbose, state = self.server, self.key, self.verbose, self.state
+        if verbose:
+            click.echo(
+                f"Adding chunk of {len(asset_chunk)} assets to album {album}"
+            )
+        chunk_results = {"added": [], "duplicate": [], "failed": []}
+        success = add_assets_to_album(
+            server, key, album, asset_chunk, verbose, chunk_results, can_split
+        )
+        if can_split and any(error == "too_large" for _, error in chunk_results["failed"]):
+            return False
+        for outcome, ids in chunk_results.items():
+            write_results[outcome].extend(ids)
+        if success:
+            if state:
+                state.add_album_assets(
+                    album, chunk_results["added"] + chunk_results["duplicate"]
+                )
+            if self.checkpoint:
+                self.checkpoint.record_added(
+                    album, chunk_results["added"] + chunk_results["duplicate"]
+                )
+            note = ""
+            if chunk_results["duplicate"] or chunk_results["failed"]:
+                note = (
+                    f" ({len(chunk_results['duplicate'])} duplicate(s), "
+                    f"{len(chunk_results['failed'])} failed)"
+                )
+            click.echo(
+                click.style(
+                    f"Added {len(chunk_results['added'])} asset(s) to the album{note}",
+                    fg="green",
+                )
+            )
+        return True
 
-            current_assets = get_album_assets(server, key, album, verbose)
-            desired_assets = set(unique_asset_ids)
+    def _finish(
+        self, rule, unique_asset_ids, current_assets, new_asset_ids, write_results, full=True
+    ):
+        """Retry failed adds, report, apply removals and record the run; returns the changes."""
+        verbose = self.verbose
+        album = rule["album"]
+        self._retry_failed(album, write_results)
+
+        if new_asset_ids:
+            click.echo(
+                f"Album write summary: added {len(write_results['added'])}, "
+                f"duplicate {len(write_results['duplicate'])}, "
+                f"failed {len(write_results['failed'])}"
+            )
 
-            assets_to_remove = current_assets - desired_assets
+        # Removal logic: remove assets not matching final criteria. A recent-buckets
+        # pass has not seen older matches, so removals wait for a full pass.
+        removed = 0
+        if rule["remove_non_matching"] and not full:
+            click.echo("Skipping --remove-non-matching until the next full reconciliation pass.")
+        elif rule["remove_non_matching"]:
+            assets_to_remove = current_assets - unique_asset_ids
 
             click.echo(f"Total assets to remove: {len(assets_to_remove)}")
             if verbose and assets_to_remove:
                 click.echo(f"Assets to remove: {sorted(list(assets_to_remove))}")
 
             if assets_to_remove:
-                remove_success = remove_assets_from_album(
-                    server, key, album, list(assets_to_remove), verbose
-                )
-                if remove_success:
-                    click.echo(
-                        click.style(
-                            f"Removed {len(assets_to_remove)} non-matching asset(s) from album",
-                            fg="yellow",
-                        )
-                    )
+                removed = self._remove(album, assets_to_remove)
             else:
                 if verbose:
                     click.echo("No non-matching assets need removal.")
 
-    if run_every_seconds and run_every_seconds > 0:
+        if self.state:
+            self.state.set_watermark(f"album:{album}:last_run", time.time())
+        return len(write_results["added"]) + removed
+
+    def _retry_failed(self, album, write_results):
+        """Retry IDs that failed with a transient error, in smaller batches."""
+        server, key, verbose, state = self.server, self.key, self.verbose, self.state
+
+        # Retry IDs that failed individually in smaller batches instead of
+        # resending whole chunks
+        retry_ids = [
+            asset_id
+            for asset_id, error in write_results["failed"]
+            if error not in PERMANENT_ADD_ERRORS
+        ]
+        if retry_ids:
+            click.echo(f"Retrying {len(retry_ids)} failed asset(s)")
+            write_results["failed"] = [
+                (asset_id, error)
+                for asset_id, error in write_results["failed"]
+                if error in PERMANENT_ADD_ERRORS
+            ]
+            for retry_chunk in chunker(retry_ids, RETRY_CHUNK_SIZE):
+                retry_results = {"added": [], "duplicate": [], "failed": []}
+                add_assets_to_album(server, key, album, retry_chunk, verbose, retry_results)
+                for outcome, ids in retry_results.items():
+                    write_results[outcome].extend(ids)
+                if state:
+                    state.add_album_assets(
+                        album, retry_results["added"] + retry_results["duplicate"]
+                    )
+                if self.checkpoint:
+                    self.checkpoint.record_added(
+                        album, retry_results["added"] + retry_results["duplicate"]
+                    )
+
+    def _remove(self, album, assets_to_remove):
+        """
+        Remove assets from an album; returns how many were removed.
+
+        Batches the server refused are left out of the count and of the
+        `--state-db` snapshot.
+        """
+        removed = []
+        remove_assets_from_album(
+            self.server,
+            self.key,
+            album,
+            list(assets_to_remove),
+            self.verbose,
+            self.concurrency,
+            self.remove_sizer,
+            removed,
+        )
+        if not removed:
+            return 0
+        if self.state:
+            self.state.remove_album_assets(album, removed)
+        of = "" if len(removed) == len(assets_to_remove) else f" of {len(assets_to_remove)}"
+        click.echo(
+            click.style(
+                f"Removed {len(removed)}{of} non-matching asset(s) from album",
+                fg="yellow",
+            )
+        )
+        return len(removed)
+
+    def _plan(self, rule, unique_asset_ids, current_assets, new_asset_ids, full):
+        """Record a rule's diff for --plan-out instead of writing it."""
+        remove = set()
+        if rule["remove_non_matching"] and full:
+            remove = current_assets - unique_asset_ids
+        click.echo(f"Planned: add {len(new_asset_ids)}, remove {len(remove)}")
+        self.planned.append(
+            {
+                "name": rule["name"],
+                "album": rule["album"],
+                "add": sorted(new_asset_ids),
+                "remove": sorted(remove),
+                "inputs": {
+                    "face": rule["face"],
+                    "skip_face": rule["skip_face"],
+                    "select": rule["select"],
+                    "require_all_faces": rule["require_all_faces"],
+                    "no_other_faces": rule["no_other_faces"],
+                    "remove_non_matching": rule["remove_non_matching"],
+                    "timebucket": self.timebucket,
+                    "full": full,
+                    "selected": len(unique_asset_ids),
+                    "album_size": len(current_assets),
+                },
+            }
+        )
+
+    def apply_plan(self, plan):
+        """
+        Execute the writes of a `--plan-out` file without crawling.
+
+        Adds are sent in adaptive batches, `concurrency` at a time, then
+        transient per-ID failures are retried and the planned removals
+        applied. Returns the number of assets added or removed.
+        """
+        changes = 0
+        for entry in plan["rules"]:
+            album = entry["album"]
+            click.echo(
+                click.style(f"Rule {entry.get('name', album)} (album {album})", bold=True)
+            )
+            click.echo(f"Planned: add {len(entry['add'])}, remove {len(entry['remove'])}")
+
+            write_results = {"added": [], "duplicate": [], "failed": []}
+            self._write_batches(album, entry["add"], write_results)
+            self._retry_failed(album, write_results)
+            if entry["add"]:
+                click.echo(
+                    f"Album write summary: added {len(write_results['added'])}, "
+                    f"duplicate {len(write_results['duplicate'])}, "
+                    f"failed {len(write_results['failed'])}"
+                )
+            changes += len(write_results["added"])
+            if entry["remove"]:
+                changes += self._remove(album, set(entry["remove"]))
+            if self.state:
+                self.state.set_watermark(f"album:{album}:last_run", time.time())
+        return changes
+
+
+class PollInterval:
+    """
+    Delay between passes of --run-every-seconds.
+
+    With `maximum` above `minimum`, the delay doubles after every pass that
+    changed nothing, up to `maximum`, and snaps back to `minimum` as soon as
+    a pass adds or removes assets. Otherwise it stays at `minimum`.
+    """
+
+    def __init__(self, minimum, maximum=0):
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.current = minimum
+
+    def update(self, changed):
+        """Record whether the last pass changed the album; returns the next delay."""
+        if changed:
+            self.current = self.minimum
+        else:
+            self.current = min(self.current * 2, self.maximum)
+        return self.current
+
+
+class RuleScheduler:
+    """
+    Daemon loop running each rule on its own interval.
+
+    Due rules are started highest `priority` first, at most
+    `max_parallel_rules` at a time. A rule's next run is scheduled from the
+    end of its current pass (plus a random jitter of up to `jitter` seconds),
+    so a slow pass never overlaps the next pass of the same rule. The global
+    request budget is enforced by the client layer (`--max-in-flight`).
+    """
+
+    def __init__(
+        self,
+        sync,
+        rules,
+        max_parallel_rules=DEFAULT_MAX_PARALLEL_RULES,
+        jitter=0.0,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.sync = sync
+        self.rules = rules
+        self.max_parallel_rules = max_parallel_rules
+        self.jitter = jitter
+        self.clock = clock
+        self.sleep = sleep
+
+    def _jitter(self, rule):
+        jitter = rule["jitter"] if rule["jitter"] is not None else self.jitter
+        return random.uniform(0, jitter) if jitter else 0.0
+
+    def run(self, max_runs=None):
+        """Run until interrupted, or until `max_runs` rule passes have completed."""
+        now = self.clock()
+        # Spread the first runs so rules sharing an interval do not start in lockstep
+        next_due = {i: now + self._jitter(rule) for i, rule in enumerate(self.rules)}
+        running = {}
+        started = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_rules) as pool:
+            while True:
+                now = self.clock()
+                can_start = max_runs is None or started < max_runs
+                due = sorted(
+                    (i for i, at in next_due.items() if at <= now),
+                    key=lambda i: (-self.rules[i]["priority"], next_due[i]),
+                )
+                while can_start and due and len(running) < self.max_parallel_rules:
+                    index = due.pop(0)
+                    # A running rule has no due time, so it cannot be started twice
+                    del next_due[index]
+                    running[pool.submit(self.sync.run_pass, [self.rules[index]])] = index
+                    started += 1
+                    can_start = max_runs is None or started < max_runs
+
+                if not running and not can_start:
+                    return
+
+                timeout = None
+                if can_start and next_due and len(running) < self.max_parallel_rules:
+                    timeout = max(0.0, min(next_due.values()) - now)
+
+                if not running:
+                    self.sleep(timeout)
+                    continue
+
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    rule = self.rules[index]
+                    try:
+                        future.result()
+                    except (Exception, SystemExit) as exc:
+                        click.echo(
+                            click.style(
+                                f"Rule {rule['name']} failed: {exc!r}; retrying at its next interval",
+                                fg="red",
+                            )
+                        )
+                    next_due[index] = self.clock() + rule["interval"] + self._jitter(rule)
+                    if self.sync.verbose:
+                        click.echo(
+                            f"Rule {rule['name']} next run in {next_due[index] - self.clock():.0f} second(s)"
+                        )
+
+
+@click.command()
+@click.option("--key", help="Your Immich API Key (required unless set in --config)")
+@click.option("--server", help="Your Immich server URL (required unless set in --config)")
+@click.option(
+    "--face",
+    help="ID of the face you want to copy from. Can be used multiple times. Required unless --config is used.",
+    multiple=True,
+)
+@click.option(
+    "--skip-face",
+    help="ID of a face to exclude (can be used multiple times).",
+    multiple=True,
+)
+@click.option(
+    "--album", help="ID of the album you want to copy to. Required unless --config is used."
+)
+@click.option(
+    "--select",
+    default=None,
+    help=(
+        "Boolean face expression used instead of --face, e.g. \"(alice | bob) & !carol\". "
+        "Operands are face IDs or --face-alias names; '!' must be combined with a positive term."
+    ),
+)
+@click.option(
+    "--face-alias",
+    multiple=True,
+    help="NAME=ID alias usable in --select (can be used multiple times).",
+)
+@click.option(
+    "--config",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help=(
+        "TOML, YAML or JSON file with several face→album rules, evaluated in one process "
+        "so faces shared between rules are crawled once per pass."
+    ),
+)
+@click.option(
+    "--timebucket", help="Time bucket size (e.g., MONTH, WEEK)", default="MONTH"
+)
+@click.option("--verbose", is_flag=True, help="Enable verbose output for debugging")
+@click.option(
+    "--run-every-seconds",
+    type=int,
+    default=0,
+    show_default=True,
+    help=(
+        "Automatically rerun synchronization every N seconds (0 = run once). Passes start at "
+        "a fixed rate, so the time a pass takes counts towards the interval."
+    ),
+)
+@click.option(
+    "--max-interval-seconds",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help=(
+        "With --run-every-seconds, double the interval after each pass that changes nothing, "
+        "up to N seconds, and return to --run-every-seconds once a pass finds changes "
+        "(0 = fixed interval)."
+    ),
+)
+@click.option(
+    "--require-all-faces",
+    is_flag=True,
+    help="If set, only assets that include all specified faces will be added to the album. Otherwise, assets from any face are included.",
+)
+@click.option(
+    "--and-strategy",
+    type=click.Choice(["search", "crawl"]),
+    default="search",
+    show_default=True,
+    help=(
+        "How --require-all-faces is evaluated: 'search' asks the server for assets containing all faces "
+        "(falling back to 'crawl' when unsupported), 'crawl' crawls the rarest face and checks the "
+        "others only against its assets."
+    ),
+)
+@click.option(
+    "--no-other-faces",
+    is_flag=True,
+    help=(
+        "Prevent assets that contain any recognized faces outside the specified set. "
+        "This does not by itself require that all specified faces are present; "
+        "Combine with --require-all-faces to enforce that every specified face must be present."
+    ),
+)
+@click.option(
+    "--remove-non-matching",
+    is_flag=True,
+    help="Remove assets from the album that do not satisfy the face-selection logic.",
+)
+@click.option(
+    "--people-lookup",
+    type=click.Choice(["search", "asset"]),
+    default="search",
+    show_default=True,
+    help=(
+        "How --no-other-faces reads the people of each asset: 'search' fetches them in bulk pages "
+        "from the metadata search endpoint (falling back to 'asset' on older servers), "
+        "'asset' fetches every asset individually."
+    ),
+)
+@click.option(
+    "--incremental/--no-incremental",
+    default=True,
+    show_default=True,
+    help=(
+        "Between passes of --run-every-seconds, only refetch time buckets that are new "
+        "or whose asset count changed."
+    ),
+)
+@click.option(
+    "--stream/--no-stream",
+    default=True,
+    show_default=True,
+    help=(
+        "For a single OR rule without --skip-face or --no-other-faces, write assets to the "
+        "album while the crawl is still running instead of after it."
+    ),
+)
+@click.option(
+    "--hot-buckets",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help=(
+        "In loop mode, only sync the N newest time buckets on most passes and reconcile "
+        "the full history periodically (0 = always sync everything)."
+    ),
+)
+@click.option(
+    "--full-sync-every",
+    type=click.IntRange(min=0),
+    default=DEFAULT_FULL_SYNC_EVERY,
+    show_default=True,
+    help="With --hot-buckets, run a full reconciliation every N passes (0 = only by --full-sync-hours).",
+)
+@click.option(
+    "--full-sync-hours",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    help="With --hot-buckets, also run a full reconciliation once this many hours have passed.",
+)
+@click.option(
+    "--plan-out",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help=(
+        "Run the selection for every rule and write the exact asset IDs to add and remove "
+        "(with the inputs they came from) to this JSON file without touching any album."
+    ),
+)
+@click.option(
+    "--apply",
+    "apply_plan_file",
+    type=click.Path(exists=True, dir_okay=False),
+    default=None,
+    help="Execute the writes of a --plan-out file, without crawling. Only needs --key and --server.",
+)
+@click.option(
+    "--checkpoint",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help=(
+        "Journal file recording crawled buckets, people lookups and album adds while a pass "
+        "runs, so a run restarted after a crash or container restart resumes where it stopped."
+    ),
+)
+@click.option(
+    "--state-db",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help=(
+        "SQLite file keeping bucket counts, face assets, the album snapshot and last-run "
+        "times between runs, so cron or short-lived container runs do not start cold."
+    ),
+)
+@click.option(
+    "--pool-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_POOL_SIZE,
+    show_default=True,
+    help="Maximum number of keep-alive HTTP connections kept open to the Immich server.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Maximum number of requests in flight while crawling faces and time buckets, checking people for --no-other-faces, or writing album batches.",
+)
+@click.option(
+    "--max-in-flight",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help="Global budget of requests in flight to the server across all rules (0 = unlimited).",
+)
+@click.option(
+    "--min-in-flight",
+    type=click.IntRange(min=0),
+    default=0,
+    show_default=True,
+    help=(
+        "Adapt the in-flight budget to the server: start at N, grow while latency and errors "
+        "stay low, halve on 429/5xx or slow responses, never above --max-in-flight (0 = fixed budget)."
+    ),
+)
+@click.option(
+    "--request-timeout",
+    type=click.FloatRange(min=1),
+    default=DEFAULT_READ_TIMEOUT,
+    show_default=True,
+    help="Seconds to wait for the server to answer a request before it counts as timed out (and is retried).",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=DEFAULT_RETRIES,
+    show_default=True,
+    help="Retry timeouts, connection errors, 429 and 5xx responses up to N times with backoff before giving up.",
+)
+@click.option(
+    "--max-parallel-rules",
+    type=click.IntRange(min=1),
+    default=DEFAULT_MAX_PARALLEL_RULES,
+    show_default=True,
+    help="When --config rules set an 'interval', how many rules may run at the same time.",
+)
+@click.option(
+    "--jitter-seconds",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    show_default=True,
+    help="Random delay of up to N seconds added to each scheduled rule run (rules may override with 'jitter').",
+)
+def face_to_album(
+    key,
+    server,
+    face,
+    skip_face,
+    album,
+    config,
+    timebucket,
+    verbose,
+    run_every_seconds,
+    require_all_faces,
+    no_other_faces,
+    remove_non_matching,
+    pool_size,
+    concurrency,
+    people_lookup,
+    and_strategy,
+    incremental,
+    state_db,
+    plan_out,
+    apply_plan_file,
+    checkpoint,
+    max_in_flight,
+    min_in_flight,
+    request_timeout,
+    retries,
+    max_parallel_rules,
+    jitter_seconds,
+    select,
+    face_alias,
+    stream,
+    hot_buckets,
+    full_sync_every,
+    full_sync_hours,
+    max_interval_seconds,
+):
+    aliases = {}
+    for entry in face_alias:
+        name, sep, face_id = entry.partition("=")
+        if not sep or not name.strip() or not face_id.strip():
+            raise click.BadParameter(f"expected NAME=ID, got {entry!r}", param_hint="--face-alias")
+        aliases[name.strip()] = face_id.strip()
+    if select and (face or require_all_faces):
+        raise click.UsageError("--select cannot be combined with --face or --require-all-faces.")
+    if plan_out or apply_plan_file:
+        conflicting = [
+            name
+            for name, value in (
+                ("--plan-out", plan_out and apply_plan_file),
+                ("--run-every-seconds", run_every_seconds and run_every_seconds > 0),
+                ("--face", apply_plan_file and face),
+                ("--skip-face", apply_plan_file and skip_face),
+                ("--album", apply_plan_file and album),
+                ("--select", apply_plan_file and select),
+            )
+            if value
+        ]
+        if conflicting:
+            raise click.UsageError(
+                f"{', '.join(conflicting)} cannot be combined with "
+                f"{'--apply' if apply_plan_file else '--plan-out'}."
+            )
+
+    if config:
+        conflicting = [
+            name
+            for name, value in (
+                ("--face", face),
+                ("--skip-face", skip_face),
+                ("--album", album),
+                ("--select", select),
+                ("--face-alias", face_alias),
+                ("--require-all-faces", require_all_faces),
+                ("--no-other-faces", no_other_faces),
+                ("--remove-non-matching", remove_non_matching),
+            )
+            if value
+        ]
+        if conflicting:
+            raise click.UsageError(
+                f"{', '.join(conflicting)} cannot be combined with --config; set them per rule."
+            )
+        loaded = load_config(config)
+        key = key or loaded["key"]
+        server = server or loaded["server"]
+        rules = loaded["rules"]
+    else:
+        rules = None
+
+    for name, value in (
+        ("--key", key),
+        ("--server", server),
+        ("--face", rules or face or select or apply_plan_file),
+        ("--album", rules or album or apply_plan_file),
+    ):
+        if not value:
+            raise click.UsageError(f"Missing option '{name}'.")
+
+    if rules is None and not apply_plan_file:
+        try:
+            rules = [
+                make_rule(
+                    face,
+                    album,
+                    skip_face,
+                    require_all_faces,
+                    no_other_faces,
+                    remove_non_matching,
+                    select=select,
+                    aliases=aliases,
+                )
+            ]
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint="--select")
+
+    if min_in_flight:
+        if not max_in_flight or max_in_flight < min_in_flight:
+            raise click.UsageError(
+                "--min-in-flight needs a --max-in-flight ceiling at least as large."
+            )
+        # Let the adaptive budget, not the per-crawl worker count, be the limit
+        concurrency = max(concurrency, max_in_flight)
+        pool_size = max(pool_size, max_in_flight)
+    configure_clients(
+        pool_size=pool_size,
+        max_in_flight=max_in_flight,
+        retries=retries,
+        min_in_flight=min_in_flight,
+        read_timeout=request_timeout,
+    )
+    state = StateStore(state_db) if state_db else None
+    # Survives between passes of --run-every-seconds (and, with --state-db, between
+    # runs) so unchanged buckets are not refetched
+    bucket_cache = (state or BucketCache()) if incremental else None
+    journal = CheckpointJournal(checkpoint, bucket_cache) if checkpoint else None
+    sync = AlbumSync(
+        server,
+        key,
+        timebucket,
+        verbose,
+        concurrency,
+        people_lookup,
+        and_strategy,
+        journal or bucket_cache,
+        state,
+        stream,
+        hot_buckets,
+        full_sync_every,
+        full_sync_hours,
+        journal,
+        [] if plan_out else None,
+    )
+
+    def run_once():
+        return sync.run_pass(rules)
+
+    if apply_plan_file:
+        plan = load_plan(apply_plan_file)
+        if plan.get("server") and plan["server"].rstrip("/") != server.rstrip("/"):
+            raise click.UsageError(
+                f"Plan file {apply_plan_file} was computed for {plan['server']}, not {server}."
+            )
+        if plan.get("created"):
+            age = max(0.0, time.time() - float(plan["created"]))
+            click.echo(f"Applying plan computed {age / 60:.0f} minute(s) ago")
+        sync.apply_plan(plan)
+    elif plan_out:
+        # One pass over every rule, whatever their intervals
+        run_once()
+        write_plan(plan_out, server, sync.planned)
+        click.echo(f"Wrote plan for {len(sync.planned)} rule(s) to {plan_out}")
+    elif any(rule["interval"] for rule in rules):
+        for rule in rules:
+            if not rule["interval"]:
+                if run_every_seconds <= 0:
+                    raise click.UsageError(
+                        f"Rule {rule['name']} has no interval; set one or pass --run-every-seconds."
+                    )
+                rule["interval"] = run_every_seconds
+        scheduler = RuleScheduler(sync, rules, max_parallel_rules, jitter_seconds)
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            click.echo(
+                click.style(
+                    "Stop requested (Ctrl+C). Ending repeated execution.", fg="yellow"
+                )
+            )
+    elif run_every_seconds and run_every_seconds > 0:
+        poll = PollInterval(run_every_seconds, max_interval_seconds)
         try:
             while True:
-                run_once()
+                started = time.monotonic()
+                try:
+                    changes = run_once()
+                except (ImmichAPIError, requests.RequestException) as exc:
+                    # The server is already retried and paused for; keep polling
+                    message = exc.message if isinstance(exc, ImmichAPIError) else repr(exc)
+                    click.echo(
+                        click.style(
+                            f"Pass failed: {message}; retrying at the next interval",
+                            fg="red",
+                        )
+                    )
+                    changes = 0
+                interval = poll.update(bool(changes))
+                # Fixed rate: the pass itself counts towards the interval
+                delay = max(0.0, started + interval - time.monotonic())
                 click.echo(
-                    f"Waiting {run_every_seconds} second(s) before next execution..."
+                    f"Waiting {delay:.0f} second(s) before next execution..."
                 )
-                time.sleep(run_every_seconds)
+                time.sleep(delay)
         except KeyboardInterrupt:
             click.echo(
                 click.style(
@@ -52,11 +52,17 @@ For example, to run the command every hour, you can add the following to your cr
     keywords=["immich"],
     install_requires=["click", "requests"],
     extras_require={
+        "config": [
+            "tomli>=1.1.0; python_version < '3.11'",
+            "pyyaml",
+        ],
         "test": [
             "pytest>=7.0.0",
             "pytest-cov>=4.0.0",
             "pytest-mock>=3.10.0",
             "requests-mock>=1.9.0",
+            "tomli>=1.1.0; python_version < '3.11'",
+            "pyyaml",
         ]
     },
     classifiers=[
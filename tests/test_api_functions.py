@@ -1,4 +1,8 @@
+import threading
+import time
+
 import pytest
+import requests
 import requests_mock
 from click.testing import CliRunner
 from immich_face_to_album.__main__ import (
@@ -8,6 +12,18 @@ from immich_face_to_album.__main__ import (
     get_asset,
     get_album_assets,
     remove_assets_from_album,
+    get_client,
+    configure_clients,
+    crawl_face_buckets,
+    keep_assets_with_faces,
+    BucketCache,
+    filter_exact_faces,
+    get_people_bulk,
+    search_assets_with_faces,
+    summarize_add_results,
+    ImmichAPIError,
+    ChunkSizer,
+    send_in_batches,
 )
 
 
@@ -37,6 +53,21 @@ class TestGetTimeBuckets:
             assert m.last_request.qs["personid"] == ["face-123"]
             assert m.last_request.qs["size"] == ["month"]
 
+    def test_get_time_buckets_keeps_count(self):
+        """Test that per-bucket counts are kept when the server reports them."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/timeline/buckets",
+                json=[{"timeBucket": "2024-01", "count": 12, "other": "x"}],
+                status_code=200,
+            )
+
+            result = get_time_buckets(
+                "https://example.com", "test-key", "face-123", "MONTH", False
+            )
+
+            assert result == [{"timeBucket": "2024-01", "count": 12}]
+
     def test_get_time_buckets_different_size(self):
         """Test time bucket fetching with different size parameter."""
         with requests_mock.Mocker() as m:
@@ -54,8 +85,10 @@ class TestGetTimeBuckets:
             assert result == expected_response
             assert m.last_request.qs["size"] == ["week"]
 
-    def test_get_time_buckets_failure(self):
-        """Test time bucket fetching with API error."""
+    def test_get_time_buckets_failure(self, mocker):
+        """Test time bucket fetching with API error, after the retries."""
+        configure_clients()
+        sleep = mocker.patch("immich_face_to_album.__main__.time.sleep")
         with requests_mock.Mocker() as m:
             m.get(
                 "https://example.com/api/timeline/buckets",
@@ -63,12 +96,15 @@ class TestGetTimeBuckets:
                 status_code=500,
             )
 
-            with pytest.raises(SystemExit) as exc_info:
+            with pytest.raises(ImmichAPIError) as exc_info:
                 get_time_buckets(
                     "https://example.com", "test-key", "face-123", "MONTH", False
                 )
 
-            assert exc_info.value.code == 1
+            assert exc_info.value.exit_code == 1
+            assert "Status code: 500" in exc_info.value.message
+            assert m.call_count == 4
+            assert sleep.call_count == 3
 
     def test_get_time_buckets_verbose(self, capsys):
         """Test verbose output for time bucket fetching."""
@@ -139,7 +175,7 @@ class TestGetAssetsForTimeBucket:
                 status_code=404,
             )
 
-            with pytest.raises(SystemExit) as exc_info:
+            with pytest.raises(ImmichAPIError) as exc_info:
                 get_assets_for_time_bucket(
                     "https://example.com",
                     "test-key",
@@ -149,7 +185,9 @@ class TestGetAssetsForTimeBucket:
                     False,
                 )
 
-            assert exc_info.value.code == 1
+            assert exc_info.value.exit_code == 1
+            # 404 is not transient, so it is not retried
+            assert m.call_count == 1
 
     def test_get_assets_verbose(self, capsys):
         """Test verbose output for asset fetching."""
@@ -195,6 +233,38 @@ class TestAddAssetsToAlbum:
             assert m.last_request.headers["Content-Type"] == "application/json"
             assert '"ids": ["asset-1", "asset-2"]' in m.last_request.text
 
+    def test_add_assets_timeout_is_split(self, mocker):
+        """Test that a batch whose request times out is halved without client retries."""
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
+
+        def put_callback(request, context):
+            ids = request.json()["ids"]
+            if len(ids) > 50:
+                raise requests.exceptions.ReadTimeout()
+            return [{"id": asset_id, "success": True} for asset_id in ids]
+
+        # Default client retries: a splittable batch must still not be resent whole
+        configure_clients()
+        with requests_mock.Mocker() as m:
+            m.put("https://example.com/api/albums/album-123/assets", json=put_callback)
+            results = {}
+            send_in_batches(
+                lambda chunk, can_split: add_assets_to_album(
+                    "https://example.com",
+                    "test-key",
+                    "album-123",
+                    chunk,
+                    results=results,
+                    can_split=can_split,
+                ),
+                [f"asset-{i}" for i in range(200)],
+                ChunkSizer(initial=200, minimum=25),
+            )
+
+            sizes = [len(r.json()["ids"]) for r in m.request_history]
+            assert sizes == [200, 100, 50, 50, 100, 50, 50]
+            assert len(results["added"]) == 200
+
     def test_add_assets_empty_list(self):
         """Test adding an empty list of assets."""
         with requests_mock.Mocker() as m:
@@ -232,8 +302,10 @@ class TestAddAssetsToAlbum:
             captured = capsys.readouterr()
             assert "Album not found" in captured.out
 
-    def test_add_assets_failure_non_json(self, capsys):
+    def test_add_assets_failure_non_json(self, capsys, mocker):
         """Test asset addition with non-JSON error response."""
+        configure_clients()
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
         with requests_mock.Mocker() as m:
             m.put(
                 "https://example.com/api/albums/album-123/assets",
@@ -300,6 +372,58 @@ class TestAddAssetsToAlbum:
             assert "Permission denied" in captured.out
 
 
+class TestAddResults:
+    """Test parsing of per-ID album add results."""
+
+    def test_summarize_add_results(self):
+        """Test that results are split into added, duplicate and failed."""
+        data = [
+            {"id": "asset-1", "success": True},
+            {"id": "asset-2", "success": False, "error": "duplicate"},
+            {"id": "asset-3", "success": False, "error": "unknown"},
+            {"id": "asset-4", "success": False},
+        ]
+
+        result = summarize_add_results(data, ["asset-1", "asset-2", "asset-3", "asset-4"])
+
+        assert result == {
+            "added": ["asset-1"],
+            "duplicate": ["asset-2"],
+            "failed": [("asset-3", "unknown"), ("asset-4", "unknown")],
+        }
+
+    def test_summarize_add_results_legacy(self):
+        """Test that a non-list response counts every ID as added."""
+        result = summarize_add_results({"success": True}, ["asset-1", "asset-2"])
+
+        assert result == {"added": ["asset-1", "asset-2"], "duplicate": [], "failed": []}
+
+    def test_add_assets_collects_results(self):
+        """Test that add_assets_to_album fills the results dict."""
+        with requests_mock.Mocker() as m:
+            m.put(
+                "https://example.com/api/albums/album-123/assets",
+                json=[
+                    {"id": "asset-1", "success": True},
+                    {"id": "asset-2", "success": False, "error": "duplicate"},
+                ],
+                status_code=200,
+            )
+
+            results = {"added": [], "duplicate": [], "failed": []}
+            success = add_assets_to_album(
+                "https://example.com",
+                "test-key",
+                "album-123",
+                ["asset-1", "asset-2"],
+                False,
+                results,
+            )
+
+            assert success is True
+            assert results == {"added": ["asset-1"], "duplicate": ["asset-2"], "failed": []}
+
+
 class TestGetAsset:
     """Test the get_asset function."""
 
@@ -431,6 +555,113 @@ class TestAlbumFunctions:
             assert result == {"asset-1", "asset-3"}
             assert m.last_request.headers["x-api-key"] == "test-key"
 
+    def test_get_album_assets_paged(self):
+        """Test that membership is paged through the search without asset objects."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/albums/album-123?withoutAssets=true",
+                json={"id": "album-123", "assets": [], "assetCount": 3},
+                status_code=200,
+            )
+            m.post(
+                "https://example.com/api/search/metadata",
+                [
+                    {"json": {"assets": {"items": [{"id": "asset-1"}, {"id": "asset-2"}], "nextPage": "2"}}},
+                    {"json": {"assets": {"items": [{"id": "asset-3"}], "nextPage": None}}},
+                ],
+            )
+
+            result = get_album_assets(
+                "https://example.com", "test-key", "album-123", False
+            )
+
+            assert result == {"asset-1", "asset-2", "asset-3"}
+            assert m.request_history[1].json()["albumIds"] == ["album-123"]
+            assert m.call_count == 3
+
+    def test_get_album_assets_count_mismatch_falls_back(self):
+        """Test that an incomplete paged listing falls back to the full album."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/albums/album-123",
+                [
+                    {"json": {"id": "album-123", "assets": [], "assetCount": 2}},
+                    {"json": {"id": "album-123", "assets": [{"id": "asset-1"}, {"id": "asset-2"}]}},
+                ],
+            )
+            m.post(
+                "https://example.com/api/search/metadata",
+                json={"assets": {"items": [{"id": "asset-1"}], "nextPage": None}},
+            )
+
+            result = get_album_assets(
+                "https://example.com", "test-key", "album-123", False
+            )
+
+            assert result == {"asset-1", "asset-2"}
+            assert "withoutAssets" not in m.last_request.qs
+
+    def test_get_album_assets_failure(self):
+        """Test that a failed album read is reported as None, not as an empty album."""
+        with requests_mock.Mocker() as m:
+            m.get("https://example.com/api/albums/album-123", status_code=404)
+
+            result = get_album_assets(
+                "https://example.com", "test-key", "album-123", False
+            )
+
+            assert result is None
+
+    def test_get_album_assets_without_search_falls_back(self):
+        """Test that a server without the search endpoint gets the full album read."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/albums/album-123",
+                [
+                    {"json": {"id": "album-123", "assets": [], "assetCount": 1}},
+                    {"json": {"id": "album-123", "assets": [{"id": "asset-1"}]}},
+                ],
+            )
+            m.post("https://example.com/api/search/metadata", status_code=404)
+
+            result = get_album_assets(
+                "https://example.com", "test-key", "album-123", False
+            )
+
+            assert result == {"asset-1"}
+
+    def test_get_album_assets_search_failure_is_an_error(self):
+        """Test that a transient search failure does not download the full album."""
+        configure_clients(retries=0)
+        try:
+            with requests_mock.Mocker() as m:
+                m.get(
+                    "https://example.com/api/albums/album-123",
+                    json={"id": "album-123", "assets": [], "assetCount": 2},
+                )
+                m.post("https://example.com/api/search/metadata", status_code=503)
+
+                with pytest.raises(ImmichAPIError, match="Status code: 503"):
+                    get_album_assets("https://example.com", "test-key", "album-123", False)
+                assert m.call_count == 2
+        finally:
+            configure_clients()
+
+    def test_get_album_assets_empty_album(self):
+        """Test that an empty album needs no search."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/albums/album-123",
+                json={"id": "album-123", "assets": [], "assetCount": 0},
+            )
+
+            result = get_album_assets(
+                "https://example.com", "test-key", "album-123", False
+            )
+
+            assert result == set()
+            assert m.call_count == 1
+
     def test_remove_assets_from_album_success(self, capsys):
         """Test removal of assets from an album using the DELETE endpoint."""
         with requests_mock.Mocker() as m:
@@ -451,3 +682,630 @@ class TestAlbumFunctions:
             assert result is True
             captured = capsys.readouterr()
             assert "Successfully removed 1 asset(s)" in captured.out
+
+
+class TestImmichClient:
+    """Test the shared pooled HTTP client."""
+
+    def test_client_reused_across_helpers(self):
+        """Test that helpers share one session per server/key pair."""
+        first = get_client("https://example.com", "test-key")
+        second = get_client("https://example.com", "test-key")
+        other = get_client("https://example.com", "other-key")
+
+        assert first is second
+        assert first is not other
+        assert first.session.headers["x-api-key"] == "test-key"
+        assert first.session.headers["Accept"] == "application/json"
+
+    def test_configure_clients_pool_size(self):
+        """Test that the configured pool size is applied to new clients."""
+        configure_clients(pool_size=3)
+        try:
+            client = get_client("https://example.com", "test-key")
+            adapter = client.session.get_adapter("https://example.com")
+            assert adapter._pool_maxsize == 3
+        finally:
+            configure_clients()
+
+    def test_configure_clients_request_budget(self):
+        """Test that a global in-flight budget is attached to new clients."""
+        configure_clients(max_in_flight=5)
+        try:
+            client = get_client("https://example.com", "test-key")
+            assert client.limiter.limit == 5
+        finally:
+            configure_clients()
+        assert get_client("https://example.com", "test-key").limiter is None
+
+    def test_configure_clients_adaptive_budget(self):
+        """Test that --min-in-flight attaches an adaptive limiter fed by responses."""
+        configure_clients(max_in_flight=8, min_in_flight=2)
+        try:
+            client = get_client("https://example.com", "test-key")
+            assert client.limiter.limit == 2
+            client.limiter.window = 2
+            with requests_mock.Mocker() as m:
+                m.get("https://example.com/api/assets/asset-1", json={"id": "asset-1"})
+                get_asset("https://example.com", "test-key", "asset-1", False)
+                get_asset("https://example.com", "test-key", "asset-1", False)
+            assert client.limiter.limit == 3
+        finally:
+            configure_clients()
+
+    def test_helpers_send_session_headers(self):
+        """Test that the API key set on the session reaches every request."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/assets/asset-1",
+                json={"id": "asset-1", "people": []},
+                status_code=200,
+            )
+            m.put(
+                "https://example.com/api/albums/album-123/assets",
+                json={"success": True},
+                status_code=200,
+            )
+
+            get_asset("https://example.com", "test-key", "asset-1", False)
+            add_assets_to_album(
+                "https://example.com", "test-key", "album-123", ["asset-1"], False
+            )
+
+            for request in m.request_history:
+                assert request.headers["x-api-key"] == "test-key"
+
+    def test_client_retries_transient_status(self, mocker):
+        """Test that a 503 is retried after its Retry-After and then succeeds."""
+        configure_clients()
+        sleep = mocker.patch("immich_face_to_album.__main__.time.sleep")
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/assets/asset-1",
+                [
+                    {"status_code": 503, "headers": {"Retry-After": "2"}},
+                    {"json": {"id": "asset-1", "people": []}, "status_code": 200},
+                ],
+            )
+
+            asset = get_asset("https://example.com", "test-key", "asset-1", False)
+
+            assert asset == {"id": "asset-1", "people": []}
+            assert m.call_count == 2
+            sleep.assert_called_once_with(2.0)
+
+    def test_client_sets_default_timeout(self):
+        """Test that every request carries a connect/read timeout."""
+        configure_clients(read_timeout=30)
+        try:
+            with requests_mock.Mocker() as m:
+                m.get("https://example.com/api/assets/asset-1", json={"id": "asset-1"})
+                get_asset("https://example.com", "test-key", "asset-1", False)
+
+                assert m.last_request.timeout == (10.0, 30)
+        finally:
+            configure_clients()
+
+    def test_client_retry_timeouts_opt_out(self, mocker):
+        """Test that retry_timeouts=False raises a read timeout on the first attempt."""
+        configure_clients()
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
+        client = get_client("https://example.com", "test-key")
+        try:
+            with requests_mock.Mocker() as m:
+                m.put(
+                    "https://example.com/api/albums/album-123/assets",
+                    exc=requests.exceptions.ReadTimeout,
+                )
+
+                with pytest.raises(requests.exceptions.ReadTimeout):
+                    client.put(
+                        "https://example.com/api/albums/album-123/assets", retry_timeouts=False
+                    )
+                assert m.call_count == 1
+
+                with pytest.raises(requests.exceptions.ReadTimeout):
+                    client.put("https://example.com/api/albums/album-123/assets")
+                assert m.call_count == 1 + 1 + client.retries
+        finally:
+            configure_clients()
+
+    def test_client_retries_connection_errors(self, mocker):
+        """Test that connection errors are retried and re-raised when they persist."""
+        configure_clients(retries=2)
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
+        try:
+            with requests_mock.Mocker() as m:
+                m.get(
+                    "https://example.com/api/timeline/buckets",
+                    exc=requests.exceptions.ConnectionError,
+                )
+
+                with pytest.raises(ImmichAPIError):
+                    get_time_buckets("https://example.com", "test-key", "face-1", "MONTH", False)
+                assert m.call_count == 3
+        finally:
+            configure_clients()
+
+
+class TestCrawlFaces:
+    """Test the asyncio crawl engine."""
+
+    def test_crawl_face_buckets_collects_each_face(self):
+        """Test that every face maps to its assets, grouped by bucket."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/timeline/buckets?personId=face-1&size=MONTH",
+                json=[{"timeBucket": "2024-01"}, {"timeBucket": "2024-02"}],
+            )
+            m.get(
+                "https://example.com/api/timeline/buckets?personId=face-2&size=MONTH",
+                json=[{"timeBucket": "2024-01"}],
+            )
+            m.get(
+                "https://example.com/api/timeline/bucket?personId=face-1&timeBucket=2024-01",
+                json={"id": ["asset-1"]},
+            )
+            m.get(
+                "https://example.com/api/timeline/bucket?personId=face-1&timeBucket=2024-02",
+                json={"id": ["asset-2"]},
+            )
+            m.get(
+                "https://example.com/api/timeline/bucket?personId=face-2&timeBucket=2024-01",
+                json={"id": ["asset-1", "asset-3"]},
+            )
+
+            result = crawl_face_buckets(
+                "https://example.com", "test-key", ["face-1", "face-2", "face-1"]
+            )
+
+            assert result == {
+                "face-1": {"2024-01": {"asset-1"}, "2024-02": {"asset-2"}},
+                "face-2": {"2024-01": {"asset-1", "asset-3"}},
+            }
+            # face-1 is listed twice but crawled once: 2 bucket lists + 3 buckets
+            assert m.call_count == 5
+
+    def test_crawl_face_buckets_only_buckets(self):
+        """Test that only the requested buckets are fetched, grouped by bucket."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/timeline/buckets?personId=face-1&size=MONTH",
+                json=[{"timeBucket": "2024-01"}, {"timeBucket": "2024-02"}],
+            )
+            m.get(
+                "https://example.com/api/timeline/bucket?personId=face-1&timeBucket=2024-02",
+                json={"id": ["asset-2"]},
+            )
+
+            result = crawl_face_buckets(
+                "https://example.com",
+                "test-key",
+                ["face-1"],
+                only_buckets={"face-1": {"2024-02"}},
+            )
+
+            assert result == {"face-1": {"2024-02": {"asset-2"}}}
+            assert m.call_count == 2
+
+    def test_crawl_face_buckets_bounded_concurrency(self, mocker):
+        """Test that no more than `concurrency` requests are in flight."""
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+
+        def slow_bucket(server_url, key, face_id, time_bucket, size, verbose):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.02)
+            with lock:
+                state["in_flight"] -= 1
+            return {"id": [time_bucket]}
+
+        mocker.patch(
+            "immich_face_to_album.__main__.get_time_buckets",
+            return_value=[{"timeBucket": f"2024-{i:02d}"} for i in range(1, 13)],
+        )
+        mocker.patch(
+            "immich_face_to_album.__main__.get_assets_for_time_bucket",
+            side_effect=slow_bucket,
+        )
+
+        result = crawl_face_buckets(
+            "https://example.com", "test-key", ["face-1"], concurrency=3
+        )
+
+        assert len(result["face-1"]) == 12
+        assert 1 < state["peak"] <= 3
+
+    def test_crawl_face_buckets_incremental(self):
+        """Test that a cache skips buckets whose count did not change."""
+        cache = BucketCache()
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/timeline/buckets",
+                [
+                    {"json": [{"timeBucket": "2024-01", "count": 1}, {"timeBucket": "2024-02", "count": 1}]},
+                    {"json": [{"timeBucket": "2024-01", "count": 1}, {"timeBucket": "2024-02", "count": 2}]},
+                ],
+            )
+            m.get(
+                "https://example.com/api/timeline/bucket?timeBucket=2024-01",
+                json={"id": ["asset-1"]},
+            )
+            m.get(
+                "https://example.com/api/timeline/bucket?timeBucket=2024-02",
+                [{"json": {"id": ["asset-2"]}}, {"json": {"id": ["asset-2", "asset-3"]}}],
+            )
+
+            first = crawl_face_buckets(
+                "https://example.com", "test-key", ["face-1"], cache=cache
+            )
+            second = crawl_face_buckets(
+                "https://example.com", "test-key", ["face-1"], cache=cache
+            )
+
+            assert first == {"face-1": {"2024-01": {"asset-1"}, "2024-02": {"asset-2"}}}
+            assert second == {
+                "face-1": {"2024-01": {"asset-1"}, "2024-02": {"asset-2", "asset-3"}}
+            }
+            bucket_fetches = [
+                r.qs["timebucket"][0]
+                for r in m.request_history
+                if r.path == "/api/timeline/bucket"
+            ]
+            # Second pass refetches only the bucket whose count changed
+            assert sorted(bucket_fetches) == ["2024-01", "2024-02", "2024-02"]
+
+    def test_blocking_on_bucket_does_not_stall_the_crawl(self, mocker):
+        """Test that finished fetches are still processed while on_bucket blocks."""
+        released = threading.Event()
+        mocker.patch(
+            "immich_face_to_album.__main__.get_time_buckets",
+            return_value=[{"timeBucket": "2024-01"}, {"timeBucket": "2024-02"}],
+        )
+
+        def fetch_bucket(server_url, key, face_id, time_bucket, size, verbose):
+            if time_bucket == "2024-02":
+                time.sleep(0.05)
+            return {"id": [time_bucket]}
+
+        mocker.patch(
+            "immich_face_to_album.__main__.get_assets_for_time_bucket",
+            side_effect=fetch_bucket,
+        )
+
+        class ReleasingCache(BucketCache):
+            def put(self, face_id, time_bucket, count, asset_ids):
+                super().put(face_id, time_bucket, count, asset_ids)
+                # Runs on the event loop once 2024-02 has been fetched
+                if time_bucket == "2024-02":
+                    released.set()
+
+        handed_off = []
+
+        def on_bucket(face_id, time_bucket, asset_ids):
+            if time_bucket == "2024-01":
+                # Like a full queue that only drains once the crawl moves on
+                assert released.wait(timeout=2)
+            handed_off.append(time_bucket)
+
+        result = crawl_face_buckets(
+            "https://example.com",
+            "test-key",
+            ["face-1"],
+            concurrency=2,
+            cache=ReleasingCache(),
+            on_bucket=on_bucket,
+        )
+
+        assert sorted(handed_off) == ["2024-01", "2024-02"]
+        assert result == {"face-1": {"2024-01": {"2024-01"}, "2024-02": {"2024-02"}}}
+
+    def test_crawl_face_buckets_retries_failed_buckets(self, mocker):
+        """Test that buckets failing after their retries get one more round."""
+        mocker.patch(
+            "immich_face_to_album.__main__.get_time_buckets",
+            return_value=[{"timeBucket": "2024-01"}, {"timeBucket": "2024-02"}],
+        )
+        calls = []
+
+        def flaky_bucket(server_url, key, face_id, time_bucket, size, verbose):
+            calls.append(time_bucket)
+            if time_bucket == "2024-02" and calls.count(time_bucket) == 1:
+                raise ImmichAPIError("Status code: 502")
+            return {"id": [time_bucket]}
+
+        mocker.patch(
+            "immich_face_to_album.__main__.get_assets_for_time_bucket",
+            side_effect=flaky_bucket,
+        )
+
+        result = crawl_face_buckets("https://example.com", "test-key", ["face-1"])
+
+        assert result == {"face-1": {"2024-01": {"2024-01"}, "2024-02": {"2024-02"}}}
+        assert sorted(calls) == ["2024-01", "2024-02", "2024-02"]
+
+    def test_crawl_face_buckets_empty(self):
+        """Test that crawling no faces issues no requests."""
+        with requests_mock.Mocker() as m:
+            assert crawl_face_buckets("https://example.com", "test-key", []) == {}
+            assert m.call_count == 0
+
+
+class TestFilterExactFaces:
+    """Test the parallel --no-other-faces verification."""
+
+    def test_filter_exact_faces_isolates_failures(self, mocker):
+        """Test that one failing lookup does not stop the others."""
+        people = {
+            "asset-1": [{"id": "face-1"}],
+            "asset-2": [{"id": "face-1"}, {"id": "face-9"}],
+            "asset-4": [],
+        }
+
+        def fake_get_asset(server_url, key, asset_id, verbose=False):
+            if asset_id == "asset-3":
+                raise ConnectionError("boom")
+            return {"id": asset_id, "people": people[asset_id]}
+
+        mocker.patch(
+            "immich_face_to_album.__main__.get_asset", side_effect=fake_get_asset
+        )
+        # Neither the metadata search nor its retry backoff is under test here
+        mocker.patch("immich_face_to_album.__main__.get_people_bulk", return_value=None)
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
+
+        result, stats = filter_exact_faces(
+            "https://example.com",
+            "test-key",
+            {"asset-1", "asset-2", "asset-3", "asset-4"},
+            {"face-1"},
+            concurrency=2,
+        )
+
+        assert result == {"asset-1", "asset-4"}
+        assert stats == {
+            "checked": 4,
+            "rejected_extra": 1,
+            "rejected_missing": 0,
+            "failed": 1,
+        }
+
+    def test_filter_exact_faces_require_all(self, mocker):
+        """Test that missing faces are rejected when all faces are required."""
+        mocker.patch("immich_face_to_album.__main__.get_people_bulk", return_value=None)
+        mocker.patch(
+            "immich_face_to_album.__main__.get_asset",
+            side_effect=lambda server_url, key, asset_id, verbose=False: {
+                "id": asset_id,
+                "people": [{"id": "face-1"}],
+            },
+        )
+
+        result, stats = filter_exact_faces(
+            "https://example.com",
+            "test-key",
+            {"asset-1"},
+            {"face-1", "face-2"},
+            require_all_faces=True,
+        )
+
+        assert result == set()
+        assert stats["rejected_missing"] == 1
+
+
+class TestKeepAssetsWithFaces:
+    """Test the people-lookup check used by the AND planner."""
+
+    def test_keeps_assets_with_every_face(self):
+        """Test cached and fetched people, and that failed lookups are dropped."""
+        with requests_mock.Mocker() as m:
+            m.get(
+                "https://example.com/api/assets/asset-2",
+                json={"id": "asset-2", "people": [{"id": "face-1"}, {"id": "face-2"}]},
+            )
+            m.get("https://example.com/api/assets/asset-3", status_code=404)
+            people_cache = {"asset-1": {"face-1"}}
+
+            kept = keep_assets_with_faces(
+                "https://example.com",
+                "test-key",
+                {"asset-1", "asset-2", "asset-3"},
+                ["face-2"],
+                people_cache=people_cache,
+            )
+
+            assert kept == {"asset-2"}
+            assert people_cache["asset-2"] == {"face-1", "face-2"}
+            assert m.call_count == 2
+
+
+class TestGetPeopleBulk:
+    """Test bulk people lookups through the metadata search endpoint."""
+
+    def test_get_people_bulk_pages(self):
+        """Test that pages are followed and only wanted assets are kept."""
+        with requests_mock.Mocker() as m:
+            m.post(
+                "https://example.com/api/search/metadata",
+                [
+                    {
+                        "json": {
+                            "assets": {
+                                "items": [
+                                    {"id": "asset-1", "people": [{"id": "face-1"}]},
+                                    {"id": "asset-x", "people": [{"id": "face-1"}]},
+                                ],
+                                "nextPage": "2",
+                            }
+                        }
+                    },
+                    {
+                        "json": {
+                            "assets": {
+                                "items": [
+                                    {
+                                        "id": "asset-2",
+                                        "people": [{"id": "face-1"}, {"id": "face-2"}],
+                                    }
+                                ],
+                                "nextPage": None,
+                            }
+                        }
+                    },
+                ],
+            )
+
+            result = get_people_bulk(
+                "https://example.com",
+                "test-key",
+                ["face-1"],
+                {"asset-1", "asset-2"},
+            )
+
+            assert result == {"asset-1": {"face-1"}, "asset-2": {"face-1", "face-2"}}
+            assert m.call_count == 2
+            assert m.request_history[0].json()["personIds"] == ["face-1"]
+            assert m.request_history[0].json()["withPeople"] is True
+            assert m.request_history[1].json()["page"] == "2"
+
+    def test_get_people_bulk_stops_early(self):
+        """Test that paging stops once every wanted asset was seen."""
+        with requests_mock.Mocker() as m:
+            m.post(
+                "https://example.com/api/search/metadata",
+                json={
+                    "assets": {
+                        "items": [{"id": "asset-1", "people": []}],
+                        "nextPage": "2",
+                    }
+                },
+            )
+
+            result = get_people_bulk(
+                "https://example.com", "test-key", ["face-1"], {"asset-1"}
+            )
+
+            assert result == {"asset-1": set()}
+            assert m.call_count == 1
+
+    def test_get_people_bulk_unsupported(self):
+        """Test that an older server without the endpoint yields None."""
+        with requests_mock.Mocker() as m:
+            m.post("https://example.com/api/search/metadata", status_code=404)
+
+            result = get_people_bulk(
+                "https://example.com", "test-key", ["face-1"], {"asset-1"}
+            )
+
+            assert result is None
+
+    def test_filter_exact_faces_search_with_fallback(self):
+        """Test that assets missing from the search are looked up one by one."""
+        with requests_mock.Mocker() as m:
+            m.post(
+                "https://example.com/api/search/metadata",
+                json={
+                    "assets": {
+                        "items": [
+                            {"id": "asset-1", "people": [{"id": "face-1"}]},
+                            {"id": "asset-2", "people": [{"id": "face-1"}, {"id": "face-3"}]},
+                        ],
+                        "nextPage": None,
+                    }
+                },
+            )
+            m.get(
+                "https://example.com/api/assets/asset-3",
+                json={"id": "asset-3", "people": [{"id": "face-1"}]},
+            )
+
+            result, stats = filter_exact_faces(
+                "https://example.com",
+                "test-key",
+                {"asset-1", "asset-2", "asset-3"},
+                {"face-1"},
+            )
+
+            assert result == {"asset-1", "asset-3"}
+            assert stats["checked"] == 3
+            assert stats["rejected_extra"] == 1
+            asset_gets = [r for r in m.request_history if r.method == "GET"]
+            assert [r.path for r in asset_gets] == ["/api/assets/asset-3"]
+
+
+class TestSearchAssetsWithFaces:
+    """Test server-side AND evaluation."""
+
+    def test_search_assets_with_faces_pages(self):
+        """Test that every page of the intersection is collected."""
+        with requests_mock.Mocker() as m:
+            m.post(
+                "https://example.com/api/search/metadata",
+                [
+                    {"json": {"assets": {"items": [{"id": "asset-1"}], "nextPage": "2"}}},
+                    {"json": {"assets": {"items": [{"id": "asset-2"}], "nextPage": None}}},
+                ],
+            )
+
+            result = search_assets_with_faces(
+                "https://example.com", "test-key", ["face-1", "face-2"]
+            )
+
+            assert result == {"asset-1", "asset-2"}
+            body = m.request_history[0].json()
+            assert body["personIds"] == ["face-1", "face-2"]
+            assert body["isArchived"] is False
+
+    def test_search_assets_with_faces_failure_mid_paging(self, mocker):
+        """Test that a failing page discards partial results."""
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
+        with requests_mock.Mocker() as m:
+            m.post(
+                "https://example.com/api/search/metadata",
+                [
+                    {"json": {"assets": {"items": [{"id": "asset-1"}], "nextPage": "2"}}},
+                    {"status_code": 500},
+                ],
+            )
+
+            result = search_assets_with_faces(
+                "https://example.com", "test-key", ["face-1", "face-2"]
+            )
+
+            assert result is None
+
+
+class TestBucketCache:
+    """Test the per-face bucket cache."""
+
+    def test_bucket_cache_requires_matching_count(self):
+        """Test that entries are only reused for the same count."""
+        cache = BucketCache()
+        cache.put("face-1", "2024-01", 2, {"asset-1", "asset-2"})
+
+        assert cache.get("face-1", "2024-01", 2) == {"asset-1", "asset-2"}
+        assert cache.get("face-1", "2024-01", 3) is None
+        assert cache.get("face-1", "2024-01", None) is None
+        assert cache.get("face-2", "2024-01", 2) is None
+
+    def test_bucket_cache_packs_uuids(self):
+        """Test that UUID buckets are stored packed and returned as strings."""
+        ids = {"0b7c9d3e-1f2a-4b5c-8d6e-7f8091a2b3c4", "ffffffff-0000-4000-8000-000000000001"}
+        cache = BucketCache()
+        cache.put("face-1", "2024-01", 2, ids)
+
+        assert isinstance(cache._faces["face-1"]["2024-01"][1], bytes)
+        assert cache.get("face-1", "2024-01", 2) == ids
+
+    def test_bucket_cache_prune(self):
+        """Test that vanished buckets are forgotten."""
+        cache = BucketCache()
+        cache.put("face-1", "2024-01", 1, {"asset-1"})
+        cache.put("face-1", "2024-02", 1, {"asset-2"})
+
+        cache.prune("face-1", ["2024-02"])
+
+        assert cache.get("face-1", "2024-01", 1) is None
+        assert cache.get("face-1", "2024-02", 1) == {"asset-2"}
@@ -1,7 +1,20 @@
+import json
+import threading
+import time
+
+import click
 import pytest
+import requests
 import requests_mock
 from click.testing import CliRunner
-from immich_face_to_album.__main__ import face_to_album
+from immich_face_to_album.__main__ import (
+    AlbumSync,
+    ImmichAPIError,
+    StateStore,
+    face_to_album,
+    load_config,
+    make_rule,
+)
 
 
 @pytest.fixture
@@ -14,6 +27,14 @@ def runner():
 def mock_api():
     """Fixture for mocking API responses."""
     with requests_mock.Mocker() as m:
+        # Behave like a server without the optional metadata search endpoint;
+        # tests exercising it register their own response.
+        m.post("https://example.com/api/search/metadata", status_code=404)
+        # The target album starts out empty unless a test says otherwise.
+        m.get(
+            "https://example.com/api/albums/album-123",
+            json={"id": "album-123", "assets": []},
+        )
         yield m
 
 
@@ -301,6 +322,210 @@ class TestMultipleFacesAND:
         assert "Total unique assets to add: 0" in result.output
 
 
+    def test_require_all_faces_server_side_search(self, runner, mock_api):
+        """Test that the AND is pushed down to the metadata search when supported."""
+        mock_api.post(
+            "https://example.com/api/search/metadata",
+            json={
+                "assets": {
+                    "items": [{"id": "asset-2"}, {"id": "asset-3"}],
+                    "nextPage": None,
+                }
+            },
+            status_code=200,
+        )
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+            status_code=200,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key",
+                "test-key",
+                "--server",
+                "https://example.com",
+                "--face",
+                "face-1",
+                "--face",
+                "face-2",
+                "--album",
+                "album-123",
+                "--require-all-faces",
+            ],
+        )
+
+        assert result.exit_code == 0
+        assert "Total unique assets to add: 2" in result.output
+        # No face was crawled
+        assert not any("/timeline/" in r.path for r in mock_api.request_history)
+
+    def test_require_all_faces_crawl_strategy(self, runner, mock_api):
+        """Test that --and-strategy crawl never queries the search endpoint."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1"]},
+            status_code=200,
+        )
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+            status_code=200,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key",
+                "test-key",
+                "--server",
+                "https://example.com",
+                "--face",
+                "face-1",
+                "--face",
+                "face-2",
+                "--album",
+                "album-123",
+                "--require-all-faces",
+                "--and-strategy",
+                "crawl",
+            ],
+        )
+
+        assert result.exit_code == 0
+        assert "Total unique assets to add: 1" in result.output
+        assert not any(r.method == "POST" for r in mock_api.request_history)
+
+    def test_require_all_faces_crawls_only_the_rarest_face(self, runner, mock_api):
+        """Test that the larger face is only fetched in buckets the rarest face has."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-rare",
+            json=[{"timeBucket": "2024-01", "count": 2}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-common",
+            json=[
+                {"timeBucket": "2024-01", "count": 400},
+                {"timeBucket": "2024-02", "count": 900},
+                {"timeBucket": "2024-03", "count": 700},
+            ],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-rare&timeBucket=2024-01",
+            json={"id": ["asset-1", "asset-2"]},
+        )
+        overlap = mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-common&timeBucket=2024-01",
+            json={"id": ["asset-2", "asset-9"]},
+        )
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-2", "success": True}],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-common",
+                "--face", "face-rare",
+                "--album", "album-123",
+                "--require-all-faces",
+                "--and-strategy", "crawl",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Total unique assets to add: 1" in result.output
+        assert overlap.call_count == 1
+        bucket_requests = [
+            r.qs["timebucket"][0]
+            for r in mock_api.request_history
+            if r.path == "/api/timeline/bucket" and r.qs["personid"] == ["face-common"]
+        ]
+        assert bucket_requests == ["2024-01"]
+
+    def test_require_all_faces_skips_unshared_buckets(self, runner, mock_api):
+        """Test that buckets missing from any face's bucket list are never fetched."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-1",
+            json=[{"timeBucket": "2024-01", "count": 3}, {"timeBucket": "2024-05", "count": 1}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-2",
+            json=[{"timeBucket": "2024-01", "count": 5}, {"timeBucket": "2024-09", "count": 1}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?timeBucket=2024-01",
+            json={"id": ["asset-1", "asset-2"]},
+        )
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-1", "success": True}, {"id": "asset-2", "success": True}],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--face", "face-2",
+                "--album", "album-123",
+                "--require-all-faces",
+                "--and-strategy", "crawl",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Total unique assets to add: 2" in result.output
+        fetched = {
+            r.qs["timebucket"][0]
+            for r in mock_api.request_history
+            if r.path == "/api/timeline/bucket"
+        }
+        assert fetched == {"2024-01"}
+
+    def test_require_all_faces_disjoint_buckets(self, runner, mock_api):
+        """Test that faces without a shared bucket cost no bucket fetches."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-1",
+            json=[{"timeBucket": "2024-01", "count": 3}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-2",
+            json=[{"timeBucket": "2024-02", "count": 5}],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--face", "face-2",
+                "--album", "album-123",
+                "--require-all-faces",
+                "--and-strategy", "crawl",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Total unique assets to add: 0" in result.output
+        assert not any(r.path == "/api/timeline/bucket" for r in mock_api.request_history)
+
+
 class TestSkipFaceExclusion:
     """Test face exclusion with --skip-face."""
 
@@ -437,11 +662,76 @@ class TestSkipFaceExclusion:
         assert "Excluded 2 asset(s) belonging to skipped face(s)" in result.output
 
 
+    def test_skip_face_only_crawls_candidate_buckets(self, runner, mock_api):
+        """Test that a skip face is fetched only where candidates are."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-1",
+            json=[{"timeBucket": "2024-01"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-skip",
+            json=[{"timeBucket": "2024-01"}, {"timeBucket": "2024-02"}, {"timeBucket": "2024-03"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-1",
+            json={"id": ["asset-1", "asset-2"]},
+        )
+        skip_bucket = mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-skip",
+            json={"id": ["asset-2"]},
+        )
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-1", "success": True}],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--skip-face", "face-skip",
+                "--album", "album-123",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Excluded 1 asset(s) belonging to skipped face(s)" in result.output
+        assert skip_bucket.call_count == 1
+        assert skip_bucket.last_request.qs["timebucket"] == ["2024-01"]
+
+    def test_skip_face_not_crawled_without_candidates(self, runner, mock_api):
+        """Test that an empty candidate set never touches the skip face."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-1",
+            json=[],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--skip-face", "face-skip",
+                "--album", "album-123",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert not any(
+            r.qs.get("personid") == ["face-skip"] for r in mock_api.request_history
+        )
+
+
 class TestChunking:
     """Test asset chunking for large batches."""
 
-    def test_chunking_multiple_chunks(self, runner, mock_api):
-        """Test that assets are chunked into groups of 500."""
+    def test_chunking_multiple_chunks(self, runner, mock_api, mocker):
+        """Test that writes start with 500 assets and grow while responses are fast."""
+        # Every response takes no time at all, so each batch grows the next one
+        mocker.patch("immich_face_to_album.__main__.time.monotonic", return_value=0.0)
         # Generate 1250 asset IDs
         asset_ids = [f"asset-{i}" for i in range(1250)]
 
@@ -459,10 +749,16 @@ class TestChunking:
             status_code=200,
         )
 
-        # Mock album update (should be called 3 times: 500 + 500 + 250)
+        # Mock album update (one batch at a time: 500, then 750 after a fast response).
+        # Holding each response keeps the writer waiting on the first batch, so
+        # the second is only cut once the first has reported its timing
+        def put_callback(request, context):
+            time.sleep(0.05)
+            return {"success": True}
+
         mock_api.put(
             "https://example.com/api/albums/album-123/assets",
-            json={"success": True},
+            json=put_callback,
             status_code=200,
         )
 
@@ -477,22 +773,65 @@ class TestChunking:
                 "face-1",
                 "--album",
                 "album-123",
+                "--concurrency",
+                "1",
             ],
         )
 
         assert result.exit_code == 0
         assert "Total unique assets to add: 1250" in result.output
-        # Should see 3 successful additions
-        assert result.output.count("Added") == 3
+        # Should see 2 successful additions
+        assert result.output.count("Added") == 2
+        puts = [r for r in mock_api.request_history if r.method == "PUT"]
+        assert [len(r.json()["ids"]) for r in puts] == [500, 750]
         assert "Added 500 asset(s) to the album" in result.output
-        assert "Added 250 asset(s) to the album" in result.output
+        assert "Added 750 asset(s) to the album" in result.output
 
+    def test_too_large_batches_are_split(self, runner, mock_api):
+        """Test that a batch refused with 413 is resent in halves."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": [f"asset-{i}" for i in range(400)]},
+        )
 
-class TestVerboseOutput:
-    """Test verbose output."""
+        def put_callback(request, context):
+            ids = request.json()["ids"]
+            if len(ids) > 200:
+                context.status_code = 413
+                return {"error": "Payload Too Large"}
+            return [{"id": asset_id, "success": True} for asset_id in ids]
 
-    def test_verbose_flag(self, runner, mock_api):
-        """Test that --verbose produces detailed output."""
+        put = mock_api.put(
+            "https://example.com/api/albums/album-123/assets", json=put_callback
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--no-stream",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert [len(r.json()["ids"]) for r in put.request_history] == [400, 200, 200]
+        assert "Album write summary: added 400, duplicate 0, failed 0" in result.output
+        # The refused batch is resent, so it is not reported as an error
+        assert "Error adding assets" not in result.output
+
+
+class TestDiffWrites:
+    """Test that only assets missing from the album are sent."""
+
+    def test_only_new_assets_are_added(self, runner, mock_api):
+        """Test that assets already in the album are not re-sent."""
         mock_api.get(
             "https://example.com/api/timeline/buckets",
             json=[{"timeBucket": "2024-01"}],
@@ -501,7 +840,13 @@ class TestVerboseOutput:
 
         mock_api.get(
             "https://example.com/api/timeline/bucket",
-            json={"id": ["asset-1"]},
+            json={"id": ["asset-1", "asset-2", "asset-3"]},
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/albums/album-123",
+            json={"id": "album-123", "assets": [{"id": "asset-1"}, {"id": "asset-2"}]},
             status_code=200,
         )
 
@@ -522,36 +867,32 @@ class TestVerboseOutput:
                 "face-1",
                 "--album",
                 "album-123",
-                "--verbose",
             ],
         )
 
         assert result.exit_code == 0
-        assert "Processing face ID:" in result.output
-        assert "Fetching time buckets from" in result.output
-        assert "Adding chunk of" in result.output
-
+        assert "2 asset(s) already in the album, 1 new" in result.output
+        puts = [r for r in mock_api.request_history if r.method == "PUT"]
+        assert len(puts) == 1
+        assert puts[0].json() == {"ids": ["asset-3"]}
 
-class TestTimeBucketSizes:
-    """Test different time bucket sizes."""
-
-    def test_week_timebucket(self, runner, mock_api):
-        """Test using WEEK time bucket size."""
+    def test_stable_album_sends_no_writes(self, runner, mock_api):
+        """Test that a pass over an up-to-date album issues no PUT."""
         mock_api.get(
-            "https://example.com/api/timeline/buckets?personId=face-1&size=WEEK",
-            json=[{"timeBucket": "2024-W01"}],
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
             status_code=200,
         )
 
         mock_api.get(
-            "https://example.com/api/timeline/bucket?isArchived=false&personId=face-1&size=WEEK&timeBucket=2024-W01",
+            "https://example.com/api/timeline/bucket",
             json={"id": ["asset-1"]},
             status_code=200,
         )
 
-        mock_api.put(
-            "https://example.com/api/albums/album-123/assets",
-            json={"success": True},
+        mock_api.get(
+            "https://example.com/api/albums/album-123",
+            json={"id": "album-123", "assets": [{"id": "asset-1"}]},
             status_code=200,
         )
 
@@ -566,31 +907,55 @@ class TestTimeBucketSizes:
                 "face-1",
                 "--album",
                 "album-123",
-                "--timebucket",
-                "WEEK",
             ],
         )
 
         assert result.exit_code == 0
-        assert "Total unique assets to add: 1" in result.output
+        assert "1 asset(s) already in the album, 0 new" in result.output
+        assert not any(r.method == "PUT" for r in mock_api.request_history)
 
 
-class TestErrorHandling:
-    """Test error handling scenarios."""
+class TestAddResultCounters:
+    """Test that per-ID add results drive the reported counters."""
 
-    def test_api_error_exits(self, runner, mock_api):
-        """Test that API errors cause proper exit."""
+    def test_duplicates_and_retry(self, runner, mock_api):
+        """Test duplicate counting and the follow-up retry of failed IDs."""
         mock_api.get(
             "https://example.com/api/timeline/buckets",
-            text="Unauthorized",
-            status_code=401,
+            json=[{"timeBucket": "2024-01"}],
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1", "asset-2", "asset-3"]},
+            status_code=200,
+        )
+
+        def put_response(request, context):
+            ids = request.json()["ids"]
+            if len(ids) > 1:
+                return [
+                    {"id": asset_id, "success": False, "error": "duplicate"}
+                    if asset_id == "asset-1"
+                    else {"id": asset_id, "success": False, "error": "unknown"}
+                    if asset_id == "asset-3"
+                    else {"id": asset_id, "success": True}
+                    for asset_id in ids
+                ]
+            return [{"id": ids[0], "success": True}]
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=put_response,
+            status_code=200,
         )
 
         result = runner.invoke(
             face_to_album,
             [
                 "--key",
-                "bad-key",
+                "test-key",
                 "--server",
                 "https://example.com",
                 "--face",
@@ -600,11 +965,19 @@ class TestErrorHandling:
             ],
         )
 
-        assert result.exit_code == 1
-        assert "Failed to fetch time buckets" in result.output
+        assert result.exit_code == 0
+        assert "Added 1 asset(s) to the album (1 duplicate(s), 1 failed)" in result.output
+        assert "Retrying 1 failed asset(s)" in result.output
+        assert "Album write summary: added 2, duplicate 1, failed 0" in result.output
+        puts = [r for r in mock_api.request_history if r.method == "PUT"]
+        assert puts[-1].json() == {"ids": ["asset-3"]}
 
-    def test_album_update_failure(self, runner, mock_api):
-        """Test handling of album update failures."""
+
+class TestVerboseOutput:
+    """Test verbose output."""
+
+    def test_verbose_flag(self, runner, mock_api):
+        """Test that --verbose produces detailed output."""
         mock_api.get(
             "https://example.com/api/timeline/buckets",
             json=[{"timeBucket": "2024-01"}],
@@ -619,8 +992,120 @@ class TestErrorHandling:
 
         mock_api.put(
             "https://example.com/api/albums/album-123/assets",
-            json={"error": "Permission denied"},
-            status_code=403,
+            json={"success": True},
+            status_code=200,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key",
+                "test-key",
+                "--server",
+                "https://example.com",
+                "--face",
+                "face-1",
+                "--album",
+                "album-123",
+                "--verbose",
+            ],
+        )
+
+        assert result.exit_code == 0
+        assert "Processing face ID:" in result.output
+        assert "Fetching time buckets from" in result.output
+        assert "Adding chunk of" in result.output
+
+
+class TestTimeBucketSizes:
+    """Test different time bucket sizes."""
+
+    def test_week_timebucket(self, runner, mock_api):
+        """Test using WEEK time bucket size."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-1&size=WEEK",
+            json=[{"timeBucket": "2024-W01"}],
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?isArchived=false&personId=face-1&size=WEEK&timeBucket=2024-W01",
+            json={"id": ["asset-1"]},
+            status_code=200,
+        )
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+            status_code=200,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key",
+                "test-key",
+                "--server",
+                "https://example.com",
+                "--face",
+                "face-1",
+                "--album",
+                "album-123",
+                "--timebucket",
+                "WEEK",
+            ],
+        )
+
+        assert result.exit_code == 0
+        assert "Total unique assets to add: 1" in result.output
+
+
+class TestErrorHandling:
+    """Test error handling scenarios."""
+
+    def test_api_error_exits(self, runner, mock_api):
+        """Test that API errors cause proper exit."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            text="Unauthorized",
+            status_code=401,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key",
+                "bad-key",
+                "--server",
+                "https://example.com",
+                "--face",
+                "face-1",
+                "--album",
+                "album-123",
+            ],
+        )
+
+        assert result.exit_code == 1
+        assert "Failed to fetch time buckets" in result.output
+
+    def test_album_update_failure(self, runner, mock_api):
+        """Test handling of album update failures."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1"]},
+            status_code=200,
+        )
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"error": "Permission denied"},
+            status_code=403,
         )
 
         result = runner.invoke(
@@ -938,6 +1423,59 @@ class TestNoOtherFaces:
         assert "rejected missing-faces=1" in result.output
         assert "Total unique assets to add: 1" in result.output
 
+    def test_no_other_faces_bulk_search(self, runner, mock_api):
+        """Test that --no-other-faces uses the metadata search when available."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-1&size=MONTH",
+            json=[{"timeBucket": "2024-01"}],
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?isArchived=false&personId=face-1&size=MONTH&timeBucket=2024-01",
+            json={"id": ["asset-1", "asset-2"]},
+            status_code=200,
+        )
+
+        mock_api.post(
+            "https://example.com/api/search/metadata",
+            json={
+                "assets": {
+                    "items": [
+                        {"id": "asset-1", "people": [{"id": "face-1"}]},
+                        {"id": "asset-2", "people": [{"id": "face-1"}, {"id": "face-2"}]},
+                    ],
+                    "nextPage": None,
+                }
+            },
+            status_code=200,
+        )
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+            status_code=200,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key",
+                "test-key",
+                "--server",
+                "https://example.com",
+                "--face",
+                "face-1",
+                "--album",
+                "album-123",
+                "--no-other-faces",
+            ],
+        )
+
+        assert result.exit_code == 0
+        assert "After enforcing --no-other-faces: 1 asset(s) remain" in result.output
+        assert not any("/api/assets/" in r.path for r in mock_api.request_history)
+
     def test_no_other_faces_asset_fetch_failure(self, runner, mock_api):
         """Test --no-other-faces when asset fetch fails."""
         mock_api.get(
@@ -1052,3 +1590,807 @@ class TestRemoveNonMatching:
         assert "Total unique assets to add: 1" in result.output
         assert "Total assets to remove: 1" in result.output
         assert "Removed 1 non-matching asset(s) from album" in result.output
+
+
+class TestStateDb:
+    """Test persistent state with --state-db."""
+
+    def test_state_db_album_snapshot_survives_failed_read(self, runner, mock_api, mocker, tmp_path):
+        """Test that a failed album read uses the snapshot instead of wiping it."""
+        mocker.patch("immich_face_to_album.__main__.time.sleep")
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1", "asset-2"]},
+        )
+        put = mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+        )
+        state_db = str(tmp_path / "state.db")
+        args = [
+            "--key", "test-key",
+            "--server", "https://example.com",
+            "--face", "face-1",
+            "--album", "album-123",
+            "--state-db", state_db,
+        ]
+
+        mock_api.get(
+            "https://example.com/api/albums/album-123",
+            json={"id": "album-123", "assets": [{"id": "asset-1"}]},
+        )
+        first = runner.invoke(face_to_album, args)
+        mock_api.get("https://example.com/api/albums/album-123", status_code=502)
+        second = runner.invoke(face_to_album, args)
+
+        assert first.exit_code == 0, first.output
+        assert second.exit_code == 0, second.output
+        assert "Using the last known membership of album album-123 (2 asset(s))" in second.output
+        # Only the first run had something to add
+        assert put.call_count == 1
+        assert StateStore(state_db).album_snapshot("album-123") == {"asset-1", "asset-2"}
+
+    def test_state_db_records_only_removed_batches(self, runner, mock_api, tmp_path):
+        """Test that a refused removal batch stays in the count and snapshot."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-keep"]},
+        )
+        stale = [f"stale-{i:03d}" for i in range(700)]
+        mock_api.get(
+            "https://example.com/api/albums/album-123",
+            json={"id": "album-123", "assets": [{"id": a} for a in ["asset-keep"] + stale]},
+        )
+
+        def delete_callback(request, context):
+            # The second batch (the last 200 IDs) is refused
+            if len(request.json()["ids"]) == 200:
+                context.status_code = 400
+                return {"error": "Bad Request"}
+            return {"success": True}
+
+        mock_api.delete("https://example.com/api/albums/album-123/assets", json=delete_callback)
+        state_db = str(tmp_path / "state.db")
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--remove-non-matching",
+                "--concurrency", "1",
+                "--state-db", state_db,
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Removed 500 of 700 non-matching asset(s) from album" in result.output
+        assert len(StateStore(state_db).album_snapshot("album-123")) == 201
+
+    def test_state_db_reuses_buckets_across_runs(self, runner, mock_api, tmp_path):
+        """Test that a second run skips buckets whose count did not change."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01", "count": 2}],
+            status_code=200,
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1", "asset-2"]},
+            status_code=200,
+        )
+
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+            status_code=200,
+        )
+
+        args = [
+            "--key",
+            "test-key",
+            "--server",
+            "https://example.com",
+            "--face",
+            "face-1",
+            "--album",
+            "album-123",
+            "--state-db",
+            str(tmp_path / "state.db"),
+        ]
+
+        first = runner.invoke(face_to_album, args)
+        bucket_calls = sum(
+            1 for r in mock_api.request_history if r.path == "/api/timeline/bucket"
+        )
+        second = runner.invoke(face_to_album, args)
+
+        assert first.exit_code == 0
+        assert second.exit_code == 0
+        assert "Total unique assets to add: 2" in second.output
+        assert bucket_calls == 1
+        assert (
+            sum(1 for r in mock_api.request_history if r.path == "/api/timeline/bucket")
+            == 1
+        )
+
+
+class TestConfigFile:
+    """Test multi-rule evaluation with --config."""
+
+    def test_config_rules_share_face_crawls(self, runner, mock_api, tmp_path):
+        """Test that a face used by several rules is crawled once per pass."""
+        config = tmp_path / "rules.toml"
+        config.write_text(
+            """
+server = "https://example.com"
+key = "test-key"
+
+[[rules]]
+name = "family"
+face = ["face-1", "face-2"]
+album = "album-123"
+
+[[rules]]
+name = "solo"
+face = "face-1"
+skip_face = ["face-2"]
+album = "album-456"
+"""
+        )
+
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+            status_code=200,
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-1",
+            json={"id": ["asset-1", "asset-2"]},
+            status_code=200,
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-2",
+            json={"id": ["asset-2", "asset-3"]},
+            status_code=200,
+        )
+        mock_api.get(
+            "https://example.com/api/albums/album-456",
+            json={"id": "album-456", "assets": []},
+            status_code=200,
+        )
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json={"success": True},
+            status_code=200,
+        )
+        mock_api.put(
+            "https://example.com/api/albums/album-456/assets",
+            json={"success": True},
+            status_code=200,
+        )
+
+        result = runner.invoke(face_to_album, ["--config", str(config)])
+
+        assert result.exit_code == 0, result.output
+        assert "Rule family (album album-123)" in result.output
+        assert "Rule solo (album album-456)" in result.output
+        assert "Total unique assets to add: 3" in result.output
+        assert "Total unique assets to add: 1" in result.output
+        bucket_lists = [
+            r.qs["personid"][0]
+            for r in mock_api.request_history
+            if r.path == "/api/timeline/buckets"
+        ]
+        assert sorted(bucket_lists) == ["face-1", "face-2"]
+
+    def test_config_conflicts_with_rule_options(self, runner, tmp_path):
+        """Test that per-rule options cannot be mixed with --config."""
+        config = tmp_path / "rules.json"
+        config.write_text('{"rules": [{"face": "f", "album": "a"}]}')
+
+        result = runner.invoke(
+            face_to_album, ["--config", str(config), "--face", "face-1"]
+        )
+
+        assert result.exit_code != 0
+        assert "cannot be combined with --config" in result.output
+
+    def test_config_requires_server(self, runner, tmp_path):
+        """Test that key and server are still required."""
+        config = tmp_path / "rules.json"
+        config.write_text('{"key": "k", "rules": [{"face": "f", "album": "a"}]}')
+
+        result = runner.invoke(face_to_album, ["--config", str(config)])
+
+        assert result.exit_code != 0
+        assert "Missing option '--server'" in result.output
+
+    def test_load_config_yaml(self, tmp_path):
+        """Test YAML config loading and rule normalization."""
+        config = tmp_path / "rules.yaml"
+        config.write_text(
+            "rules:\n"
+            "  - face: [p1, p2]\n"
+            "    album: a1\n"
+            "    require_all_faces: true\n"
+        )
+
+        loaded = load_config(str(config))
+
+        assert loaded["key"] is None
+        assert loaded["rules"] == [
+            {
+                "name": "a1",
+                "face": ["p1", "p2"],
+                "skip_face": [],
+                "album": "a1",
+                "require_all_faces": True,
+                "no_other_faces": False,
+                "remove_non_matching": False,
+                "interval": None,
+                "priority": 0,
+                "jitter": None,
+                "select": None,
+                "plan": None,
+            }
+        ]
+
+    def test_load_config_unknown_setting(self, tmp_path):
+        """Test that typos in rule settings are reported."""
+        config = tmp_path / "rules.json"
+        config.write_text('{"rules": [{"face": "f", "album": "a", "skip_faces": ["x"]}]}')
+
+        with pytest.raises(click.ClickException) as exc_info:
+            load_config(str(config))
+
+        assert "skip_faces" in exc_info.value.message
+
+    def test_load_config_select_rule(self, tmp_path):
+        """Test that a rule may be written as a select expression using aliases."""
+        config = tmp_path / "rules.json"
+        config.write_text(
+            '{"aliases": {"alice": "p1"}, "rules": [{"select": "alice & !p2", "album": "a"}]}'
+        )
+
+        [rule] = load_config(str(config))["rules"]
+
+        assert rule["face"] == ["p1"]
+        assert rule["select"] == "alice & !p2"
+        assert rule["plan"] is not None
+
+    def test_load_config_select_with_require_all_faces(self, tmp_path):
+        """Test that a select rule cannot also set require_all_faces."""
+        config = tmp_path / "rules.json"
+        config.write_text(
+            '{"rules": [{"select": "p1 | p2", "album": "a", "require_all_faces": true}]}'
+        )
+
+        with pytest.raises(click.ClickException) as exc_info:
+            load_config(str(config))
+
+        assert "'select' cannot be combined with 'require_all_faces'" in exc_info.value.message
+
+    def test_load_config_bad_interval(self, tmp_path):
+        """Test that a non-numeric interval is reported against its rule."""
+        config = tmp_path / "rules.yaml"
+        config.write_text("rules:\n  - face: p1\n    album: a\n    interval: 5m\n")
+
+        with pytest.raises(click.ClickException) as exc_info:
+            load_config(str(config))
+
+        assert "Rule #1 in" in exc_info.value.message
+        assert "is invalid: 'interval' must be a number of seconds, got '5m'" in exc_info.value.message
+
+
+class TestSelectExpression:
+    """Test rules written as --select expressions."""
+
+    def test_select_with_aliases(self, runner, mock_api):
+        """Test a union minus an excluded face, using aliases."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01", "count": 2}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-a",
+            json={"id": ["asset-1", "asset-2"]},
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-b",
+            json={"id": ["asset-3"]},
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-c",
+            json={"id": ["asset-2"]},
+        )
+        put = mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-1", "success": True}, {"id": "asset-3", "success": True}],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--album", "album-123",
+                "--face-alias", "alice=face-a",
+                "--face-alias", "bob=face-b",
+                "--select", "(alice | bob) & !face-c",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert sorted(put.last_request.json()["ids"]) == ["asset-1", "asset-3"]
+
+    def test_select_skips_faces_after_empty_intersection(self, runner, mock_api):
+        """Test that the larger face is never crawled when the smaller one is empty."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-big",
+            json=[{"timeBucket": "2024-01", "count": 500}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/buckets?personId=face-none",
+            json=[],
+        )
+        big = mock_api.get(
+            "https://example.com/api/timeline/bucket?personId=face-big",
+            json={"id": ["asset-1"]},
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--album", "album-123",
+                "--select", "face-big & face-none",
+                "--verbose",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Selection plan for rule album-123: face-none & face-big" in result.output
+        assert not big.called
+        assert "Total unique assets to add: 0" in result.output
+
+    def test_select_rejects_unbounded_negation(self, runner):
+        """Test that a bare negation is reported as a usage error."""
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--album", "album-123",
+                "--select", "!face-a",
+            ],
+        )
+
+        assert result.exit_code == 2
+        assert "--select" in result.output
+
+
+class TestStreaming:
+    """Test that OR rules write to the album while the crawl is running."""
+
+    def test_writes_overlap_the_crawl(self, runner, mocker):
+        """Test that the first full batch is added before the next bucket is fetched."""
+        written = threading.Event()
+        module = "immich_face_to_album.__main__"
+        mocker.patch(
+            f"{module}.get_time_buckets",
+            return_value=[{"timeBucket": "2024-02"}, {"timeBucket": "2024-01"}],
+        )
+        mocker.patch(f"{module}.get_album_assets", return_value={"asset-0"})
+
+        def fetch_bucket(server_url, key, face_id, time_bucket, size, verbose):
+            if time_bucket == "2024-02":
+                return {"id": [f"asset-{i}" for i in range(501)]}
+            # Only returns once the first batch has reached the album
+            return {"id": ["late-asset"] if written.wait(timeout=5) else []}
+
+        def add(server_url, key, album_id, asset_ids, verbose=False, results=None, can_split=False):
+            results["added"].extend(asset_ids)
+            written.set()
+            return True
+
+        mocker.patch(f"{module}.get_assets_for_time_bucket", side_effect=fetch_bucket)
+        add_mock = mocker.patch(f"{module}.add_assets_to_album", side_effect=add)
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--concurrency", "1",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Total unique assets to add: 502" in result.output
+        assert "1 asset(s) already in the album, 501 new" in result.output
+        sent = [call.args[3] for call in add_mock.call_args_list]
+        assert [len(ids) for ids in sent] == [500, 1]
+        assert "late-asset" in sent[1]
+
+
+class TestTieredSync:
+    """Test recent-first passes with --hot-buckets."""
+
+    def test_hot_passes_only_crawl_newest_buckets(self, mock_api):
+        """Test that a full pass is followed by recent-only passes until one is due."""
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-03"}, {"timeBucket": "2024-02"}, {"timeBucket": "2024-01"}],
+        )
+        bucket = mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1"]},
+        )
+        mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-1", "success": True}],
+        )
+        sync = AlbumSync(
+            "https://example.com", "test-key", hot_buckets=1, full_sync_every=3
+        )
+        rules = [make_rule("face-1", "album-123", remove_non_matching=True)]
+
+        fetched = []
+        for _ in range(4):
+            bucket.reset()
+            sync.run_pass(rules)
+            fetched.append(sorted(r.qs["timebucket"][0] for r in bucket.request_history))
+
+        assert fetched == [
+            ["2024-01", "2024-02", "2024-03"],
+            ["2024-03"],
+            ["2024-03"],
+            ["2024-01", "2024-02", "2024-03"],
+        ]
+
+
+class TestAdaptivePolling:
+    """Test the --run-every-seconds loop."""
+
+    def test_loop_backs_off_while_idle(self, runner, mocker):
+        """Test that idle passes stretch the interval and changes reset it."""
+        module = "immich_face_to_album.__main__"
+        mocker.patch(f"{module}.AlbumSync.run_pass", side_effect=[0, 0, 3, 0])
+        sleep = mocker.patch(
+            f"{module}.time.sleep", side_effect=[None, None, None, KeyboardInterrupt]
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--run-every-seconds", "10",
+                "--max-interval-seconds", "60",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        delays = [round(call.args[0]) for call in sleep.call_args_list]
+        assert delays == [20, 40, 10, 20]
+        assert "Stop requested" in result.output
+
+    def test_loop_survives_failed_pass(self, runner, mocker):
+        """Test that a pass failing after its retries does not end the loop."""
+        module = "immich_face_to_album.__main__"
+        run_pass = mocker.patch(
+            f"{module}.AlbumSync.run_pass",
+            side_effect=[ImmichAPIError("Status code: 503"), 1],
+        )
+        mocker.patch(f"{module}.time.sleep", side_effect=[None, KeyboardInterrupt])
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--run-every-seconds", "10",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert run_pass.call_count == 2
+        assert "Pass failed: Status code: 503" in result.output
+
+    def test_loop_survives_album_connection_error(self, runner, mock_api, mocker):
+        """Test that a connection error reading the album does not end the loop."""
+        mocker.patch("immich_face_to_album.__main__.time.sleep", side_effect=[None] * 3 + [KeyboardInterrupt])
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1"]},
+        )
+        mock_api.get(
+            "https://example.com/api/albums/album-123",
+            exc=requests.exceptions.ConnectionError,
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--run-every-seconds", "10",
+                "--retries", "0",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert result.output.count("Pass failed: Failed to fetch album album-123") == 4
+        assert "Stop requested" in result.output
+
+    def test_single_run_failure_exits_nonzero(self, runner, mocker):
+        """Test that a one-off run still fails with exit code 1."""
+        mocker.patch(
+            "immich_face_to_album.__main__.AlbumSync.run_pass",
+            side_effect=ImmichAPIError("Status code: 503"),
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--retries", "0",
+            ],
+        )
+
+        assert result.exit_code == 1
+        assert "Status code: 503" in result.output
+
+
+class TestAdaptiveConcurrency:
+    """Test the --min-in-flight option."""
+
+    def test_min_in_flight_needs_ceiling(self, runner):
+        """Test that an adaptive budget requires a large enough --max-in-flight."""
+        for extra in ([], ["--max-in-flight", "2"]):
+            result = runner.invoke(
+                face_to_album,
+                [
+                    "--key", "test-key",
+                    "--server", "https://example.com",
+                    "--face", "face-1",
+                    "--album", "album-123",
+                    "--min-in-flight", "4",
+                ]
+                + extra,
+            )
+
+            assert result.exit_code == 2
+            assert "--min-in-flight needs a --max-in-flight ceiling" in result.output
+
+    def test_min_in_flight_configures_clients(self, runner, mocker):
+        """Test that the adaptive range reaches the client layer and widens the crawl."""
+        module = "immich_face_to_album.__main__"
+        configure = mocker.patch(f"{module}.configure_clients")
+        sync = mocker.patch(f"{module}.AlbumSync")
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--min-in-flight", "2",
+                "--max-in-flight", "16",
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        configure.assert_called_once_with(
+            pool_size=16, max_in_flight=16, retries=3, min_in_flight=2, read_timeout=120.0
+        )
+        # concurrency is AlbumSync's fifth positional argument
+        assert sync.call_args.args[4] == 16
+
+
+class TestCheckpoint:
+    """Test resuming an interrupted pass with --checkpoint."""
+
+    def test_resume_skips_finished_work(self, runner, mocker, tmp_path):
+        """Test that a restarted run reuses journaled buckets and adds."""
+        module = "immich_face_to_album.__main__"
+        journal = str(tmp_path / "sync.journal")
+        mocker.patch(
+            f"{module}.get_time_buckets",
+            return_value=[{"timeBucket": "2024-01"}, {"timeBucket": "2024-02"}],
+        )
+        mocker.patch(f"{module}.get_album_assets", return_value=set())
+        fetched = []
+        server_down = [True]
+
+        def fetch_bucket(server_url, key, face_id, time_bucket, size, verbose):
+            fetched.append(time_bucket)
+            if time_bucket == "2024-02" and server_down[0]:
+                raise ImmichAPIError("Status code: 503")
+            return {"id": [f"asset-{time_bucket}"]}
+
+        def add(server_url, key, album_id, asset_ids, verbose=False, results=None, can_split=False):
+            results["added"].extend(asset_ids)
+            return True
+
+        mocker.patch(f"{module}.get_assets_for_time_bucket", side_effect=fetch_bucket)
+        add_mock = mocker.patch(f"{module}.add_assets_to_album", side_effect=add)
+        args = [
+            "--key", "test-key",
+            "--server", "https://example.com",
+            "--face", "face-1",
+            "--album", "album-123",
+            "--checkpoint", journal,
+        ]
+
+        first = runner.invoke(face_to_album, args)
+        assert first.exit_code == 1
+        assert sorted(fetched) == ["2024-01", "2024-02", "2024-02"]
+        assert add_mock.call_args.args[3] == ["asset-2024-01"]
+
+        fetched.clear()
+        add_mock.reset_mock()
+        server_down[0] = False
+        second = runner.invoke(face_to_album, args)
+
+        assert second.exit_code == 0, second.output
+        assert "Resuming from checkpoint" in second.output
+        assert fetched == ["2024-02"]
+        assert add_mock.call_args.args[3] == ["asset-2024-02"]
+        # The completed pass leaves an empty journal behind
+        assert (tmp_path / "sync.journal").read_text() == ""
+
+
+class TestPlanApply:
+    """Test the two-phase --plan-out / --apply mode."""
+
+    def test_plan_out_writes_diff_without_writing(self, runner, mock_api, tmp_path):
+        """Test that a plan holds the exact adds and removals and the album is untouched."""
+        plan_file = tmp_path / "plan.json"
+        mock_api.get(
+            "https://example.com/api/timeline/buckets",
+            json=[{"timeBucket": "2024-01"}],
+        )
+        mock_api.get(
+            "https://example.com/api/timeline/bucket",
+            json={"id": ["asset-1", "asset-2"]},
+        )
+        mock_api.get(
+            "https://example.com/api/albums/album-123",
+            json={"id": "album-123", "assets": [{"id": "asset-1"}, {"id": "asset-9"}]},
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--album", "album-123",
+                "--remove-non-matching",
+                "--plan-out", str(plan_file),
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert "Planned: add 1, remove 1" in result.output
+        assert not [r for r in mock_api.request_history if r.method in ("PUT", "DELETE")]
+        plan = json.loads(plan_file.read_text())
+        assert plan["server"] == "https://example.com"
+        [entry] = plan["rules"]
+        assert entry["album"] == "album-123"
+        assert entry["add"] == ["asset-2"]
+        assert entry["remove"] == ["asset-9"]
+        assert entry["inputs"]["face"] == ["face-1"]
+        assert entry["inputs"]["selected"] == 2
+
+    def test_apply_writes_plan_without_crawling(self, runner, mock_api, tmp_path):
+        """Test that --apply only sends the planned adds and removals."""
+        plan_file = tmp_path / "plan.json"
+        plan_file.write_text(
+            json.dumps(
+                {
+                    "version": 1,
+                    "created": 0,
+                    "server": "https://example.com",
+                    "rules": [
+                        {
+                            "name": "rule-1",
+                            "album": "album-123",
+                            "add": [f"asset-{i}" for i in range(501)],
+                            "remove": ["asset-old"],
+                        }
+                    ],
+                }
+            )
+        )
+        put = mock_api.put(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-0", "success": True}],
+        )
+        delete = mock_api.delete(
+            "https://example.com/api/albums/album-123/assets",
+            json=[{"id": "asset-old", "success": True}],
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--apply", str(plan_file),
+            ],
+        )
+
+        assert result.exit_code == 0, result.output
+        assert put.call_count == 2
+        assert sorted(len(r.json()["ids"]) for r in put.request_history) == [1, 500]
+        assert delete.call_count == 1
+        assert delete.last_request.json()["ids"] == ["asset-old"]
+        assert not [r for r in mock_api.request_history if "timeline" in r.path]
+
+    def test_apply_rejects_other_server(self, runner, tmp_path):
+        """Test that a plan is only applied to the server it was computed for."""
+        plan_file = tmp_path / "plan.json"
+        plan_file.write_text(
+            json.dumps({"version": 1, "server": "https://other.example.com", "rules": []})
+        )
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--apply", str(plan_file),
+            ],
+        )
+
+        assert result.exit_code == 2
+        assert "was computed for https://other.example.com" in result.output
+
+    def test_apply_conflicts_with_rule_options(self, runner, tmp_path):
+        """Test that selection options cannot be mixed with --apply."""
+        plan_file = tmp_path / "plan.json"
+        plan_file.write_text(json.dumps({"version": 1, "rules": []}))
+
+        result = runner.invoke(
+            face_to_album,
+            [
+                "--key", "test-key",
+                "--server", "https://example.com",
+                "--face", "face-1",
+                "--apply", str(plan_file),
+            ],
+        )
+
+        assert result.exit_code == 2
+        assert "--face cannot be combined with --apply" in result.output
@@ -1,5 +1,38 @@
+import click
 import pytest
-from immich_face_to_album.__main__ import chunker
+import requests
+import sqlite3
+import threading
+import time
+
+from immich_face_to_album.__main__ import (
+    chunker,
+    check_exact_faces,
+    people_ids_of,
+    StateStore,
+    BucketCache,
+    CheckpointJournal,
+    write_plan,
+    load_plan,
+    RequestLimiter,
+    ChunkSizer,
+    send_in_batches,
+    AdaptiveLimiter,
+    CircuitBreaker,
+    retry_delay,
+    RuleScheduler,
+    PollInterval,
+    make_rule,
+    parse_selection,
+    optimize_plan,
+    evaluate_plan,
+    format_plan,
+    pack_asset_ids,
+    unpack_asset_ids,
+    AssetIndex,
+    AssetSet,
+    ImmichAPIError,
+)
 
 
 class TestChunker:
@@ -52,3 +85,628 @@ class TestChunker:
         assert len(chunks[0]) == 500
         assert len(chunks[1]) == 500
         assert len(chunks[2]) == 250
+
+
+class TestExactFaces:
+    """Test the --no-other-faces helpers."""
+
+    def test_people_ids_of_normalizes(self):
+        """Test that people IDs are normalized to strings and None is skipped."""
+        asset = {"people": [{"id": 1}, {"id": "face-2"}, {"id": None}]}
+        assert people_ids_of(asset) == {"1", "face-2"}
+
+    def test_people_ids_of_missing(self):
+        """Test assets without a people list."""
+        assert people_ids_of({"people": None}) == set()
+        assert people_ids_of({}) == set()
+
+    def test_check_exact_faces(self):
+        """Test accept, extra and missing verdicts."""
+        allowed = {"face-1", "face-2"}
+        assert check_exact_faces({"face-1"}, allowed, False) is None
+        assert check_exact_faces({"face-1", "face-3"}, allowed, False) == "extra"
+        assert check_exact_faces({"face-1"}, allowed, True) == "missing"
+        assert check_exact_faces({"face-1", "face-2"}, allowed, True) is None
+
+
+UUID_A = "0b7c9d3e-1f2a-4b5c-8d6e-7f8091a2b3c4"
+UUID_B = "ffffffff-0000-4000-8000-000000000001"
+
+
+class TestPackedAssetIds:
+    """Test the compact asset ID encoding."""
+
+    def test_round_trip(self):
+        """Test that UUIDs pack into 16 bytes each and unpack unchanged."""
+        packed = pack_asset_ids([UUID_A, UUID_B])
+
+        assert len(packed) == 32
+        assert unpack_asset_ids(packed) == {UUID_A, UUID_B}
+        assert unpack_asset_ids(pack_asset_ids([])) == frozenset()
+
+    @pytest.mark.parametrize(
+        "asset_id", ["asset-1", UUID_A.upper(), UUID_A.replace("-", ""), "{" + UUID_A + "}"]
+    )
+    def test_non_canonical_ids_are_not_packed(self, asset_id):
+        """Test that IDs which would not round-trip exactly are refused."""
+        assert pack_asset_ids([UUID_A, asset_id]) is None
+
+
+class TestAssetSet:
+    """Test the interned bitmap sets used during a pass."""
+
+    def test_index_numbers_each_id_once(self):
+        """Test that an ID keeps its number across sets of the same index."""
+        index = AssetIndex()
+        first = index.encode(["asset-1", "asset-2"])
+        second = index.encode(["asset-2", "asset-3", "asset-2"])
+
+        assert len(index) == 3
+        assert len(first) == 2
+        assert len(second) == 2
+        assert first == {"asset-1", "asset-2"}
+        assert second == {"asset-2", "asset-3"}
+
+    def test_set_algebra(self):
+        """Test union, intersection and difference, also against plain sets."""
+        index = AssetIndex()
+        a = index.encode([f"asset-{i}" for i in range(20)])
+        b = index.encode([f"asset-{i}" for i in range(10, 30)])
+
+        assert a | b == {f"asset-{i}" for i in range(30)}
+        assert a & b == {f"asset-{i}" for i in range(10, 20)}
+        assert a - b == {f"asset-{i}" for i in range(10)}
+        assert a - {"asset-0", "unseen"} == {f"asset-{i}" for i in range(1, 20)}
+        assert isinstance({"asset-5", "unseen"} & a, AssetSet)
+        assert {"asset-5", "unseen"} & a == {"asset-5"}
+        assert {"asset-5", "unseen"} - a == {"unseen"}
+        assert a.isdisjoint(["asset-25"])
+        assert not a.isdisjoint({"asset-19"})
+
+    def test_in_place_updates_and_membership(self):
+        """Test in-place operators, membership, truthiness and copies."""
+        index = AssetIndex()
+        selected = index.encode(())
+        assert not selected
+        assert len(selected) == 0
+
+        selected.update(["asset-1", "asset-2"])
+        snapshot = selected.copy()
+        selected.difference_update({"asset-1"})
+        selected |= index.encode(["asset-9"])
+        selected &= {"asset-2", "asset-9", "asset-7"}
+
+        assert selected
+        assert "asset-2" in selected
+        assert "asset-1" not in selected
+        assert "unseen" not in selected
+        assert sorted(selected) == ["asset-2", "asset-9"]
+        assert snapshot == {"asset-1", "asset-2"}
+
+    def test_sets_of_different_indexes(self):
+        """Test that sets of separate indexes compare and combine by ID."""
+        a = AssetIndex().encode(["asset-1", "asset-2"])
+        b = AssetIndex().encode(["asset-2", "asset-1"])
+
+        assert a == b
+        assert a - b == set()
+
+
+class TestStateStore:
+    """Test the SQLite-backed state store."""
+
+    def test_state_store_buckets_persist(self, tmp_path):
+        """Test that bucket fingerprints survive reopening the database."""
+        path = str(tmp_path / "state.db")
+        store = StateStore(path)
+        store.put("face-1", "2024-01", 2, {"asset-1", "asset-2"})
+        store.put("face-1", "2024-02", 1, {"asset-3"})
+        store.close()
+
+        store = StateStore(path)
+        assert store.get("face-1", "2024-01", 2) == {"asset-1", "asset-2"}
+        assert store.get("face-1", "2024-01", 5) is None
+        assert store.get("face-1", "2024-02", 1) == {"asset-3"}
+
+        store.prune("face-1", ["2024-02"])
+        assert store.get("face-1", "2024-01", 2) is None
+        assert store.get("face-1", "2024-02", 1) == {"asset-3"}
+
+    def test_state_store_packs_uuid_buckets(self, tmp_path):
+        """Test that UUID buckets are stored as 16-byte blobs and read back."""
+        path = str(tmp_path / "state.db")
+        ids = {UUID_A, UUID_B}
+        store = StateStore(path)
+        store.put("face-1", "2024-01", 2, ids)
+
+        stored = sqlite3.connect(path).execute("SELECT asset_ids FROM buckets").fetchone()[0]
+        assert stored == pack_asset_ids(sorted(ids))
+        assert store.get("face-1", "2024-01", 2) == ids
+
+    def test_state_store_album_snapshot(self, tmp_path):
+        """Test album snapshot updates."""
+        store = StateStore(str(tmp_path / "state.db"))
+        store.save_album_snapshot("album-1", {"asset-1", "asset-2"})
+        store.add_album_assets("album-1", ["asset-3"])
+        store.remove_album_assets("album-1", ["asset-1"])
+
+        assert store.album_snapshot("album-1") == {"asset-2", "asset-3"}
+        assert store.album_snapshot("album-2") == set()
+
+    def test_state_store_watermark_and_wal(self, tmp_path):
+        """Test watermarks and that the database uses WAL mode."""
+        path = str(tmp_path / "state.db")
+        store = StateStore(path)
+        assert store.watermark("album:a:last_run") is None
+
+        store.set_watermark("album:a:last_run", 123.0)
+        assert store.watermark("album:a:last_run")[0] == "123.0"
+
+        reader = sqlite3.connect(path)
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        reader.close()
+
+
+class TestCheckpointJournal:
+    """Test the --checkpoint progress journal."""
+
+    def test_journal_survives_restart(self, tmp_path):
+        """Test that buckets, people and adds are reloaded by a new journal."""
+        path = str(tmp_path / "sync.journal")
+        journal = CheckpointJournal(path)
+        journal.put("face-1", "2024-01", None, {"asset-1", "asset-2"})
+        people = journal.people_cache()
+        people["asset-1"] = {"face-1"}
+        journal.record_added("album-123", ["asset-1"])
+        journal.close()
+
+        resumed = CheckpointJournal(path)
+        assert resumed.get("face-1", "2024-01", None) == {"asset-1", "asset-2"}
+        assert resumed.get("face-1", "2024-01", 3) is None
+        assert resumed.people_cache() == {"asset-1": {"face-1"}}
+        assert resumed.added("album-123") == {"asset-1"}
+
+    def test_journal_ignores_torn_line(self, tmp_path):
+        """Test that a half-written last entry is skipped and not appended to."""
+        path = tmp_path / "sync.journal"
+        path.write_text('{"added":["album-123",["asset-1"]]}\n{"added":["album-1')
+        journal = CheckpointJournal(str(path))
+        journal.record_added("album-123", ["asset-2"])
+        journal.close()
+
+        assert CheckpointJournal(str(path)).added("album-123") == {"asset-1", "asset-2"}
+
+    def test_journal_wraps_cache(self, tmp_path):
+        """Test that the wrapped cache is consulted first and kept up to date."""
+        cache = BucketCache()
+        journal = CheckpointJournal(str(tmp_path / "sync.journal"), cache)
+        journal.put("face-1", "2024-01", 1, {"asset-1"})
+        assert cache.get("face-1", "2024-01", 1) == {"asset-1"}
+        journal.prune("face-1", [])
+        assert cache.get("face-1", "2024-01", 1) is None
+        assert journal.get("face-1", "2024-01", 1) == {"asset-1"}
+
+    def test_journal_cleared_after_last_pass(self, tmp_path):
+        """Test that only a completed pass with none still running empties it."""
+        path = str(tmp_path / "sync.journal")
+        journal = CheckpointJournal(path)
+        journal.begin()
+        journal.begin()
+        journal.record_added("album-123", ["asset-1"])
+        journal.end(True)
+        assert journal.added("album-123") == {"asset-1"}
+        journal.end(False)
+        assert journal.added("album-123") == {"asset-1"}
+        journal.begin()
+        journal.end(True)
+        assert journal.added("album-123") == set()
+        journal.close()
+        assert CheckpointJournal(path).added("album-123") == set()
+
+
+class TestPlanFile:
+    """Test reading and writing --plan-out files."""
+
+    def test_plan_round_trip(self, tmp_path):
+        """Test that a written plan loads back unchanged."""
+        path = str(tmp_path / "plan.json")
+        planned = [{"name": "r", "album": "album-123", "add": ["a"], "remove": [], "inputs": {}}]
+        write_plan(path, "https://example.com", planned)
+
+        plan = load_plan(path)
+        assert plan["server"] == "https://example.com"
+        assert plan["rules"] == planned
+
+    def test_plan_rejects_invalid_files(self, tmp_path):
+        """Test that unknown versions and malformed rules are refused."""
+        path = tmp_path / "plan.json"
+        for content in (
+            '{"version": 2, "rules": []}',
+            '{"version": 1, "rules": [{"album": "album-123", "add": []}]}',
+            "not json",
+        ):
+            path.write_text(content)
+            with pytest.raises(click.ClickException):
+                load_plan(str(path))
+
+
+class TestRequestLimiter:
+    """Test the global in-flight request budget."""
+
+    def test_request_limiter_bounds_in_flight(self):
+        """Test that no more than `limit` holders run at once."""
+        limiter = RequestLimiter(2)
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+
+        def hold():
+            with limiter:
+                with lock:
+                    state["in_flight"] += 1
+                    state["peak"] = max(state["peak"], state["in_flight"])
+                time.sleep(0.01)
+                with lock:
+                    state["in_flight"] -= 1
+
+        threads = [threading.Thread(target=hold) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert state["peak"] == 2
+        assert limiter.in_flight == 0
+
+    def test_request_limiter_set_limit(self):
+        """Test that the limit can be changed and never drops below one."""
+        limiter = RequestLimiter(4)
+        limiter.set_limit(0)
+        assert limiter.limit == 1
+        limiter.set_limit(8)
+        assert limiter.limit == 8
+
+
+class TestAdaptiveLimiter:
+    """Test the AIMD in-flight budget."""
+
+    def _window(self, limiter, seconds, ok=True):
+        for _ in range(limiter.window):
+            limiter.observe(seconds, ok)
+
+    def test_adaptive_limiter_grows_while_healthy(self):
+        """Test that healthy windows add one up to the ceiling."""
+        limiter = AdaptiveLimiter(2, 4, window=5)
+        assert limiter.limit == 2
+        for _ in range(5):
+            self._window(limiter, 0.1)
+        assert limiter.limit == 4
+
+    def test_adaptive_limiter_halves_on_errors(self):
+        """Test that 429/5xx responses cut the limit, never below the floor."""
+        limiter = AdaptiveLimiter(2, 16, window=5)
+        limiter.set_limit(12)
+        for _ in range(4):
+            limiter.observe(0.1, True)
+        limiter.observe(0.1, False)
+        assert limiter.limit == 6
+        self._window(limiter, 0.1, ok=False)
+        self._window(limiter, 0.1, ok=False)
+        assert limiter.limit == 2
+
+    def test_adaptive_limiter_backs_off_when_slow(self):
+        """Test that p95 latency well above the baseline cuts the limit."""
+        limiter = AdaptiveLimiter(1, 16, window=10)
+        limiter.set_limit(8)
+        self._window(limiter, 0.1)
+        assert limiter.limit == 9
+        assert limiter.baseline == 0.1
+        self._window(limiter, 0.5)
+        assert limiter.limit == 4
+
+    def test_adaptive_limiter_baseline_drifts(self):
+        """Test that a persistently slower server becomes the new normal."""
+        limiter = AdaptiveLimiter(1, 64, window=5)
+        self._window(limiter, 0.1)
+        for _ in range(30):
+            self._window(limiter, 0.3)
+        low = limiter.limit
+        self._window(limiter, 0.3)
+        assert limiter.limit == low + 1
+        assert limiter.baseline > 0.15
+
+
+class TestChunkSizer:
+    """Test adaptive album write batches."""
+
+    def test_chunk_sizer_grows_and_shrinks(self):
+        """Test that fast batches grow the size and 413s/timeouts halve it, within bounds."""
+        sizer = ChunkSizer(initial=100, minimum=50, maximum=200, target=1.0)
+        sizer.update(0.1)
+        assert sizer.size == 150
+        sizer.update(0.1)
+        sizer.update(0.1)
+        assert sizer.size == 200
+        sizer.update(5.0)
+        assert sizer.size == 200
+        for _ in range(3):
+            sizer.update(0.1, too_large=True)
+        assert sizer.size == 50
+
+    def test_send_in_batches_parallel(self):
+        """Test that batches are sent concurrently and cover every ID once."""
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+        sent = []
+
+        def send(chunk, can_split):
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.02)
+            with lock:
+                state["in_flight"] -= 1
+                sent.extend(chunk)
+            return True
+
+        sizer = ChunkSizer(initial=50, minimum=10, maximum=50)
+        send_in_batches(send, [str(i) for i in range(500)], sizer, concurrency=4)
+
+        assert sorted(sent) == sorted(str(i) for i in range(500))
+        assert 1 < state["peak"] <= 4
+
+    def test_send_in_batches_splits_timeouts(self):
+        """Test that a timed-out batch is split, and a minimal one re-raises."""
+        sizes = []
+
+        def send(chunk, can_split):
+            sizes.append(len(chunk))
+            if len(chunk) > 25:
+                raise requests.Timeout()
+            return True
+
+        sizer = ChunkSizer(initial=100, minimum=10)
+        send_in_batches(send, [str(i) for i in range(100)], sizer)
+        assert sizes == [100, 50, 25, 25, 50, 25, 25]
+
+        with pytest.raises(ImmichAPIError, match="timed out"):
+            send_in_batches(send, [str(i) for i in range(100)], ChunkSizer(initial=100, minimum=100))
+
+
+class TestRetryDelay:
+    """Test the backoff between retries."""
+
+    def _response(self, status, retry_after=None):
+        response = requests.Response()
+        response.status_code = status
+        if retry_after is not None:
+            response.headers["Retry-After"] = retry_after
+        return response
+
+    def test_retry_delay_full_jitter(self):
+        """Test that delays stay within the exponential cap."""
+        for attempt in range(6):
+            delay = retry_delay(attempt, backoff=0.5, max_backoff=4.0)
+            assert 0 <= delay <= min(4.0, 0.5 * 2**attempt)
+
+    def test_retry_delay_honors_retry_after(self):
+        """Test that Retry-After is used for 429 and 503 responses only."""
+        assert retry_delay(0, self._response(429, "7")) == 7.0
+        assert retry_delay(0, self._response(503, "2.5")) == 2.5
+        assert retry_delay(0, self._response(500, "7"), backoff=0.5) <= 0.5
+
+    def test_retry_delay_http_date(self):
+        """Test that an HTTP-date Retry-After is converted to seconds."""
+        past = self._response(429, "Wed, 21 Oct 2015 07:28:00 GMT")
+        assert retry_delay(0, past) == 0.0
+        garbled = self._response(429, "soon")
+        assert retry_delay(0, garbled, backoff=0.5) <= 0.5
+
+
+class TestCircuitBreaker:
+    """Test pausing requests while the server keeps failing."""
+
+    def test_breaker_opens_after_threshold(self):
+        """Test that consecutive failures open the breaker and a success closes it."""
+        breaker = CircuitBreaker(threshold=3, cooldown=0.05)
+        for _ in range(2):
+            breaker.record(False)
+        assert not breaker.is_open
+        breaker.record(False)
+        assert breaker.is_open
+
+        started = time.monotonic()
+        breaker.before_request()
+        assert time.monotonic() - started >= 0.04
+        breaker.record(True)
+        assert not breaker.is_open
+
+    def test_breaker_success_resets_count(self):
+        """Test that only consecutive failures count towards the threshold."""
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        breaker.record(False)
+        breaker.record(True)
+        breaker.record(False)
+        assert not breaker.is_open
+
+    def test_breaker_failed_probe_doubles_cooldown(self):
+        """Test that a failed probe reopens the breaker for longer."""
+        breaker = CircuitBreaker(threshold=1, cooldown=0.02, max_cooldown=0.03)
+        breaker.record(False)
+        breaker.before_request()
+        breaker.record(False)
+        assert breaker.is_open
+        assert breaker._cooldown == 0.03
+
+    def test_breaker_single_probe(self):
+        """Test that only one request probes the server after the cooldown."""
+        breaker = CircuitBreaker(threshold=1, cooldown=0.02)
+        breaker.record(False)
+        passed = []
+
+        def call():
+            breaker.before_request()
+            passed.append(time.monotonic())
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        assert len(passed) == 1
+        breaker.record(True)
+        for t in threads:
+            t.join()
+        assert len(passed) == 3
+
+
+class FakeSync:
+    """Records rule passes for scheduler tests."""
+
+    verbose = False
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.calls = []
+        self.active = set()
+        self.overlaps = 0
+        self.lock = threading.Lock()
+
+    def run_pass(self, rules):
+        name = rules[0]["name"]
+        with self.lock:
+            if name in self.active:
+                self.overlaps += 1
+            self.active.add(name)
+            self.calls.append(name)
+        time.sleep(self.duration)
+        with self.lock:
+            self.active.discard(name)
+
+
+class TestRuleScheduler:
+    """Test the per-rule interval scheduler."""
+
+    def test_scheduler_priority_order(self):
+        """Test that due rules start highest priority first."""
+        sync = FakeSync()
+        rules = [
+            make_rule("f1", "a1", name="low", interval=60, priority=1),
+            make_rule("f2", "a2", name="high", interval=60, priority=5),
+        ]
+
+        RuleScheduler(sync, rules, max_parallel_rules=1).run(max_runs=2)
+
+        assert sync.calls == ["high", "low"]
+
+    def test_scheduler_never_overlaps_a_rule(self):
+        """Test that a slow pass delays, rather than overlaps, the next one."""
+        sync = FakeSync(duration=0.03)
+        rules = [make_rule("f1", "a1", name="slow", interval=0.001)]
+
+        RuleScheduler(sync, rules, max_parallel_rules=4).run(max_runs=3)
+
+        assert sync.calls == ["slow", "slow", "slow"]
+        assert sync.overlaps == 0
+
+    def test_scheduler_survives_failing_rule(self, capsys):
+        """Test that a failing rule is reported and rescheduled."""
+
+        class FailingSync(FakeSync):
+            def run_pass(self, rules):
+                super().run_pass(rules)
+                raise SystemExit(1)
+
+        sync = FailingSync()
+        rules = [make_rule("f1", "a1", name="broken", interval=0.001)]
+
+        RuleScheduler(sync, rules).run(max_runs=2)
+
+        assert sync.calls == ["broken", "broken"]
+        assert "Rule broken failed" in capsys.readouterr().out
+
+    def test_make_rule_coerces_interval_and_jitter(self):
+        """Test that numeric strings become float seconds."""
+        rule = make_rule("f1", "a1", interval="300", jitter="1.5")
+
+        assert rule["interval"] == 300.0
+        assert rule["jitter"] == 1.5
+
+    @pytest.mark.parametrize(
+        "settings,message",
+        [
+            ({"interval": "5m"}, "'interval' must be a number of seconds"),
+            ({"interval": 0}, "'interval' must be a positive number of seconds"),
+            ({"interval": -60}, "'interval' must be a positive number of seconds"),
+            ({"interval": 60, "jitter": -1}, "'jitter' must not be negative"),
+        ],
+    )
+    def test_make_rule_rejects_bad_interval_or_jitter(self, settings, message):
+        """Test that unusable scheduling settings are refused up front."""
+        with pytest.raises(ValueError, match=message):
+            make_rule("f1", "a1", **settings)
+
+
+class TestSelection:
+    """Test the boolean face-expression language."""
+
+    def test_parse_precedence_and_aliases(self):
+        """Test that '!' binds tighter than '&', which binds tighter than '|'."""
+        plan = parse_selection("a | b & !c", {"a": "face-a"})
+
+        assert plan == (
+            "or",
+            (("face", "face-a"), ("and", (("face", "b"), ("not", ("face", "c"))))),
+        )
+
+    def test_parse_flattens_nested_operators(self):
+        """Test that chained operators become one n-ary node."""
+        assert parse_selection("(a & b) & c") == (
+            "and",
+            (("face", "a"), ("face", "b"), ("face", "c")),
+        )
+
+    @pytest.mark.parametrize(
+        "text", ["", "!a", "a | !b", "a & (b", "a b", "a & !!b", "a $ b"]
+    )
+    def test_parse_rejects_bad_expressions(self, text):
+        """Test malformed and unbounded expressions."""
+        with pytest.raises(ValueError):
+            parse_selection(text)
+
+    def test_optimize_orders_by_estimate(self):
+        """Test that smaller faces come first and negations last."""
+        plan = parse_selection("!c & big & small")
+
+        optimized = optimize_plan(plan, {"big": 1000, "small": 3, "c": 1})
+
+        assert format_plan(optimized) == "small & big & !c"
+
+    def test_evaluate_short_circuits_empty_intersection(self):
+        """Test that faces after an empty intersection are never fetched."""
+        sets = {"a": {"1", "2"}, "b": set(), "c": {"1"}, "d": {"2"}}
+        fetched = []
+
+        def fetch(face_id):
+            fetched.append(face_id)
+            return sets[face_id]
+
+        assert evaluate_plan(parse_selection("(a | c) & !d"), fetch) == {"1"}
+        fetched.clear()
+        assert evaluate_plan(parse_selection("b & a & !c"), fetch) == set()
+        assert fetched == ["b"]
+
+
+class TestPollInterval:
+    """Test the adaptive --run-every-seconds interval."""
+
+    def test_backs_off_and_snaps_back(self):
+        """Test exponential back-off while idle, capped, and reset on changes."""
+        poll = PollInterval(10, 60)
+
+        assert [poll.update(False) for _ in range(4)] == [20, 40, 60, 60]
+        assert poll.update(True) == 10
+
+    def test_fixed_without_maximum(self):
+        """Test that the interval stays fixed when no maximum is set."""
+        poll = PollInterval(30)
+
+        assert [poll.update(False), poll.update(True)] == [30, 30]